@@ -0,0 +1,13 @@
+# excel_reader
+"""
+各比对工具共用的表格读取包（jiangsu、fujian、work 下的工具都从这里导入，不再各自复制一份）
+
+- xlsx_reader：流式解析 xlsx/et 工作表 XML
+- table_reader：.xlsx / .et / .xls / .csv 统一分批读取、页签规模
+- csv_encoding：csv 编码探测
+- sheet_cache：已解析页签的磁盘缓存
+- data_handler：比对引擎的读取入口（表头探测、按类型解析、列加载线程）
+
+工具入口脚本把仓库根目录加入 sys.path 后按 `from excel_reader.table_reader import ...` 导入；
+本文件不做任何导入，只用表格读取的工具不会连带加载 PyQt。
+"""
@@ -0,0 +1,100 @@
+# csv_encoding.py
+"""
+CSV 文件编码探测（只读取文件开头的样本）
+
+导出的 CSV 动辄几个 GB，整份读入再探测编码、或者按 utf-8/gbk/... 逐个重试完整解析都很浪费。
+这里只看文件开头的 BOM 和前几百 KB 样本：
+1. 有 BOM 直接按 BOM 确定编码；
+2. 样本能按 UTF-8 严格解码，就是 UTF-8；
+3. 否则用 chardet 的 UniversalDetector 增量探测，置信度足够即提前结束。
+结果按（路径、大小、修改时间）缓存，同一文件在进程内只探测一次。
+"""
+import os
+import codecs
+
+try:
+    from chardet import UniversalDetector
+except ImportError:  # 未安装 chardet 时退化为 UTF-8 / GB18030 二选一
+    UniversalDetector = None
+
+# 探测样本上限与每次读取的块大小
+SAMPLE_BYTES = 512 * 1024
+_BLOCK_BYTES = 64 * 1024
+
+# 中文环境下的兜底编码；GB18030 是 GB2312/GBK 的超集
+FALLBACK_ENCODING = 'gb18030'
+
+# BOM 与对应编码；UTF-32 的 BOM 以 UTF-16 的 BOM 开头，必须先判断
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# chardet 返回名 -> 实际使用的编码
+_ALIASES = {
+    'ascii': 'utf-8',
+    'gb2312': FALLBACK_ENCODING,
+    'gbk': FALLBACK_ENCODING,
+    'gb18030': FALLBACK_ENCODING,
+}
+
+# {(绝对路径, 大小, 修改时间): 编码}
+_encodings = {}
+
+
+def _decodes_as(sample, encoding):
+    """样本能否按指定编码严格解码（末尾被截断的半个字符不算错误）"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def _sniff(f):
+    """从已打开的二进制文件探测编码"""
+    head = f.read(_BLOCK_BYTES)
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    # 无 BOM 的 UTF-16：ASCII 字符的高字节为 0
+    odd, even = head[1:200:2], head[0:200:2]
+    if odd and odd.count(0) * 2 > len(odd):
+        return 'utf-16-le'
+    if even and even.count(0) * 2 > len(even):
+        return 'utf-16-be'
+
+    sample = head + f.read(SAMPLE_BYTES - len(head))
+    if _decodes_as(sample, 'utf-8'):
+        return 'utf-8'
+    if UniversalDetector is None:
+        return FALLBACK_ENCODING
+
+    detector = UniversalDetector()
+    for start in range(0, len(sample), _BLOCK_BYTES):
+        detector.feed(sample[start:start + _BLOCK_BYTES])
+        if detector.done:
+            break
+    detector.close()
+
+    encoding = (detector.result.get('encoding') or '').lower()
+    encoding = _ALIASES.get(encoding, encoding)
+    if not encoding or not _decodes_as(sample, encoding):
+        return FALLBACK_ENCODING
+    return encoding
+
+
+def detect_encoding(file_path):
+    """返回适合 open()/pd.read_csv 的编码名，同一文件未变化时直接复用上次结果"""
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+    encoding = _encodings.get(key)
+    if encoding is None:
+        with open(file_path, 'rb') as f:
+            encoding = _sniff(f)
+        _encodings[key] = encoding
+    return encoding
@@ -0,0 +1,640 @@
+import os
+import re
+import itertools
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from PyQt5.QtCore import QThread, pyqtSignal
+from openpyxl import load_workbook
+import xlrd
+import gc
+from .xlsx_reader import XlsxSheetReader, read_sheet_sizes as read_xlsx_sheet_sizes
+from .table_reader import (table_format, list_sheets, table_size, read_table_header,
+                           iter_table_batches, dense_rows, xls_column, read_xls_sheet_sizes)
+from .sheet_cache import cached_chunks
+
+# 原始行号列名（导出时据此定位原表中的行）
+ROW_NO_COLUMN = '_row_no'
+
+# 按规则类型解析的列，无法解析的原值放在以此为前缀的侧列中
+UNPARSED_PREFIX = '_unparsed_'
+
+# 文本日期依次尝试的格式
+DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y年%m月%d日',
+                '%m-%d-%Y', '%m/%d/%Y', '%Y%m%d', '%Y-%m-%d %H:%M:%S']
+
+# 文本列不同值个数 / 非空行数 不超过该比例时按字典编码（Categorical）存储
+CATEGORY_MAX_RATIO = 0.5
+
+# 按页签规模自动确定分块行数：每块约这么多个单元格，行数限制在上下限之间
+CHUNK_TARGET_CELLS = 250000
+MIN_CHUNK_ROWS = 2000
+MAX_CHUNK_ROWS = 50000
+
+
+class LoadColumnWorker(QThread):
+    """用于在独立线程中读取Excel列名和页签"""
+    sheet_names_loaded = pyqtSignal(str, list)  # 发送文件路径和页签列表
+    sheet_sizes_loaded = pyqtSignal(str, dict)  # 发送文件路径和 {页签名: (行数, 列数)}
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, file_path, sheet_name=None):
+        super().__init__()
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+
+    def run(self):
+        try:
+            # 获取所有页签名称（xlsx/et 只读 workbook.xml；csv 视为单页签）
+            self.sheet_names_loaded.emit(self.file_path, list_sheets(self.file_path))
+
+            # 页签规模：xlsx 读 <dimension>，缺失时字节扫描行标签，不加载数据
+            self.sheet_sizes_loaded.emit(self.file_path, read_sheet_sizes(self.file_path))
+        except Exception as e:
+            self.error_occurred.emit(f"读取页签失败: {str(e)}")
+
+
+def read_sheet_sizes(file_path):
+    """
+    不加载数据读取各页签规模，返回 {页签名: (行数, 列数)}，行数包含表头行
+    xlsx 取 <dimension ref>，缺失时字节扫描 <row> 标签；xls 取各页签 BIFF 子流开头的 DIMENSIONS 记录；
+    csv 没有元数据，按文件开头的样本估算行数
+    """
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        return read_xlsx_sheet_sizes(file_path)
+    elif fmt == 'xls':
+        return read_xls_sheet_sizes(file_path)
+    else:
+        return {name: table_size(file_path, estimate=True) for name in list_sheets(file_path)}
+
+
+def sheet_size(file_path, sheet_name):
+    """单个页签的 (行数, 列数)（只读该页签的规模信息）；读取失败时返回 (0, 0)，调用方按未知规模处理"""
+    try:
+        return table_size(file_path, sheet_name, estimate=True)
+    except Exception:
+        return 0, 0
+
+
+def suggest_chunk_size(rows, cols, usecols=None):
+    """
+    按页签规模确定分块行数：列越多每块行数越少，使每块单元格数大致恒定
+    usecols: 规则投影列集合，实际物化的列数不超过投影列数
+    """
+    if usecols is not None:
+        cols = min(cols, len(usecols)) if cols else len(usecols)
+    chunk_rows = CHUNK_TARGET_CELLS // max(cols, 1)
+    chunk_rows = max(MIN_CHUNK_ROWS, min(MAX_CHUNK_ROWS, chunk_rows))
+    # 小表一次读完
+    if 0 < rows <= chunk_rows:
+        return rows
+    return chunk_rows
+
+
+def _resolve_xlsx_header(header_rows, merged_ranges, is_file1, skip_rows):
+    """
+    根据前两行表头和合并单元格信息生成列名
+    merged_ranges: [(min_col, min_row, max_col, max_row), ...]，索引从1开始
+    返回 (列名列表, 数据起始行号(从1开始))
+    """
+    cols = []
+    data_start_row = 0
+    if is_file1 and len(header_rows) >= 2 and merged_ranges:
+        # 平台文件：处理一级+二级表头
+        level1 = [str(v or '') for v in header_rows[0]]
+        level2 = [str(v or '') for v in header_rows[1]]
+
+        # 处理一级表头的合并单元格
+        for min_col, min_row, max_col, _ in merged_ranges:
+            if min_row == 1:  # 第1行
+                fill_val = level1[min_col - 1]
+                for c in range(min_col, min(max_col, len(level1)) + 1):
+                    level1[c - 1] = fill_val
+
+        # 合并两级表头
+        cols = [f"{a}-{b}".strip('-') for a, b in zip(level1, level2)]
+        data_start_row = 3  # 数据从第3行开始（索引从1开始）
+
+    elif is_file1 and len(header_rows) >= 2 and not merged_ranges:
+        # ERP文件或单级表头处理
+        header_row_idx = skip_rows
+        if len(header_rows) > header_row_idx:
+            cols = [str(v) if v is not None else '' for v in header_rows[header_row_idx]]
+        data_start_row = header_row_idx + 2  # 数据开始行（索引从1开始）
+    elif not is_file1 and not merged_ranges:
+        # 非平台文件：处理一级表头
+        header_row_idx = skip_rows
+        if len(header_rows) > header_row_idx:
+            cols = [str(v) if v is not None else '' for v in header_rows[header_row_idx]]
+        data_start_row = header_row_idx + 2  # 数据开始行（索引从1开始）
+    elif not is_file1 and merged_ranges:
+        header_row = skip_rows + 2
+        if len(header_rows) >= header_row:
+            cols = [str(v or '') for v in header_rows[header_row - 1]]
+        data_start_row = header_row + 1
+
+    # 清理列名
+    cols = [re.sub(r'[\*\s]+', '', c) for c in cols]
+    if not cols:
+        raise ValueError("未能正确解析表头，请检查文件格式")
+    return cols, data_start_row
+
+
+def sanitize_column_name(col_name):
+    """
+    把任意列名变成合法的 SQL 列名（入库时的列名）
+    规则文件中的字段名按这一形式书写（如 表头"期末余额-入账价值"对应字段名"期末余额_入账价值"），
+    列投影、类型列匹配表头时两边都先规整
+    """
+    clean = re.sub(r'[^\w]', '_', str(col_name))
+    if clean and clean[0].isdigit():
+        clean = 'col_' + clean
+    return clean[:64] or 'unnamed_column'
+
+
+def _projection_indices(cols, usecols):
+    """按投影列名筛出需要保留的列下标（从0开始），表头与列名都按 sanitize_column_name 规整后匹配；
+    usecols 为 None 时保留全部列"""
+    if usecols is None:
+        return list(range(len(cols)))
+    wanted = {sanitize_column_name(c) for c in usecols}
+    return [i for i, c in enumerate(cols) if sanitize_column_name(c) in wanted]
+
+
+def _rows_to_frame(block, cols, with_row_no):
+    """把 [(行号, 行值列表), ...] 转成 DataFrame，可选追加原始行号列"""
+    df = pd.DataFrame([row for _, row in block], columns=cols)
+    if with_row_no:
+        df[ROW_NO_COLUMN] = [row_idx for row_idx, _ in block]
+    return df
+
+
+def _empty_frame(cols, with_row_no):
+    return pd.DataFrame(columns=cols + [ROW_NO_COLUMN] if with_row_no else cols)
+
+
+# =========================================================
+# 表头布局探测
+# =========================================================
+# columns: 清理后的列名；data_start_row: 数据起始行号（从1开始）；
+# header_merged: 前两行是否有合并单元格（导出时据此决定是否跳过首行）
+HeaderLayout = namedtuple('HeaderLayout', ['columns', 'data_start_row', 'header_merged'])
+
+# {(路径, 大小, 修改时间, 页签, is_file1, skip_rows): HeaderLayout}
+_header_layouts = {}
+
+
+def _layout_key(file_path, sheet_name, is_file1, skip_rows):
+    st = os.stat(file_path)
+    return os.path.abspath(file_path), st.st_size, st.st_mtime_ns, sheet_name, bool(is_file1), skip_rows
+
+
+def _probe_xlsx_header(file_path, sheet_name, is_file1, skip_rows):
+    """只读工作表 XML 开头的两行表头和 <mergeCells> 块，不加载数据行"""
+    max_header_rows = 2
+    with XlsxSheetReader(file_path, sheet_name) as reader:
+        # 合并单元格与列宽，只扫描 XML 字节，不建单元格对象
+        merged_ranges = reader.merged_ranges()
+        dimension = reader.dimension()
+
+        # 表头（始终按两行处理，与 openpyxl 的 iter_rows(max_row=2) 一致）
+        head = list(reader.head_rows(max_header_rows))
+
+    ncols = max([dimension[2] if dimension else 0] +
+                [max(values) for _, values in head if values] + [1])
+    header_rows = [[None] * ncols for _ in range(max_header_rows)]
+    for row_idx, values in head:
+        for col, val in values.items():
+            if col <= ncols:
+                header_rows[row_idx - 1][col - 1] = val
+    cols, data_start_row = _resolve_xlsx_header(header_rows, merged_ranges, is_file1, skip_rows)
+    header_merged = any(min_row <= max_header_rows for _, min_row, _, _ in merged_ranges)
+    return HeaderLayout(cols, data_start_row, header_merged)
+
+
+def _probe_csv_header(file_path, skip_rows):
+    """csv 没有合并单元格：跳过 skip_rows 行后的一行为表头，其后为数据"""
+    header = read_table_header(file_path, header_row=skip_rows + 1)
+    cols = [re.sub(r'[\*\s]+', '', str(v) if v is not None else '') for v in header]
+    if not cols:
+        raise ValueError("未能正确解析表头，请检查文件格式")
+    return HeaderLayout(cols, skip_rows + 2, False)
+
+
+def probe_header_layout(file_path, sheet_name, is_file1=True, skip_rows=0):
+    """
+    探测页签的表头布局（列名、数据起始行、表头是否合并），按 (文件, 页签) 缓存
+    文件被修改（大小或修改时间变化）后自动重新探测
+    """
+    key = _layout_key(file_path, sheet_name, is_file1, skip_rows)
+    layout = _header_layouts.get(key)
+    if layout is None:
+        fmt = table_format(file_path)
+        if fmt == 'xlsx':
+            layout = _probe_xlsx_header(file_path, sheet_name, is_file1, skip_rows)
+        elif fmt == 'xls':
+            bk = xlrd.open_workbook(file_path, on_demand=True)
+            try:
+                layout = _resolve_xls_header(bk.sheet_by_name(sheet_name), is_file1, skip_rows)
+            finally:
+                bk.release_resources()
+        else:
+            layout = _probe_csv_header(file_path, skip_rows)
+        _header_layouts[key] = layout
+    return layout
+
+
+def _iter_xlsx_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size, usecols, with_row_no,
+                      parse_workers):
+    """流式解析 xlsx，按 chunk_size 行产出 DataFrame"""
+    # 阶段1、2：表头布局（已探测过的页签直接取缓存）
+    cols, data_start_row, _ = probe_header_layout(file_path, sheet_name, is_file1, skip_rows)
+    with XlsxSheetReader(file_path, sheet_name) as reader:
+        # 阶段3：数据行按块产出，投影外的单元格在解析时即被跳过
+        keep = _projection_indices(cols, usecols)
+        out_cols = [cols[i] for i in keep]
+        positions = {i + 1: pos for pos, i in enumerate(keep)}
+        # 大表可按行区间分片多进程解析；表头与合并单元格已在上面由主进程处理
+        rows = reader.iter_rows_parallel(parse_workers, min_row=data_start_row, columns=positions)
+        data_rows = dense_rows(rows, positions, data_start_row)
+
+        emitted = False
+        while True:
+            block = list(itertools.islice(data_rows, chunk_size))
+            if not block:
+                break
+            emitted = True
+            yield _rows_to_frame(block, out_cols, with_row_no)
+        if not emitted:
+            yield _empty_frame(out_cols, with_row_no)  # 空数据框
+
+
+def _resolve_xls_header(sh, is_file1, skip_rows):
+    """根据 xls 页签的前两行和合并单元格生成表头布局（与 xlsx 等价的列名规则）"""
+    max_header_rows = 2
+    header_rows = [[str(v) for v in sh.row_values(r)]
+                   for r in range(min(max_header_rows, sh.nrows))]
+    # ---------- 阶段1：读取两级表头 ----------
+
+    level1_raw = [str(v).strip() for v in sh.row_values(0)] if sh.nrows else []
+    non_empty = sum(1 for v in level1_raw if v)
+    empty = sum(1 for v in level1_raw if not v)
+    # 真合并标志：只要存在横向合并且覆盖第 0 行即可
+    real_merge = any(r1 == 0 and r2 == 0 for r1, r2, _, _ in sh.merged_cells)
+
+    # 视觉合并判定
+    visual_merge = (non_empty > 0 and empty > 0) and (not real_merge)
+
+    # ---------- 阶段2：与 xlsx 完全等价的列名生成 ----------
+    if is_file1 and (visual_merge or real_merge):
+        # 平台文件：一级+二级表头
+        level1 = header_rows[0]
+        level2 = header_rows[1]
+
+        # 视觉合并：把左侧非空值向右填充
+        last = ''
+        for c in range(sh.ncols):
+            if level1[c]:
+                last = level1[c]
+            else:
+                level1[c] = last
+
+        cols = [f"{a}-{b}".strip('-') for a, b in zip(level1, level2)]
+        data_start_row = 2  # 行号从 0 开始，数据从第 3 行（索引 2）开始
+
+    elif is_file1 and not visual_merge and not real_merge:
+        # ERP文件或单级表头
+        header_row_idx = skip_rows + 1
+        cols = [str(v) for v in header_rows[header_row_idx]]
+
+        data_start_row = header_row_idx + 1  # 数据行索引（从 0 开始）
+
+    elif not is_file1 and not visual_merge and not real_merge:
+        # 非平台文件：一级表头
+        header_row_idx = skip_rows + 1
+        cols = [str(v or '') for v in header_rows[header_row_idx]]
+        data_start_row = header_row_idx + 1
+
+    elif not is_file1 and (visual_merge or real_merge):
+        # 非平台但有合并（罕见）
+        header_row_idx = skip_rows + 1
+        cols = [str(v) for v in sh.row_values(skip_rows + 1)]
+        data_start_row = header_row_idx + 1
+    else:
+        # 兜底
+        cols = []
+        data_start_row = 0
+
+    # 清理列名
+    cols = [re.sub(r'[\*\s]+', '', c) for c in cols]
+    header_merged = any(rlo < max_header_rows for rlo, _, _, _ in sh.merged_cells)
+    # data_start_row 是从0开始的行下标，布局中统一用从1开始的行号
+    return HeaderLayout(cols, data_start_row + 1, header_merged)
+
+
+def _iter_xls_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size, usecols, with_row_no):
+    """读取 xls，按 chunk_size 行产出 DataFrame（按列整段取值，不逐单元格调用 cell_value）"""
+    bk = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sh = bk.sheet_by_name(sheet_name)
+        # 表头布局：页签已加载，直接解析并写入探测缓存，供导出复用
+        key = _layout_key(file_path, sheet_name, is_file1, skip_rows)
+        layout = _header_layouts.get(key)
+        if layout is None:
+            layout = _header_layouts[key] = _resolve_xls_header(sh, is_file1, skip_rows)
+        cols = layout.columns
+        data_start_row = layout.data_start_row - 1
+
+        # 分块读取数据（只取投影内的列，每列每块只取一次）
+        keep = _projection_indices(cols, usecols)
+        out_cols = [cols[i] for i in keep]
+        total_rows = sh.nrows
+        current_row = data_start_row
+        emitted = False
+
+        while current_row < total_rows:
+            end_row = min(current_row + chunk_size, total_rows)
+            df = pd.DataFrame({pos: xls_column(sh, c, current_row, end_row, bk.datemode)
+                               for pos, c in enumerate(keep)},
+                              index=pd.RangeIndex(end_row - current_row))
+            df.columns = out_cols
+            if with_row_no:
+                df[ROW_NO_COLUMN] = np.arange(current_row + 1, end_row + 1)
+
+            emitted = True
+            yield df
+            current_row = end_row
+
+        if not emitted:
+            yield _empty_frame(out_cols, with_row_no)
+    finally:
+        # 释放资源：卸载页签后关闭工作簿
+        if sheet_name in bk.sheet_names():
+            bk.unload_sheet(sheet_name)
+        bk.release_resources()
+        del bk
+
+
+def _iter_csv_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size, usecols, with_row_no):
+    """csv 交给统一读取器分块解析（编码只探测一次），列名换成清理后的表头"""
+    cols, data_start_row, _ = probe_header_layout(file_path, sheet_name, is_file1, skip_rows)
+    keep = _projection_indices(cols, usecols)
+    out_cols = [cols[i] for i in keep]
+    if with_row_no:
+        out_cols = out_cols + [ROW_NO_COLUMN]
+    for df in iter_table_batches(file_path, header_row=data_start_row - 1, batch_size=chunk_size,
+                                 col_indices=keep,
+                                 row_no_column=ROW_NO_COLUMN if with_row_no else None):
+        df.columns = out_cols
+        yield df
+
+
+# =========================================================
+# 按规则数据类型解析列
+# =========================================================
+def unparsed_column(col):
+    """类型列对应的侧列名：无法解析的单元格在侧列中保留原值，其余为空（侧列非空即无效掩码）"""
+    return UNPARSED_PREFIX + col
+
+
+def _blank_mask(series):
+    """空值或空白字符串"""
+    if not pd.api.types.is_object_dtype(series.dtype) and not pd.api.types.is_string_dtype(series.dtype):
+        return series.isna()
+    return series.isna() | series.astype(str).str.strip().eq('')
+
+
+def _parse_numbers(series):
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.astype('float64')
+    return pd.to_numeric(series, errors='coerce').astype('float64')
+
+
+def _parse_dates(series, blank):
+    """日期列：已是日期的直接保留，文本依次尝试 DATE_FORMATS（整列批量解析，不逐格重试）"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series
+    text = series.astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[us]')
+    for fmt in DATE_FORMATS:
+        todo = parsed.isna() & ~blank
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(text[todo], format=fmt, errors='coerce')
+    return parsed
+
+
+def parse_typed_column(series, data_type):
+    """
+    按规则数据类型解析一列，返回 (类型列, 侧列)
+    数值 -> float64，日期 -> datetime64；无法解析的单元格类型列为空、侧列保留原值
+    """
+    blank = _blank_mask(series)
+    if data_type == '数值':
+        parsed = _parse_numbers(series)
+    elif data_type == '日期':
+        parsed = _parse_dates(series, blank)
+    else:
+        raise ValueError(f"不支持按类型解析的数据类型：{data_type}")
+    invalid = parsed.isna() & ~blank
+    unparsed = series.astype(object).where(invalid, None)
+    return parsed, unparsed
+
+
+def _apply_column_types(df, column_types):
+    """把 column_types 中的列替换成类型列，并追加对应侧列（各块列结构一致）；表头按 sanitize_column_name 规整后匹配"""
+    for col in list(df.columns):
+        data_type = column_types.get(sanitize_column_name(col))
+        if data_type:
+            df[col], df[unparsed_column(col)] = parse_typed_column(df[col], data_type)
+    return df
+
+
+def restore_unparsed(df):
+    """导出用：把侧列中的原值填回类型列（转为 object）并去掉侧列"""
+    side_cols = [c for c in df.columns if str(c).startswith(UNPARSED_PREFIX)]
+    if not side_cols:
+        return df
+    restored = df.drop(columns=side_cols)
+    for side in side_cols:
+        col = side[len(UNPARSED_PREFIX):]
+        if col in restored.columns:
+            raw = df[side]
+            restored[col] = restored[col].astype(object).where(raw.isna(), raw)
+    return restored
+
+
+# =========================================================
+# 低基数文本列字典编码
+# =========================================================
+class _CategoryEncoder:
+    """
+    跨数据块的字典编码器：资产分类、折旧方法、公司代码这类列百万行里只有几百个不同值，
+    编码后每个单元格只存一个整数编码，文本比较也变成编码比较
+    是否编码在某列第一个非空块上决定（全是字符串且低基数）；
+    字典只追加不重排，先产出的块的编码始终有效
+    """
+
+    def __init__(self, max_ratio=CATEGORY_MAX_RATIO):
+        self.max_ratio = max_ratio
+        self.decided = {}     # {列名: 是否编码}
+        self.codes = {}       # {列名: {值: 编码}}
+        self.categories = {}  # {列名: [值, ...]}，下标即编码
+
+    def _should_encode(self, series):
+        if not pd.api.types.is_string_dtype(series.dtype):
+            return False
+        non_null = series.dropna()
+        if non_null.empty:
+            return None  # 整块为空，留到下一块再决定
+        if pd.api.types.infer_dtype(non_null, skipna=False) != 'string':
+            return False
+        return non_null.nunique() <= len(non_null) * self.max_ratio
+
+    def _encode(self, col, series):
+        local_codes, uniques = pd.factorize(series)
+        mapping = self.codes.setdefault(col, {})
+        categories = self.categories.setdefault(col, [])
+        lut = np.empty(len(uniques) + 1, dtype=np.int32)
+        lut[-1] = -1  # factorize 对空值给出 -1
+        for i, value in enumerate(uniques):
+            code = mapping.get(value)
+            if code is None:
+                code = mapping[value] = len(categories)
+                categories.append(value)
+            lut[i] = code
+        return pd.Categorical.from_codes(lut[local_codes],
+                                         categories=pd.Index(categories, dtype=object))
+
+    def encode(self, df):
+        for col in df.columns:
+            if col == ROW_NO_COLUMN or col.startswith(UNPARSED_PREFIX):
+                continue
+            if col not in self.decided:
+                decision = self._should_encode(df[col])
+                if decision is None:
+                    continue
+                self.decided[col] = decision
+            # 后续块若混入数字等非字符串值则该块保持原样（1 与 1.0 会被字典合并成同一项）
+            if self.decided[col] and pd.api.types.infer_dtype(df[col], skipna=True) in ('string', 'empty'):
+                df[col] = self._encode(col, df[col])
+        return df
+
+
+def _concat_chunks(chunks):
+    """拼接数据块；字典编码列按字典合并，结果仍是 Categorical"""
+    if len(chunks) == 1:
+        return chunks[0]
+    cat_cols = [c for c in chunks[0].columns
+                if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)
+                and all(isinstance(ch[c].dtype, pd.CategoricalDtype) for ch in chunks)]
+    df = pd.concat([ch.drop(columns=cat_cols) for ch in chunks], ignore_index=True)
+    for c in cat_cols:
+        df[c] = union_categoricals([ch[c] for ch in chunks])
+    return df[list(chunks[0].columns)]
+
+
+def _parse_excel_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size, usecols, with_row_no,
+                        parse_workers, categorical=False, column_types=None):
+    """按文件格式选择解析器；column_types 中的列解析成类型列，categorical 时对低基数文本列做字典编码"""
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        chunks = _iter_xlsx_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size,
+                                   usecols, with_row_no, parse_workers)
+    elif fmt == 'xls':
+        chunks = _iter_xls_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size,
+                                  usecols, with_row_no)
+    else:
+        chunks = _iter_csv_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size,
+                                  usecols, with_row_no)
+    if column_types:
+        chunks = (_apply_column_types(chunk, column_types) for chunk in chunks)
+    if not categorical:
+        return chunks
+    encoder = _CategoryEncoder()
+    return (encoder.encode(chunk) for chunk in chunks)
+
+
+def iter_excel_chunks(file_path, sheet_name, is_file1=True, skip_rows=0, chunk_size=10000,
+                      usecols=None, with_row_no=False, parse_workers=1, use_cache=False,
+                      categorical=False, column_types=None):
+    """
+    流式读取Excel文件，按 chunk_size 行产出 DataFrame
+    表头（一级+二级合并表头 / skip_rows）的处理与 read_excel_fast 完全一致；
+    没有数据行时产出一个只有列名的空 DataFrame
+    usecols: 需要保留的列名集合（规则投影），不在集合内的列在解析时直接跳过
+    with_row_no: 追加 _row_no 列，记录数据在原表中的行号（从1开始），供导出定位
+    parse_workers: xlsx 大表分片并行解析的进程数，1 表示单进程流式解析
+    use_cache: 使用已解析页签的持久化缓存（命中时直接按块返回上次的解析结果）
+    categorical: 低基数文本列按字典编码成 Categorical，各块共用同一份递增字典
+    column_types: {规整列名: '数值'/'日期'}（规则数据类型，见 build_column_types），这些列读取时即解析成 float64/datetime64，
+                  无法解析的单元格原值保留在侧列 unparsed_column(列名) 中
+    """
+    try:
+        def make_chunks():
+            return _parse_excel_chunks(file_path, sheet_name, is_file1, skip_rows, chunk_size,
+                                       usecols, with_row_no, parse_workers, categorical, column_types)
+
+        if use_cache:
+            # 分块大小影响字典编码的判定（在首块上决定），也参与缓存键
+            yield from cached_chunks(make_chunks, file_path, sheet_name, is_file1=is_file1,
+                                     skip_rows=skip_rows, chunk_size=chunk_size, usecols=usecols,
+                                     with_row_no=with_row_no, categorical=categorical,
+                                     column_types=column_types)
+        else:
+            yield from make_chunks()
+    except Exception as e:
+        raise Exception(f"读取Excel文件失败: {str(e)}")
+
+
+def read_excel_fast(file_path, sheet_name, is_file1=True, skip_rows=0, chunk_size=10000,
+                    usecols=None, with_row_no=False, parse_workers=1, use_cache=False,
+                    categorical=False, column_types=None):
+    """
+    快速读取Excel文件，支持大文件分块读取和多表头处理
+    优化点：
+    1. xlsx 直接流式解析工作表 XML，合并单元格从 <mergeCells> 读取，不再整表加载
+    2. 分块读取大型文件，显著降低内存占用
+    3. 及时释放资源，减少内存泄漏
+    4. 传入 usecols 时只物化规则用到的列
+    5. parse_workers > 1 时超大 xlsx 按行区间分片多进程解析
+    6. use_cache 时同一文件、同一读取参数的结果直接取自持久化缓存
+    7. categorical 时低基数文本列以字典编码（Categorical）返回，内存占用成倍下降
+    8. column_types 中的数值/日期列读取时解析一次，比对时不再逐批、逐格重复转换
+    """
+    chunks = list(iter_excel_chunks(file_path, sheet_name, is_file1=is_file1,
+                                    skip_rows=skip_rows, chunk_size=chunk_size,
+                                    usecols=usecols, with_row_no=with_row_no,
+                                    parse_workers=parse_workers, use_cache=use_cache,
+                                    categorical=categorical, column_types=column_types))
+    if len(chunks) == 1:
+        return chunks[0]
+    df = _concat_chunks(chunks)
+    del chunks
+    gc.collect()
+    return df
+
+def read_mapping_table(file_path):
+    """读取资产分类映射表，返回 DataFrame"""
+    try:
+        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
+        if '资产分类映射表' not in wb.sheetnames:
+            raise Exception("未找到'资产分类映射表'页签")
+
+        ws = wb['资产分类映射表']
+
+        # 只读取第二行作为表头（第二级表头）
+        headers = [cell.value if cell.value is not None else "" for cell in next(ws.iter_rows(min_row=2, max_row=2))]
+
+        # 读取数据行（从第3行开始）
+        data = []
+        for row in ws.iter_rows(min_row=3, values_only=True):
+            data.append(row)
+
+        df = pd.DataFrame(data, columns=headers)
+        wb.close()
+        return df
+    except Exception as e:
+        raise Exception(f"读取资产分类映射表时发生错误: {str(e)}")
@@ -0,0 +1,345 @@
+# sheet_cache.py
+"""
+已解析页签的持久化缓存（按文件内容寻址）
+
+同一份平台表一天内会和多份ERP表反复比对，每次都重新解析很浪费。
+缓存键 = 文件内容哈希 + 页签名 + 读取参数（表头模式、skip_rows、列投影等），
+缓存值按数据块存成多个分片目录，命中时按块原样返回。分片按列存储：
+数值/日期列为 .npy（读取时 allow_pickle=False），文本/混合列与字典编码列的字典为 JSON，
+读取缓存不会执行任何代码。缓存目录按用户隔离（权限 0700），总大小超过上限时按最近使用时间淘汰（LRU）。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import datetime
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+def _user_cache_root():
+    """当前用户的缓存根目录：Windows 为 %LOCALAPPDATA%，其他系统为 $XDG_CACHE_HOME 或 ~/.cache"""
+    if sys.platform == 'win32':
+        return os.environ.get('LOCALAPPDATA') or tempfile.gettempdir()
+    return os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+
+# 缓存目录与容量上限，可通过环境变量覆盖
+CACHE_DIR = os.environ.get('EXCEL_COMPARE_CACHE_DIR',
+                           os.path.join(_user_cache_root(), 'excel_compare_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('EXCEL_COMPARE_CACHE_MAX_BYTES', 4 << 30))
+
+# 哪些文件使用缓存：off 都不用；platform 只用于平台表（同一份平台表会和多份ERP表反复比对，
+# ERP表多为一次性导出）；all 两张表都用
+CACHE_MODE_OFF = 'off'
+CACHE_MODE_PLATFORM = 'platform'
+CACHE_MODE_ALL = 'all'
+CACHE_MODE = os.environ.get('EXCEL_COMPARE_CACHE', CACHE_MODE_PLATFORM).strip().lower()
+# 小于该大小的文件重新解析很快，不缓存（省去整文件哈希和写盘）
+CACHE_MIN_BYTES = int(os.environ.get('EXCEL_COMPARE_CACHE_MIN_BYTES', 16 << 20))
+
+# 缓存格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 3
+
+# 决定解析结果的模块：源码的摘要参与缓存键，解析逻辑一有改动旧缓存即失效，不依赖手工递增版本号
+PARSER_MODULES = ('data_handler.py', 'xlsx_reader.py', 'table_reader.py', 'csv_encoding.py', 'sheet_cache.py')
+
+_HASH_BLOCK_SIZE = 1 << 20
+_PART_NAME = 'part-{:05d}'
+_META_NAME = 'meta.json'
+
+# 进程内记忆文件哈希，避免同一文件重复计算：{(路径, 大小, 修改时间): 哈希}
+_fingerprints = {}
+_parser_digest = None
+
+
+def file_fingerprint(file_path):
+    """文件内容的 SHA1；路径、大小、修改时间都不变时直接复用上次结果"""
+    st = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+    digest = _fingerprints.get(memo_key)
+    if digest is None:
+        h = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                h.update(block)
+        digest = f"{st.st_size}-{h.hexdigest()}"
+        _fingerprints[memo_key] = digest
+    return digest
+
+
+def should_cache(file_path, is_file1):
+    """该文件是否使用解析缓存：按 CACHE_MODE 选择平台表/ERP表，且文件不小于 CACHE_MIN_BYTES"""
+    if CACHE_MODE == CACHE_MODE_OFF or (CACHE_MODE == CACHE_MODE_PLATFORM and not is_file1):
+        return False
+    try:
+        return os.path.getsize(file_path) >= CACHE_MIN_BYTES
+    except OSError:
+        return False
+
+
+def parser_digest():
+    """PARSER_MODULES 源码的摘要（进程内只算一次）；打包后没有源码文件时为空串，只靠 CACHE_VERSION 区分"""
+    global _parser_digest
+    if _parser_digest is None:
+        h = hashlib.sha1()
+        found = False
+        base = os.path.dirname(os.path.abspath(__file__))
+        for name in PARSER_MODULES:
+            try:
+                with open(os.path.join(base, name), 'rb') as f:
+                    h.update(name.encode('utf-8') + b'\0' + f.read())
+                found = True
+            except OSError:
+                continue
+        _parser_digest = h.hexdigest() if found else ''
+    return _parser_digest
+
+
+def cache_key(file_path, sheet_name, **params):
+    """
+    生成缓存键：格式版本 + 解析代码摘要 + 文件内容 + 页签 + 全部读取参数
+    （影响解析结果的参数都要传入，如 chunk_size、categorical、column_types）；集合类参数排序后参与计算
+    """
+    normalized = {k: sorted(v) if isinstance(v, (set, frozenset)) else v for k, v in params.items()}
+    payload = json.dumps([CACHE_VERSION, parser_digest(), file_fingerprint(file_path), sheet_name, normalized],
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+# =========================================================
+# 分片格式：每块一个目录，meta.json 记录列名、列类型和行索引
+# =========================================================
+def _json_default(value):
+    """JSON 不能直接表示的单元格值写成带类型标记的对象，其余类型不缓存"""
+    if isinstance(value, pd.Timestamp):
+        return {'ts': value.isoformat()}
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'d': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'t': value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {'td': [value.days, value.seconds, value.microseconds]}
+    raise TypeError(f"缓存不支持的单元格类型: {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if 'ts' in obj:
+        return pd.Timestamp(obj['ts'])
+    if 'dt' in obj:
+        return datetime.datetime.fromisoformat(obj['dt'])
+    if 'd' in obj:
+        return datetime.date.fromisoformat(obj['d'])
+    if 't' in obj:
+        return datetime.time.fromisoformat(obj['t'])
+    if 'td' in obj:
+        return datetime.timedelta(*obj['td'])
+    return obj
+
+
+def _write_json(path, value):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, default=_json_default)
+
+
+def _read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f, object_hook=_json_object_hook)
+
+
+def _write_part(part_dir, df):
+    """
+    把一个数据块按列写入 part_dir；遇到无法无损表示的列（非 RangeIndex、不支持的单元格类型等）
+    抛出 TypeError，调用方放弃缓存
+    """
+    if not isinstance(df.index, pd.RangeIndex):
+        raise TypeError("缓存只支持 RangeIndex 的数据块")
+    os.mkdir(part_dir)
+    columns = []
+    for pos, name in enumerate(df.columns):
+        if not isinstance(name, str):
+            raise TypeError(f"缓存不支持的列名类型: {type(name).__name__}")
+        series = df.iloc[:, pos]
+        dtype = series.dtype
+        base = os.path.join(part_dir, f"c{pos}")
+        if isinstance(dtype, pd.CategoricalDtype):
+            np.save(base + '.npy', series.cat.codes.to_numpy(), allow_pickle=False)
+            _write_json(base + '.json', series.cat.categories.tolist())
+            columns.append({'name': name, 'kind': 'category',
+                            'categories_dtype': str(series.cat.categories.dtype)})
+        elif isinstance(dtype, np.dtype) and dtype.kind in 'biufmM':
+            np.save(base + '.npy', series.to_numpy(), allow_pickle=False)
+            columns.append({'name': name, 'kind': 'array'})
+        else:
+            _write_json(base + '.json', series.tolist())
+            columns.append({'name': name, 'kind': 'values', 'dtype': str(dtype)})
+    index = df.index
+    _write_json(os.path.join(part_dir, _META_NAME),
+                {'columns': columns, 'index': [index.start, index.stop, index.step]})
+
+
+def _read_part(part_dir):
+    """读取 _write_part 写入的数据块"""
+    meta = _read_json(os.path.join(part_dir, _META_NAME))
+    index = pd.RangeIndex(*meta['index'])
+    data = {}
+    for pos, col in enumerate(meta['columns']):
+        base = os.path.join(part_dir, f"c{pos}")
+        if col['kind'] == 'category':
+            codes = np.load(base + '.npy', allow_pickle=False)
+            categories = pd.Index(_read_json(base + '.json'), dtype=col['categories_dtype'])
+            values = pd.Categorical.from_codes(codes, categories=categories)
+        elif col['kind'] == 'array':
+            values = np.load(base + '.npy', allow_pickle=False)
+        else:
+            values = _read_json(base + '.json')
+            if col['dtype'] == 'object':
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+                # 显式指定 object，避免全是字符串的列被推断成字符串类型
+                data[pos] = pd.Series(array, index=index, dtype=object, copy=False)
+                continue
+            values = pd.array(values, dtype=col['dtype'])
+        data[pos] = pd.Series(values, index=index, copy=False)
+    df = pd.DataFrame(data, index=index)
+    df.columns = [col['name'] for col in meta['columns']]
+    return df
+
+
+def _dir_size(path):
+    """目录（含分片子目录）的总字节数"""
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            total += _dir_size(entry.path)
+        elif entry.is_file(follow_symlinks=False):
+            total += entry.stat().st_size
+    return total
+
+
+def _ensure_private_dir(path):
+    """创建仅当前用户可访问（0700）的目录；目录属于其他用户时拒绝使用"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.name == 'posix':
+        st = os.stat(path)
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"缓存目录不属于当前用户: {path}")
+        if st.st_mode & 0o077:
+            os.chmod(path, 0o700)
+
+
+class SheetCache:
+    """缓存目录的读写与淘汰"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _usable(self):
+        """缓存目录可用（已存在或可创建，且只有当前用户可访问）"""
+        try:
+            _ensure_private_dir(self.cache_dir)
+            return True
+        except OSError:
+            return False
+
+    def load_parts(self, key):
+        """命中时返回分片目录列表（已刷新最近使用时间），未命中返回 None"""
+        entry = self._entry_dir(key)
+        if not os.path.isdir(entry) or not self._usable():
+            return None
+        parts = sorted(p for p in os.listdir(entry) if p.startswith('part-'))
+        if not parts:
+            return None
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return [os.path.join(entry, p) for p in parts]
+
+    def iter_chunks(self, key):
+        """按写入顺序逐块读取缓存；未命中返回 None"""
+        parts = self.load_parts(key)
+        if parts is None:
+            return None
+        return (_read_part(p) for p in parts)
+
+    def store_chunks(self, key, chunks):
+        """
+        边产出边写缓存：chunks 全部正常产出后才把临时目录原子改名为正式条目，
+        中途出错、被中断或遇到无法缓存的数据块则丢弃临时文件，不会留下残缺缓存（数据块照常产出）
+        """
+        if not self._usable():
+            yield from chunks
+            return
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}.", dir=self.cache_dir)
+        writable = True
+        committed = False
+        try:
+            for i, chunk in enumerate(chunks):
+                if writable:
+                    try:
+                        _write_part(os.path.join(tmp_dir, _PART_NAME.format(i)), chunk)
+                    except (TypeError, ValueError, OSError):
+                        writable = False
+                        shutil.rmtree(tmp_dir, ignore_errors=True)
+                yield chunk
+            if writable:
+                try:
+                    os.replace(tmp_dir, self._entry_dir(key))
+                    committed = True
+                except OSError:
+                    pass  # 其他进程已写入同一条目
+        finally:
+            if not committed:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时，按最近使用时间从旧到新删除条目"""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        now = time.time()
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(path):
+                continue
+            if name.startswith('.'):
+                # 崩溃遗留的临时目录，超过一天即清理
+                if now - os.path.getmtime(path) > 86400:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = _dir_size(path)
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def cached_chunks(make_chunks, file_path, sheet_name, cache=None, **params):
+    """
+    带缓存的分块读取：命中直接返回缓存分片，否则调用 make_chunks() 解析并同时写入缓存
+    make_chunks: 无参函数，返回 DataFrame 块的迭代器
+    """
+    cache = cache or SheetCache()
+    key = cache_key(file_path, sheet_name, **params)
+    hit = cache.iter_chunks(key)
+    if hit is not None:
+        return hit
+    return cache.store_chunks(key, make_chunks())
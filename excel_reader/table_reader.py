@@ -0,0 +1,465 @@
+# table_reader.py
+"""
+统一的表格流式读取：.xlsx / .et / .xls / .csv 都按固定行数分批产出 DataFrame
+
+- xlsx/et：xlsx_reader 直接流式解析工作表 XML，只物化投影内的列
+- xls：xlrd 按需加载页签，每批每列用 col_values/col_types 整段取值，日期向量化转换
+- csv：按文件开头的样本探测编码，再用 pd.read_csv 分块解析，整个文件只解码一遍
+文件格式按文件头的魔数判断，后缀标错（.xls 实为 xlsx、WPS 另存的 .et）也能正确读取。
+
+同一次读取产出的每一批列名、列顺序、列类型都相同：
+原始值模式下各列为 object（空单元格为缺失值），as_str=True 时各列为字符串（空单元格为 ''）。
+数据为空时也产出一个带列名的空批次，调用方无需特判。
+"""
+import os
+import struct
+import zipfile
+import itertools
+import numpy as np
+import pandas as pd
+import xlrd
+
+from .xlsx_reader import XlsxSheetReader, read_workbook_info
+from .csv_encoding import detect_encoding
+
+# 默认每批行数
+BATCH_ROWS = 10000
+
+# 估算 csv 行数时读取的文件开头字节数
+CSV_SAMPLE_BYTES = 1 << 20
+# 在 xls 页签子流开头查找 DIMENSIONS 记录时最多扫描的记录数（该记录紧跟在少量页签设置记录之后）
+XLS_DIMENSION_SCAN_RECORDS = 64
+
+_XLS_EOF = 0x000A
+_XLS_DIMENSIONS = (0x0200, 0x0000)  # BIFF3-8 / BIFF2
+
+_ZIP_MAGIC = b'PK\x03\x04'
+_OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def table_format(file_path):
+    """返回 'xlsx' / 'xls' / 'csv'；Excel 类文件以文件头为准，不认识的格式抛 ValueError"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.xlsx', '.xls', '.et'):
+        with open(file_path, 'rb') as f:
+            magic = f.read(len(_OLE_MAGIC))
+        if magic.startswith(_ZIP_MAGIC):
+            return 'xlsx'
+        if magic == _OLE_MAGIC:
+            return 'xls'
+    raise ValueError(f"不支持的文件格式: {file_path}")
+
+
+def list_sheets(file_path):
+    """页签名列表；csv 视为只有一个以文件名命名的页签"""
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        with zipfile.ZipFile(file_path, 'r') as zf:
+            sheets, _ = read_workbook_info(zf)
+        return [name for name, _ in sheets]
+    if fmt == 'xls':
+        bk = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            return bk.sheet_names()
+        finally:
+            bk.release_resources()
+    return [os.path.splitext(os.path.basename(file_path))[0]]
+
+
+def _xlsx_sheet_name(file_path, sheet_name):
+    """未指定页签时取第一个页签"""
+    if sheet_name is not None:
+        return sheet_name
+    with zipfile.ZipFile(file_path, 'r') as zf:
+        sheets, _ = read_workbook_info(zf)
+    if not sheets:
+        raise ValueError(f"工作簿中没有页签: {file_path}")
+    return sheets[0][0]
+
+
+def _xls_sheet(bk, sheet_name):
+    return bk.sheet_by_index(0) if sheet_name is None else bk.sheet_by_name(sheet_name)
+
+
+def _xls_dimensions(bk, sheet_index):
+    """
+    从页签子流开头的 DIMENSIONS 记录读取 (行数, 列数)，不解析单元格；
+    bk 需以 on_demand=True 打开（只解析了全局记录），找不到该记录时返回 None
+    用到 xlrd 的内部属性（工作簿流 mem、各页签子流位置 _sh_abs_posn），属性不存在或记录不完整时
+    同样返回 None，由调用方改为加载页签取行列数
+    """
+    mem = getattr(bk, 'mem', None)
+    positions = getattr(bk, '_sh_abs_posn', None)
+    biff_version = getattr(bk, 'biff_version', None)
+    if mem is None or biff_version is None or not positions or sheet_index >= len(positions):
+        return None
+    pos = positions[sheet_index]
+    try:
+        for _ in range(XLS_DIMENSION_SCAN_RECORDS):
+            if pos + 4 > len(mem):
+                return None
+            code, length = struct.unpack('<HH', mem[pos:pos + 4])
+            data = mem[pos + 4:pos + 4 + length]
+            pos += 4 + length
+            if code == _XLS_EOF:
+                return None
+            if code in _XLS_DIMENSIONS and length:  # 长度为 0 的 0x0000 是填充，不是记录
+                if biff_version < 80:
+                    return struct.unpack('<HxxH', data[2:8])
+                return struct.unpack('<ixxH', data[4:12])
+    except (struct.error, TypeError):
+        return None
+    return None
+
+
+def _xls_sheet_size(bk, sheet_index):
+    """页签的 (行数, 列数)：优先取 DIMENSIONS 记录，没有时加载该页签取行列数"""
+    on_demand = getattr(bk, 'on_demand', False)
+    if on_demand:
+        size = _xls_dimensions(bk, sheet_index)
+        if size is not None:
+            return tuple(size)
+    sh = bk.sheet_by_index(sheet_index)
+    size = (sh.nrows, sh.ncols)
+    if on_demand:
+        bk.unload_sheet(sheet_index)
+    return size
+
+
+def read_xls_sheet_sizes(file_path):
+    """各页签 {页签名: (行数, 列数)}，按需加载模式打开，只读页签头部的 DIMENSIONS 记录"""
+    bk = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        return {name: _xls_sheet_size(bk, i) for i, name in enumerate(bk.sheet_names())}
+    finally:
+        bk.release_resources()
+
+
+def _estimate_csv_size(file_path):
+    """
+    按文件开头 CSV_SAMPLE_BYTES 字节估算 (行数, 列数)：行数 = 文件大小 / 样本平均行长，列数取表头宽度；
+    文件不超过样本大小时行数按换行符精确计数（字段内含换行的行会多计）
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        sample = f.read(CSV_SAMPLE_BYTES)
+    if not sample:
+        return 0, 0
+    lines = sample.count(b'\n')
+    if len(sample) >= size:
+        rows = lines + (0 if sample.endswith(b'\n') else 1)
+    else:
+        rows = max(1, round(size * lines / len(sample)))
+    return rows, len(_csv_header(file_path, 1))
+
+
+def table_size(file_path, sheet_name=None, estimate=False):
+    """
+    (行数, 列数)，行数包含表头行
+    xlsx 取 <dimension>（缺失时字节扫描行标签），均不加载数据；
+    xls 取页签行列数（需加载该页签），csv 需要完整扫描一遍；
+    estimate=True 时 xls 只读 DIMENSIONS 记录，csv 按文件开头的样本估算，用于分块大小、进度等只需规模的场合
+    """
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        with XlsxSheetReader(file_path, _xlsx_sheet_name(file_path, sheet_name)) as reader:
+            return reader.size()
+    if fmt == 'xls':
+        bk = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            if estimate:
+                index = 0 if sheet_name is None else bk.sheet_names().index(sheet_name)
+                return _xls_sheet_size(bk, index)
+            sh = _xls_sheet(bk, sheet_name)
+            return sh.nrows, sh.ncols
+        finally:
+            bk.release_resources()
+    if estimate:
+        return _estimate_csv_size(file_path)
+    rows = cols = 0
+    for chunk in pd.read_csv(file_path, encoding=detect_encoding(file_path), header=None,
+                             dtype=str, na_filter=False, chunksize=BATCH_ROWS):
+        rows += len(chunk)
+        cols = max(cols, chunk.shape[1])
+    return rows, cols
+
+
+# =========================================================
+# 公共的行/列取值工具（data_handler 的分块解析也复用这些实现）
+# =========================================================
+def dense_rows(rows, positions, start_row):
+    """
+    把 (行号, {列号: 值}) 的稀疏行补齐成定长列表，缺失的行补空行
+    positions: {列号: 输出位置}
+    产出 (行号, 行值列表)
+    """
+    width = len(positions)
+    expected = start_row
+    for row_idx, values in rows:
+        while expected < row_idx:
+            yield expected, [None] * width
+            expected += 1
+        row = [None] * width
+        for col, val in values.items():
+            pos = positions.get(col)
+            if pos is not None:
+                row[pos] = val
+        yield row_idx, row
+        expected = row_idx + 1
+
+
+def xls_dates_to_datetime64(serials, datemode):
+    """
+    一次性把 Excel 日期序列号数组转成 datetime64[ms]，规则与 xlrd.xldate_as_datetime 一致：
+    1900 日期系统下序列号 < 60 的日期基准后移一天（兼容 Excel 把 1900 年当闰年的错误）
+    """
+    serials = np.asarray(serials, dtype=np.float64)
+    if datemode:
+        base = np.full(serials.shape, np.datetime64('1904-01-01', 'ms'))
+    else:
+        base = np.where(serials < 60, np.datetime64('1899-12-31', 'ms'), np.datetime64('1899-12-30', 'ms'))
+    return base + np.round(serials * 86400000.0).astype(np.int64).astype('timedelta64[ms]')
+
+
+def xls_column(sh, col, start, end, datemode, empty_value='', native_bools=False):
+    """
+    整列取一段单元格值：col_values/col_types 各取一次，日期单元格统一向量化转换
+    只含日期和空单元格的列直接给出 datetime64 列（空为 NaT），混合列中日期单元格为 datetime
+    empty_value: 空单元格的取值，默认保持 xlrd 的 ''
+    native_bools: 布尔单元格转成 True/False，默认保持 xlrd 的 1/0
+    """
+    values = sh.col_values(col, start, end)
+    types = np.fromiter(sh.col_types(col, start, end), dtype=np.int8, count=end - start)
+    date_mask = types == xlrd.XL_CELL_DATE
+    empty_mask = (types == xlrd.XL_CELL_EMPTY) | (types == xlrd.XL_CELL_BLANK)
+    bool_mask = types == xlrd.XL_CELL_BOOLEAN if native_bools else None
+    if not date_mask.any():
+        fix_empty = empty_value != '' and empty_mask.any()
+        fix_bools = bool_mask is not None and bool_mask.any()
+        if not (fix_empty or fix_bools):
+            return values
+        out = np.array(values, dtype=object)
+        if fix_empty:
+            out[empty_mask] = empty_value
+        if fix_bools:
+            out[bool_mask] = out[bool_mask].astype(bool)
+        return out
+
+    out = np.array(values, dtype=object)
+    dates = xls_dates_to_datetime64(out[date_mask].astype(np.float64), datemode)
+    if (date_mask | empty_mask).all():
+        column = np.full(len(values), np.datetime64('NaT', 'ms'))
+        column[date_mask] = dates
+        return pd.Series(column)
+
+    out[date_mask] = dates.astype('datetime64[us]').astype(object)  # 转成 datetime.datetime
+    out[empty_mask] = empty_value
+    if bool_mask is not None:
+        out[bool_mask] = out[bool_mask].astype(bool)
+    return out
+
+
+def cell_text(value):
+    """单元格值转文本：空值为 ''，整数值的浮点数去掉 .0（与 pd.read_excel(dtype=str) 一致）"""
+    if value is None or value is pd.NaT:
+        return ''
+    if isinstance(value, float):
+        if value != value:
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+# =========================================================
+# 统一读取接口
+# =========================================================
+def _xlsx_header(reader, header_row):
+    dimension = reader.dimension()
+    ncols = dimension[2] if dimension else 0
+    values = {}
+    for row_idx, row in reader.head_rows(header_row):
+        if row_idx == header_row:
+            values = row
+    width = max([ncols] + list(values))
+    return [values.get(c) for c in range(1, width + 1)]
+
+
+def _xls_header(sh, header_row):
+    if sh.nrows < header_row:
+        return [None] * sh.ncols
+    return [v if v != '' else None for v in sh.row_values(header_row - 1)]
+
+
+def _csv_header(file_path, header_row):
+    df = pd.read_csv(file_path, encoding=detect_encoding(file_path), header=None,
+                     skiprows=header_row - 1, nrows=1, dtype=str, na_filter=False)
+    return [v if v != '' else None for v in df.iloc[0]] if len(df) else []
+
+
+def read_table_header(file_path, sheet_name=None, header_row=1):
+    """只读取第 header_row 行（从1开始）的原始取值，列数按页签宽度补齐"""
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        with XlsxSheetReader(file_path, _xlsx_sheet_name(file_path, sheet_name)) as reader:
+            return _xlsx_header(reader, header_row)
+    if fmt == 'xls':
+        bk = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            return _xls_header(_xls_sheet(bk, sheet_name), header_row)
+        finally:
+            bk.release_resources()
+    return _csv_header(file_path, header_row)
+
+
+def _select_columns(header, width, usecols, col_indices):
+    """
+    确定要读取的列下标（从0开始，升序）与对应列名
+    header 为 None（无表头）时列名即列下标，width 为页签列数
+    """
+    if header is None:
+        positions = sorted(col_indices) if col_indices is not None else list(range(width))
+        return positions, list(positions)
+    # 空表头按 pandas 的习惯命名为 Unnamed: 列下标
+    all_names = [f"Unnamed: {i}" if v is None or v == '' else v for i, v in enumerate(header)]
+    # 重复列名与 pandas 一样依次加 .1、.2 后缀
+    seen = {}
+    for i, name in enumerate(all_names):
+        count = seen.get(name)
+        if count is None:
+            seen[name] = 0
+            continue
+        new_name = name
+        while new_name in seen:
+            count += 1
+            new_name = f"{name}.{count}"
+        seen[name] = count
+        seen[new_name] = 0
+        all_names[i] = new_name
+    if col_indices is not None:
+        positions = sorted(col_indices)
+    elif usecols is not None:
+        positions = [i for i, name in enumerate(all_names) if name in usecols]
+    else:
+        positions = list(range(len(all_names)))
+    names = [all_names[i] if i < len(all_names) else f"Unnamed: {i}" for i in positions]
+    return positions, names
+
+
+def _to_text(df):
+    for col in df.columns:
+        df[col] = [cell_text(v) for v in df[col]]
+    return df
+
+
+def _iter_xlsx_batches(file_path, sheet_name, header_row, batch_size, usecols, col_indices):
+    with XlsxSheetReader(file_path, _xlsx_sheet_name(file_path, sheet_name)) as reader:
+        if header_row:
+            header, width = _xlsx_header(reader, header_row), 0
+        else:
+            header, width = None, reader.size()[1]
+        positions, names = _select_columns(header, width, usecols, col_indices)
+        yield names
+
+        col_map = {i + 1: pos for pos, i in enumerate(positions)}
+        start_row = header_row + 1
+        rows = dense_rows(reader.iter_rows(min_row=start_row, columns=col_map), col_map, start_row)
+        while True:
+            block = list(itertools.islice(rows, batch_size))
+            if not block:
+                break
+            df = pd.DataFrame([row for _, row in block], columns=names, dtype=object)
+            yield df, block[0][0]
+
+
+def _iter_xls_batches(file_path, sheet_name, header_row, batch_size, usecols, col_indices):
+    bk = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sh = _xls_sheet(bk, sheet_name)
+        header = _xls_header(sh, header_row) if header_row else None
+        positions, names = _select_columns(header, sh.ncols, usecols, col_indices)
+        yield names
+
+        for start in range(header_row, sh.nrows, batch_size):
+            end = min(start + batch_size, sh.nrows)
+            columns = {}
+            for pos, c in enumerate(positions):
+                if c < sh.ncols:
+                    columns[pos] = xls_column(sh, c, start, end, bk.datemode,
+                                              empty_value=None, native_bools=True)
+                else:
+                    columns[pos] = [None] * (end - start)
+            df = pd.DataFrame(columns, index=pd.RangeIndex(end - start), dtype=object)
+            df.columns = names
+            yield df, start + 1
+    finally:
+        bk.release_resources()
+
+
+def _iter_csv_batches(file_path, header_row, batch_size, usecols, col_indices, as_str):
+    header = _csv_header(file_path, header_row) if header_row else None
+    if header is None and col_indices is None:
+        positions, names = None, None  # 无表头且不投影：列数由 read_csv 按首行确定
+    else:
+        positions, names = _select_columns(header, 0, usecols, col_indices)
+    yield names
+
+    # csv 本身就是文本，as_str 时直接按字符串解析，不再逐单元格转换
+    na_options = {'na_filter': False} if as_str else {'keep_default_na': False, 'na_values': ['']}
+    reader = pd.read_csv(file_path, encoding=detect_encoding(file_path), header=None,
+                         skiprows=header_row, usecols=positions, dtype=str if as_str else object,
+                         chunksize=batch_size, **na_options)
+    start = header_row + 1
+    for chunk in reader:
+        if names is not None:
+            chunk.columns = names
+        chunk.index = pd.RangeIndex(len(chunk))
+        yield chunk, start
+        start += len(chunk)
+
+
+def iter_table_batches(file_path, sheet_name=None, header_row=1, batch_size=BATCH_ROWS,
+                       usecols=None, col_indices=None, as_str=False, row_no_column=None):
+    """
+    按 batch_size 行分批产出 DataFrame，内存占用与文件大小无关
+    sheet_name: 页签名，None 取第一个页签；csv 忽略该参数
+    header_row: 表头所在行号（从1开始），数据从下一行开始；0 表示没有表头，
+                列名为列下标 0..n-1，所有行都是数据
+    usecols: 只读取这些列名（按表头匹配）；col_indices: 按列下标（从0开始）投影，优先于 usecols
+    as_str: 所有单元格转文本（空单元格为 ''），否则保留原始取值
+    row_no_column: 给定列名时追加原表中的行号列（从1开始）
+    """
+    fmt = table_format(file_path)
+    if fmt == 'xlsx':
+        batches = _iter_xlsx_batches(file_path, sheet_name, header_row, batch_size, usecols, col_indices)
+    elif fmt == 'xls':
+        batches = _iter_xls_batches(file_path, sheet_name, header_row, batch_size, usecols, col_indices)
+    else:
+        batches = _iter_csv_batches(file_path, header_row, batch_size, usecols, col_indices, as_str)
+
+    # 各解析器先产出列名，再逐批产出 (DataFrame, 首行行号)
+    names = next(batches)
+    emitted = False
+    for df, first_row in batches:
+        if as_str and fmt != 'csv':
+            df = _to_text(df)
+        if row_no_column:
+            df[row_no_column] = np.arange(first_row, first_row + len(df))
+        emitted = True
+        yield df
+    if not emitted:
+        cols = list(names or [])
+        yield pd.DataFrame(columns=cols + [row_no_column] if row_no_column else cols,
+                           dtype=str if as_str else object)
+
+
+def read_table(file_path, sheet_name=None, header_row=1, usecols=None, as_str=False,
+               batch_size=BATCH_ROWS):
+    """整表读取：分批读取后拼接，参数含义同 iter_table_batches"""
+    batches = list(iter_table_batches(file_path, sheet_name, header_row=header_row,
+                                      batch_size=batch_size, usecols=usecols, as_str=as_str))
+    if len(batches) == 1:
+        return batches[0]
+    return pd.concat(batches, ignore_index=True)
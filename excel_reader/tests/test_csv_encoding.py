@@ -0,0 +1,52 @@
+# test_csv_encoding.py
+"""
+CSV 编码探测：GBK 与带 BOM 的 UTF-8 按文件开头样本识别，同一文件未变化时复用缓存结果
+"""
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+
+import pandas as pd
+
+from excel_reader import csv_encoding
+from excel_reader.csv_encoding import detect_encoding
+
+ROWS = ['资产编码,资产名称,使用部门', '1001,变压器,运维检修部', '1002,断路器,物资部'] * 50
+
+
+def _write(path, encoding):
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write('\n'.join(ROWS) + '\n')
+    return str(path)
+
+
+def test_detect_gbk(tmp_path):
+    path = _write(tmp_path / 'gbk.csv', 'gbk')
+    encoding = detect_encoding(path)
+    assert encoding == 'gb18030'
+    assert pd.read_csv(path, encoding=encoding).columns[1] == '资产名称'
+
+
+def test_detect_utf8_bom(tmp_path):
+    path = _write(tmp_path / 'bom.csv', 'utf-8-sig')
+    encoding = detect_encoding(path)
+    assert encoding == 'utf-8-sig'
+    assert pd.read_csv(path, encoding=encoding).columns[0] == '资产编码'  # BOM 不会混进表头
+
+
+def test_detect_encoding_cached(tmp_path, monkeypatch):
+    path = _write(tmp_path / 'cached.csv', 'utf-8')
+    assert detect_encoding(path) == 'utf-8'
+
+    def fail(f):
+        raise AssertionError("未变化的文件不应重新探测")
+    monkeypatch.setattr(csv_encoding, '_sniff', fail)
+    assert detect_encoding(path) == 'utf-8'
+
+    # 文件内容变化（大小、修改时间变化）后重新探测
+    monkeypatch.undo()
+    _write(tmp_path / 'cached.csv', 'gbk')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert detect_encoding(path) == 'gb18030'
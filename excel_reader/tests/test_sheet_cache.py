@@ -0,0 +1,87 @@
+# test_sheet_cache.py
+"""
+已解析页签缓存：读取参数相同则命中；解析代码或分块大小变化后不命中；
+小于阈值的文件、按模式不缓存的表不使用缓存
+"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from excel_reader import data_handler, sheet_cache
+from excel_reader.sheet_cache import should_cache
+
+PLATFORM_FILE = os.path.join(REPO_DIR, '平台测试文件1.xlsx')
+SHEET = 'Sheet1'
+
+
+@pytest.fixture
+def parses(tmp_path, monkeypatch):
+    """缓存目录指向临时目录，返回实际解析次数的计数"""
+    monkeypatch.setattr(sheet_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(sheet_cache, '_parser_digest', 'parser-v1')
+    calls = []
+    parse = data_handler._parse_excel_chunks
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return parse(*args, **kwargs)
+    monkeypatch.setattr(data_handler, '_parse_excel_chunks', counting)
+    return calls
+
+
+def _read(chunk_size=10000):
+    return data_handler.read_excel_fast(PLATFORM_FILE, SHEET, is_file1=True, chunk_size=chunk_size,
+                                        use_cache=True, categorical=True)
+
+
+def test_hit_on_identical_options(parses):
+    first = _read()
+    second = _read()
+    assert len(parses) == 1
+    assert second.equals(first)
+    assert list(second.dtypes) == list(first.dtypes)
+
+
+def test_miss_after_chunk_size_change(parses):
+    _read(chunk_size=10000)
+    _read(chunk_size=2000)
+    assert len(parses) == 2
+
+
+def test_miss_after_parser_change(parses, monkeypatch):
+    _read()
+    monkeypatch.setattr(sheet_cache, '_parser_digest', 'parser-v2')
+    _read()
+    assert len(parses) == 2
+
+
+def test_should_cache_threshold_and_mode(monkeypatch):
+    size = os.path.getsize(PLATFORM_FILE)
+    monkeypatch.setattr(sheet_cache, 'CACHE_MODE', sheet_cache.CACHE_MODE_PLATFORM)
+    monkeypatch.setattr(sheet_cache, 'CACHE_MIN_BYTES', size + 1)
+    assert not should_cache(PLATFORM_FILE, True)  # 小于阈值，重新解析更快
+
+    monkeypatch.setattr(sheet_cache, 'CACHE_MIN_BYTES', size)
+    assert should_cache(PLATFORM_FILE, True)
+    assert not should_cache(PLATFORM_FILE, False)  # 默认只缓存平台表
+
+    monkeypatch.setattr(sheet_cache, 'CACHE_MODE', sheet_cache.CACHE_MODE_ALL)
+    assert should_cache(PLATFORM_FILE, False)
+    monkeypatch.setattr(sheet_cache, 'CACHE_MODE', sheet_cache.CACHE_MODE_OFF)
+    assert not should_cache(PLATFORM_FILE, True)
+
+
+def test_small_file_not_cached(tmp_path, monkeypatch):
+    """导入时按 should_cache 决定是否缓存：小文件读取后缓存目录里没有条目"""
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr(sheet_cache, 'CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(sheet_cache, 'CACHE_MODE', sheet_cache.CACHE_MODE_ALL)
+    monkeypatch.setattr(sheet_cache, 'CACHE_MIN_BYTES', os.path.getsize(PLATFORM_FILE) + 1)
+    data_handler.read_excel_fast(PLATFORM_FILE, SHEET, is_file1=True,
+                                 use_cache=should_cache(PLATFORM_FILE, True))
+    assert not cache_dir.exists() or not os.listdir(cache_dir)
@@ -0,0 +1,83 @@
+# test_table_size.py
+"""
+页签规模：xls 只读 DIMENSIONS 记录（xlrd 内部属性不可用时加载页签取行列数），
+csv 按文件开头的样本估算行数；默认（estimate=False）仍为精确值
+"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_DIR)
+
+import xlrd
+
+from excel_reader import table_reader
+from excel_reader.table_reader import table_size
+
+
+@pytest.fixture
+def xls_file(tmp_path):
+    xlwt = pytest.importorskip('xlwt')
+    wb = xlwt.Workbook()
+    for name, rows, cols in (('平台', 120, 5), ('ERP', 30, 7)):
+        ws = wb.add_sheet(name)
+        for r in range(rows):
+            for c in range(cols):
+                ws.write(r, c, f'c{c}' if r == 0 else r * c)
+    path = str(tmp_path / 'sizes.xls')
+    wb.save(path)
+    return path
+
+
+class _PublicBook:
+    """只暴露 xlrd 公开接口的 Book 代理，模拟内部属性改名或移除的 xlrd 版本"""
+
+    def __init__(self, bk):
+        self._bk = bk
+
+    def __getattr__(self, name):
+        if name in ('mem', '_sh_abs_posn'):
+            raise AttributeError(name)
+        return getattr(self._bk, name)
+
+
+def test_xls_size_from_dimensions(xls_file):
+    assert table_size(xls_file, 'ERP', estimate=True) == (30, 7)
+    assert table_size(xls_file, 'ERP') == (30, 7)
+    assert table_reader.read_xls_sheet_sizes(xls_file) == {'平台': (120, 5), 'ERP': (30, 7)}
+
+    bk = xlrd.open_workbook(xls_file, on_demand=True)
+    try:
+        assert table_reader._xls_sheet_size(bk, 0) == (120, 5)
+        assert not bk.sheet_loaded(0)  # 只读了记录头，没有加载页签
+    finally:
+        bk.release_resources()
+
+
+def test_xls_size_without_xlrd_internals(xls_file):
+    bk = xlrd.open_workbook(xls_file, on_demand=True)
+    try:
+        public = _PublicBook(bk)
+        assert table_reader._xls_dimensions(public, 1) is None
+        assert table_reader._xls_sheet_size(public, 1) == (30, 7)
+        assert not bk.sheet_loaded(1)  # 取完行列数即卸载
+    finally:
+        bk.release_resources()
+
+
+def test_csv_size_estimate(tmp_path, monkeypatch):
+    path = str(tmp_path / 'rows.csv')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('资产编码,资产名称,数量\n')
+        for i in range(5000):
+            f.write(f'{100000 + i},设备{i % 7},{i % 13}\n')
+
+    # 文件不超过样本大小时按换行符精确计数
+    assert table_size(path, estimate=True) == table_size(path) == (5001, 3)
+
+    monkeypatch.setattr(table_reader, 'CSV_SAMPLE_BYTES', 4096)
+    rows, cols = table_size(path, estimate=True)
+    assert cols == 3
+    assert abs(rows - 5001) < 5001 * 0.05
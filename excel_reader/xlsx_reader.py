@@ -0,0 +1,641 @@
+# xlsx_reader.py
+"""
+流式 xlsx 读取：直接解析 zip 包内的 XML，不构建 openpyxl 的单元格对象图
+
+- sharedStrings.xml、sheetN.xml 都用 iterparse 增量解析，逐行产出
+- 合并单元格直接从工作表 XML 的 <mergeCells> 块中扫描得到
+- 单元格取值规则与 openpyxl(data_only=True) 保持一致（数字/日期/布尔/错误值）
+"""
+import os
+import re
+import mmap
+import shutil
+import zipfile
+import tempfile
+import posixpath
+import itertools
+import multiprocessing
+import xml.etree.ElementTree as ET
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, MAC_EPOCH
+
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# 扫描 <mergeCells> 时每次解压的块大小
+SCAN_BLOCK_SIZE = 1 << 20
+
+# 解压后的工作表 XML 超过该大小才启用分片并行解析（小表进程启动开销得不偿失）
+SHARD_MIN_BYTES = 64 << 20
+# 每个进程至少分到的分片数；多切几段便于结果边解析边回传，主进程内存更平稳
+SHARDS_PER_WORKER = 4
+# 单个分片的目标 XML 字节数：大表按此切得更细，每个分片的解析结果大小有上限
+SHARD_TARGET_BYTES = 16 << 20
+# 每个进程同时在途（已提交、未被消费）的分片数；主进程驻留的解析结果不超过 workers * 该值个分片
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\b[^>]*?\bref="([A-Z]+\d+(?::[A-Z]+\d+)?)"')
+_MERGE_REF_RE = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Z]+\d+(?::[A-Z]+\d+)?)"')
+_CELL_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+_ROOT_TAG_RE = re.compile(rb'<((?:\w+:)?)worksheet\b[^>]*>')
+_SHEETDATA_OPEN_RE = re.compile(rb'<((?:\w+:)?)sheetData\b[^>]*?(/?)>')
+_ROW_TAG_RE = re.compile(rb'<(?:\w+:)?row[\s>]')
+_ROW_NUMBER_RE = re.compile(rb'\sr="\d+"')
+_ROW_INDEX_RE = re.compile(rb'<(?:\w+:)?row\b[^>]*?\sr="(\d+)"')
+_CELL_COLUMN_RE = re.compile(rb'<(?:\w+:)?c\b[^>]*?\sr="([A-Z]+)\d+"')
+
+
+def _local(tag):
+    """去掉命名空间，返回本地标签名"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def column_index(letters):
+    """列字母转 1 开始的列号，如 A -> 1, AA -> 27"""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def split_ref(ref):
+    """单元格引用拆成 (行号, 列号)，均从 1 开始"""
+    m = _CELL_REF_RE.match(ref)
+    if not m:
+        raise ValueError(f"无法识别的单元格引用: {ref}")
+    return int(m.group(2)), column_index(m.group(1))
+
+
+def range_bounds(ref):
+    """区域引用转 (min_col, min_row, max_col, max_row)，与 openpyxl 的 bounds 一致"""
+    first, _, last = ref.partition(':')
+    r1, c1 = split_ref(first)
+    r2, c2 = split_ref(last or first)
+    return c1, r1, c2, r2
+
+
+# =========================================================
+# 工作簿级信息
+# =========================================================
+def read_workbook_info(zf):
+    """
+    返回 (sheets, epoch)
+    sheets: [(页签名, 工作表在 zip 中的路径), ...]，按工作簿顺序
+    """
+    root = ET.fromstring(zf.read('xl/workbook.xml'))
+
+    rels = {}
+    try:
+        rel_root = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        for rel in rel_root:
+            target = rel.attrib.get('Target', '')
+            if target.startswith('/'):
+                path = target.lstrip('/')
+            else:
+                path = posixpath.normpath(posixpath.join('xl', target))
+            rels[rel.attrib.get('Id')] = path
+    except KeyError:
+        pass
+
+    epoch = WINDOWS_EPOCH
+    sheets = []
+    for elem in root.iter():
+        name = _local(elem.tag)
+        if name == 'workbookPr':
+            if elem.attrib.get('date1904') in ('1', 'true'):
+                epoch = MAC_EPOCH
+        elif name == 'sheet':
+            rid = elem.attrib.get(f'{{{REL_NS}}}id')
+            path = rels.get(rid) or f"xl/worksheets/sheet{len(sheets) + 1}.xml"
+            sheets.append((elem.attrib['name'], path))
+    return sheets, epoch
+
+
+def resolve_sheet_path(zf, sheet_name):
+    """根据页签名找到工作表 XML 路径"""
+    sheets, epoch = read_workbook_info(zf)
+    for name, path in sheets:
+        if name == sheet_name:
+            return path, epoch
+    raise KeyError(f"工作簿中不存在页签: {sheet_name}")
+
+
+def iter_shared_strings(zf):
+    """增量解析 sharedStrings.xml，逐条产出字符串（富文本拼接，忽略拼音注释）"""
+    try:
+        fp = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return
+
+    with fp:
+        context = ET.iterparse(fp, events=('start', 'end'))
+        root = None
+        for event, elem in context:
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            name = _local(elem.tag)
+            if name == 'si':
+                parts = []
+                for child in elem:
+                    child_name = _local(child.tag)
+                    if child_name == 't':
+                        parts.append(child.text or '')
+                    elif child_name == 'r':
+                        for t in child:
+                            if _local(t.tag) == 't':
+                                parts.append(t.text or '')
+                yield ''.join(parts)
+                root.clear()
+
+
+def read_shared_strings(zf):
+    """读取全部共享字符串，返回列表"""
+    return list(iter_shared_strings(zf))
+
+
+class _SharedStringPrefix:
+    """
+    按需读取的共享字符串表：只解析到被访问的最大下标为止
+    表头单元格通常是最先写入共享字符串表的几项，探测表头时无需解析整张表
+    """
+
+    def __init__(self, zf):
+        self._items = []
+        self._source = iter_shared_strings(zf)
+
+    def __getitem__(self, idx):
+        while idx >= len(self._items):
+            try:
+                self._items.append(next(self._source))
+            except StopIteration:
+                raise IndexError(f"共享字符串下标越界: {idx}")
+        return self._items[idx]
+
+
+def read_date_styles(zf):
+    """返回 (日期样式索引集合, 时长样式索引集合)，判定规则与 openpyxl 相同"""
+    try:
+        root = ET.fromstring(zf.read('xl/styles.xml'))
+    except KeyError:
+        return set(), set()
+
+    custom = {}
+    cell_xfs = []
+    for elem in root:
+        name = _local(elem.tag)
+        if name == 'numFmts':
+            for fmt in elem:
+                custom[int(fmt.attrib.get('numFmtId', 0))] = fmt.attrib.get('formatCode', '')
+        elif name == 'cellXfs':
+            cell_xfs = [int(xf.attrib.get('numFmtId', 0)) for xf in elem]
+
+    date_styles, timedelta_styles = set(), set()
+    for idx, fmt_id in enumerate(cell_xfs):
+        fmt = custom.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+        if not fmt:
+            continue
+        if is_date_format(fmt):
+            date_styles.add(idx)
+        if is_timedelta_format(fmt):
+            timedelta_styles.add(idx)
+    return date_styles, timedelta_styles
+
+
+# =========================================================
+# 工作表级信息
+# =========================================================
+def read_merged_ranges(zf, sheet_path):
+    """
+    流式解压工作表 XML，只用字节扫描找出 <mergeCell ref="..."> 列表
+    返回 [(min_col, min_row, max_col, max_row), ...]
+    """
+    ranges = []
+    tail = b''
+    with zf.open(sheet_path) as fp:
+        while True:
+            block = fp.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            buf = tail + block
+            # 只在包含标签的块里跑正则，其余块只保留尾部防止标签被截断
+            if b'mergeCell' in buf:
+                last_end = 0
+                for m in _MERGE_REF_RE.finditer(buf):
+                    ranges.append(range_bounds(m.group(1).decode('ascii')))
+                    last_end = m.end()
+                tail = buf[max(last_end, len(buf) - 256):]
+            else:
+                tail = buf[-256:]
+    return ranges
+
+
+def read_dimension(zf, sheet_path):
+    """
+    读取工作表开头的 <dimension ref="A1:Z100">，只解压首个数据块
+    返回 (min_col, min_row, max_col, max_row)；没有该节点时返回 None
+    """
+    with zf.open(sheet_path) as fp:
+        head = fp.read(8192)
+    m = _DIMENSION_RE.search(head)
+    if not m:
+        return None
+    return range_bounds(m.group(1).decode('ascii'))
+
+
+def scan_sheet_size(zf, sheet_path):
+    """
+    没有可用 <dimension> 时的兜底：流式解压工作表 XML，字节扫描 <row> 标签
+    返回 (行数, 列数)：行数取最大行号（无 r 属性时取行标签个数），
+    列数取首个数据块内出现的最大列号（表头和前几千行足以代表整表列宽）
+    """
+    row_tags = 0
+    max_row = 0
+    max_col = 0
+    first_block = True
+    tail = b''
+    with zf.open(sheet_path) as fp:
+        while True:
+            block = fp.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            buf = tail + block
+            # 在最后一个 '<' 处截断：之前的标签都完整，剩余部分并入下一块
+            cut = buf.rfind(b'<')
+            part, tail = buf[:cut], buf[cut:]
+            row_tags += len(_ROW_TAG_RE.findall(part))
+            numbers = _ROW_INDEX_RE.findall(part)
+            if numbers:
+                max_row = max(max_row, int(numbers[-1]))
+            if first_block and row_tags:
+                max_col = max((column_index(c.decode('ascii')) for c in set(_CELL_COLUMN_RE.findall(part))),
+                              default=0)
+                first_block = False
+    row_tags += len(_ROW_TAG_RE.findall(tail))
+    return max(max_row, row_tags), max_col
+
+
+def sheet_size(zf, sheet_path):
+    """
+    页签的 (行数, 列数)，行数包含表头行
+    优先读 <dimension>（只解压开头 8KB）；缺失或只写了 A1 的文件退回字节扫描
+    """
+    dim = read_dimension(zf, sheet_path)
+    if dim and dim[2:] != (1, 1):
+        return dim[3], dim[2]
+    return scan_sheet_size(zf, sheet_path)
+
+
+def read_sheet_sizes(file_path):
+    """工作簿内所有页签的 {页签名: (行数, 列数)}，按工作簿顺序"""
+    with zipfile.ZipFile(file_path, 'r') as zf:
+        sheets, _ = read_workbook_info(zf)
+        return {name: sheet_size(zf, path) for name, path in sheets}
+
+
+def _convert_value(ctype, text, style_id, shared_strings, date_styles, timedelta_styles, epoch):
+    """单元格原始文本 -> Python 值（与 openpyxl data_only 模式一致）"""
+    if ctype == 'n':
+        if '.' in text or 'E' in text or 'e' in text:
+            value = float(text)
+        else:
+            value = int(text)
+        if style_id in date_styles:
+            try:
+                return from_excel(value, epoch, timedelta=style_id in timedelta_styles)
+            except (OverflowError, ValueError):
+                return '#VALUE!'
+        return value
+    if ctype == 's':
+        return shared_strings[int(text)]
+    if ctype == 'b':
+        return bool(int(text))
+    if ctype == 'd':
+        return from_ISO8601(text)
+    # str / e：公式字符串结果、错误值按原文返回
+    return text
+
+
+def iter_sheet_rows(zf, sheet_path, shared_strings, date_styles=frozenset(),
+                    timedelta_styles=frozenset(), epoch=WINDOWS_EPOCH, min_row=1, columns=None):
+    """
+    逐行产出 (行号, {列号: 值})，行号/列号从 1 开始
+    只包含有值的单元格；空行（只有样式）产出空字典，便于调用方统计行数
+    min_row: 小于该行号的行直接跳过，不做取值转换
+    columns: 需要的列号集合（投影），为 None 时读取全部列；集合外的单元格在解析时即被丢弃
+    """
+    with zf.open(sheet_path) as fp:
+        yield from _iter_rows_from(fp, shared_strings, date_styles, timedelta_styles, epoch,
+                                   min_row, columns)
+
+
+def _iter_rows_from(fp, shared_strings, date_styles, timedelta_styles, epoch, min_row, columns):
+    """从任意可读的工作表 XML 字节流中逐行解析，参数含义同 iter_sheet_rows"""
+    context = ET.iterparse(fp, events=('start', 'end'))
+    sheet_data = None
+    row_counter = 0
+    ns = ''
+    for event, elem in context:
+        if event == 'start':
+            if sheet_data is None and _local(elem.tag) == 'sheetData':
+                sheet_data = elem
+                ns = elem.tag[:-len('sheetData')]
+            continue
+
+        if elem.tag != ns + 'row' or sheet_data is None:
+            continue
+
+        r = elem.attrib.get('r')
+        row_counter = int(r) if r else row_counter + 1
+        if row_counter < min_row:
+            sheet_data.clear()
+            continue
+
+        values = {}
+        col_counter = 0
+        v_tag, is_tag, t_tag = ns + 'v', ns + 'is', ns + 't'
+        for c in elem:
+            ref = c.attrib.get('r')
+            if ref:
+                col_counter = column_index(ref.rstrip('0123456789'))
+            else:
+                col_counter += 1
+            if columns is not None and col_counter not in columns:
+                continue
+
+            ctype = c.attrib.get('t', 'n')
+            if ctype == 'inlineStr':
+                inline = c.find(is_tag)
+                if inline is not None:
+                    values[col_counter] = ''.join(t.text or '' for t in inline.iter(t_tag))
+                continue
+
+            text = c.findtext(v_tag)
+            if not text:
+                continue
+            style = c.attrib.get('s')
+            style_id = int(style) if style else 0
+            values[col_counter] = _convert_value(ctype, text, style_id, shared_strings,
+                                                 date_styles, timedelta_styles, epoch)
+
+        yield row_counter, values
+        # 处理完即释放已解析的行，保证内存占用与行数无关
+        sheet_data.clear()
+
+
+# =========================================================
+# 分片并行解析
+# =========================================================
+class _RangeReader:
+    """把 头部字节 + 文件[start:end) + 尾部字节 拼成一个只读流，供 iterparse 使用"""
+
+    def __init__(self, fp, start, end, head, tail):
+        self.fp = fp
+        self.remaining = end - start
+        self.head = head
+        self.tail = tail
+        fp.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = 1 << 30
+        out = b''
+        if self.head:
+            out, self.head = self.head[:size], self.head[size:]
+        if len(out) < size and self.remaining > 0:
+            data = self.fp.read(min(size - len(out), self.remaining))
+            self.remaining -= len(data)
+            if not data:
+                self.remaining = 0
+            out += data
+        if len(out) < size and self.remaining <= 0 and self.tail:
+            take = size - len(out)
+            out, self.tail = out + self.tail[:take], self.tail[take:]
+        return out
+
+
+def extract_sheet_xml(zf, sheet_path, dst_path):
+    """把工作表 XML 解压到本地文件，分片进程据字节偏移随机读取"""
+    with zf.open(sheet_path) as src, open(dst_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, SCAN_BLOCK_SIZE)
+
+
+def plan_row_shards(xml_path, n_shards):
+    """
+    在解压后的工作表 XML 中按字节把 <sheetData> 均分为 n_shards 段，边界对齐到 <row 标签
+    返回 (包装头, 包装尾, [(起始偏移, 结束偏移), ...])；
+    行没有 r 属性（行号只能顺序推算）时无法分片，返回 None
+    """
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        root = _ROOT_TAG_RE.search(mm, 0, 1 << 16)
+        open_tag = _SHEETDATA_OPEN_RE.search(mm, root.end() if root else 0)
+        if not root or not open_tag or open_tag.group(2):
+            return None
+        prefix = open_tag.group(1)
+        data_start = open_tag.end()
+        data_end = mm.rfind(b'</' + prefix + b'sheetData>')
+        if data_end < data_start:
+            return None
+
+        first_row = _ROW_TAG_RE.search(mm, data_start, data_end)
+        if not first_row:
+            return None
+        tag_end = mm.find(b'>', first_row.start())
+        if not _ROW_NUMBER_RE.search(mm[first_row.start():tag_end]):
+            return None
+
+        bounds = [data_start]
+        for i in range(1, n_shards):
+            pos = data_start + (data_end - data_start) * i // n_shards
+            m = _ROW_TAG_RE.search(mm, max(pos, bounds[-1] + 1), data_end)
+            if not m:
+                break
+            bounds.append(m.start())
+        bounds.append(data_end)
+
+        head = root.group(0) + b'<' + prefix + b'sheetData>'
+        tail = b'</' + prefix + b'sheetData></' + root.group(1) + b'worksheet>'
+    return head, tail, list(zip(bounds[:-1], bounds[1:]))
+
+
+# 分片子进程内的只读上下文（共享字符串表等），由进程池 initializer 每进程设置一次
+_shard_context = {}
+
+
+def _init_shard_worker(xml_path, head, tail, shared_strings, date_styles, timedelta_styles, epoch):
+    _shard_context.update(xml_path=xml_path, head=head, tail=tail, shared_strings=shared_strings,
+                          date_styles=date_styles, timedelta_styles=timedelta_styles, epoch=epoch)
+
+
+def _parse_shard(task):
+    """
+    子进程：解析一个字节区间内的所有行，按列返回 (行号数组, {列号: (行下标数组, 值列表)})
+    每个单元格只占一个值和一个整数下标，不再为每行建一个字典，回传和驻留都更紧凑
+    """
+    start, end, min_row, columns = task
+    ctx = _shard_context
+    row_numbers = array('q')
+    cells = {}
+    with open(ctx['xml_path'], 'rb') as f:
+        fp = _RangeReader(f, start, end, ctx['head'], ctx['tail'])
+        for i, (row_idx, values) in enumerate(_iter_rows_from(fp, ctx['shared_strings'], ctx['date_styles'],
+                                                              ctx['timedelta_styles'], ctx['epoch'],
+                                                              min_row, columns)):
+            row_numbers.append(row_idx)
+            for col, val in values.items():
+                column = cells.get(col)
+                if column is None:
+                    column = cells[col] = (array('q'), [])
+                column[0].append(i)
+                column[1].append(val)
+    return row_numbers, cells
+
+
+def _shard_rows(result):
+    """把 _parse_shard 的按列结果逐行还原成 (行号, {列号: 值})"""
+    row_numbers, cells = result
+    # 每列一个游标：[下一个 (行下标, 值), 迭代器, 列号]
+    cursors = []
+    for col, (positions, values) in cells.items():
+        it = zip(positions, values)
+        cursors.append([next(it, None), it, col])
+    for i, row_idx in enumerate(row_numbers):
+        values = {}
+        for cursor in cursors:
+            head = cursor[0]
+            if head is not None and head[0] == i:
+                values[cursor[2]] = head[1]
+                cursor[0] = next(cursor[1], None)
+        yield row_idx, values
+
+
+def iter_sheet_rows_sharded(reader, workers, min_row=1, columns=None):
+    """
+    多进程按行区间分片解析同一工作表，按行号顺序产出 (行号, {列号: 值})
+    工作表 XML 先解压到临时文件，按 SHARD_TARGET_BYTES 切段（至少 workers * SHARDS_PER_WORKER 段）
+    交给进程池；同时在途的分片不超过 workers * SHARDS_IN_FLIGHT_PER_WORKER 个，
+    主进程内存与表的总行数无关。共享字符串表通过 initializer 每个进程只传一次
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='xlsx_shard_')
+    xml_path = os.path.join(tmp_dir, 'sheet.xml')
+    try:
+        extract_sheet_xml(reader.zf, reader.sheet_path, xml_path)
+        n_shards = max(workers * SHARDS_PER_WORKER, os.path.getsize(xml_path) // SHARD_TARGET_BYTES)
+        plan = plan_row_shards(xml_path, n_shards)
+        if plan is None:
+            yield from reader.iter_rows(min_row=min_row, columns=columns)
+            return
+
+        head, tail, shards = plan
+        tasks = ((start, end, min_row, columns) for start, end in shards)
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_shard_worker,
+                                 initargs=(xml_path, head, tail, reader.shared_strings,
+                                           reader.date_styles, reader.timedelta_styles,
+                                           reader.epoch)) as pool:
+            # 滑动窗口：按提交顺序取结果（分片结果天然按行号有序拼接），每取走一个再补交一个
+            pending = deque(pool.submit(_parse_shard, task)
+                            for task in itertools.islice(tasks, workers * SHARDS_IN_FLIGHT_PER_WORKER))
+            try:
+                while pending:
+                    result = pending.popleft().result()
+                    task = next(tasks, None)
+                    if task is not None:
+                        pending.append(pool.submit(_parse_shard, task))
+                    yield from _shard_rows(result)
+                    del result
+            finally:
+                # 调用方提前停止读取时，不再等待未开始的分片
+                for future in pending:
+                    future.cancel()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class XlsxSheetReader:
+    """
+    打开单个页签的流式读取器
+    用法：
+        with XlsxSheetReader(path, sheet_name) as reader:
+            merged = reader.merged_ranges()
+            for row_idx, values in reader.iter_rows():
+                ...
+    """
+
+    def __init__(self, file_path, sheet_name):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.zf = zipfile.ZipFile(file_path, 'r')
+        try:
+            self.sheet_path, self.epoch = resolve_sheet_path(self.zf, sheet_name)
+            self.date_styles, self.timedelta_styles = read_date_styles(self.zf)
+        except Exception:
+            self.zf.close()
+            raise
+        self._shared_strings = None  # 首次读取数据行时才整表解析
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = read_shared_strings(self.zf)
+        return self._shared_strings
+
+    def head_rows(self, max_row):
+        """
+        只解析前 max_row 行，产出 (行号, {列号: 值})
+        共享字符串按需解析到表头用到的下标为止，工作表 XML 只解压开头几 KB
+        """
+        strings = self._shared_strings
+        if strings is None:
+            strings = _SharedStringPrefix(self.zf)
+        rows = iter_sheet_rows(self.zf, self.sheet_path, strings, self.date_styles,
+                               self.timedelta_styles, self.epoch)
+        try:
+            for row_idx, values in rows:
+                if row_idx > max_row:
+                    break
+                yield row_idx, values
+        finally:
+            rows.close()
+
+    def merged_ranges(self):
+        return read_merged_ranges(self.zf, self.sheet_path)
+
+    def dimension(self):
+        return read_dimension(self.zf, self.sheet_path)
+
+    def size(self):
+        return sheet_size(self.zf, self.sheet_path)
+
+    def iter_rows(self, min_row=1, columns=None):
+        return iter_sheet_rows(self.zf, self.sheet_path, self.shared_strings,
+                               self.date_styles, self.timedelta_styles, self.epoch,
+                               min_row=min_row, columns=columns)
+
+    def xml_size(self):
+        """工作表 XML 解压后的字节数（取自 zip 目录，无需解压）"""
+        return self.zf.getinfo(self.sheet_path).file_size
+
+    def iter_rows_parallel(self, workers, min_row=1, columns=None):
+        """
+        与 iter_rows 结果相同的并行版本
+        workers <= 1 或工作表小于 SHARD_MIN_BYTES 时退化为单进程流式解析
+        """
+        if workers <= 1 or self.xml_size() < SHARD_MIN_BYTES:
+            return self.iter_rows(min_row=min_row, columns=columns)
+        return iter_sheet_rows_sharded(self, workers, min_row=min_row, columns=columns)
+
+    def close(self):
+        self.zf.close()
+        self._shared_strings = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
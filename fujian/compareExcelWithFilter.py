@@ -1,38 +1,21 @@
 import argparse
 import pandas as pd
 import os
+import sys
 import logging
-import chardet
+import multiprocessing
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from excel_reader.table_reader import read_table
 
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def detect_encoding(file_path):
-    """检测文件编码"""
-    with open(file_path, 'rb') as f:
-        result = chardet.detect(f.read())
-    return result['encoding']
-
-
 def read_file(file_path, sheet_name=None):
-    """根据文件扩展名读取文件"""
-    _, ext = os.path.splitext(file_path)
-    encoding = detect_encoding(file_path)
-    logging.debug(f"Detected encoding for {file_path}: {encoding}")
-
-    if ext.lower() == '.csv':
-        try:
-            with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-                return pd.read_csv(f).fillna('').astype(str)
-        except UnicodeDecodeError:
-            logging.warning(f"Failed to read {file_path} with detected encoding {encoding}. Trying gbk encoding.")
-            with open(file_path, 'r', encoding='gbk', errors='replace') as f:
-                return pd.read_csv(f).fillna('').astype(str)
-    elif ext.lower() in ['.xls', '.xlsx']:
-        return pd.read_excel(file_path, sheet_name=sheet_name).fillna('').astype(str)
-    else:
-        raise ValueError(f"Unsupported file format: {ext}")
+    """读取 csv/xls/xlsx/et 文件（未指定页签时取第一个页签），所有单元格按文本返回"""
+    logging.debug(f"Reading {file_path} (sheet: {sheet_name})")
+    return read_table(file_path, sheet_name, as_str=True)
 
 
 def find_combinations_filtered(file1, sheet1, col_a, col_b, compid_filter, caption_filter, file2, sheet2, col_c, col_d):
@@ -107,6 +90,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取 xlsx 时的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     main()
 
 
@@ -4,9 +4,15 @@ import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import os
+import sys
 import threading
+import multiprocessing
 from datetime import datetime
 
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from excel_reader.table_reader import read_table
+
 
 class ExcelProcessorApp:
     def __init__(self, root):
@@ -159,15 +165,15 @@ class ExcelProcessorApp:
             self.update_progress(10)
             self.log("开始读取文件...")
 
-            # 读取数据
-            df1 = pd.read_excel(file1_path, dtype={'借方发生额': 'object', '贷方发生额': 'object'})
+            # 读取数据：各列保留单元格原始取值（object），金额不经 float64 转换，保持高精度
+            # 表1只用到凭证编号，只物化这一列
+            df1 = read_table(file1_path, usecols={'SAP凭证编号'})
             self.update_progress(25)
             self.log(f"已读取原始表1，共 {len(df1)} 行数据")
 
-            df2 = pd.read_excel(file2_path, dtype={'借方发生额': 'object', '贷方发生额': 'object'})
+            df2 = read_table(file2_path)
             self.update_progress(30)
             self.log(f"已读取原始表2，共 {len(df2)} 行数据")
-            # 修改 read_excel 调用，确保金额字段保持高精度
 
             # 检查必要的列是否存在
             required_columns = ['SAP凭证编号', '单位', '组织机构', '借方发生额', '贷方发生额']
@@ -187,8 +193,9 @@ class ExcelProcessorApp:
 
             valid_sap = [sap for sap in unique_sap_in_df2 if sap in sap_in_df1]
             filtered_df2 = df2[df2['SAP凭证编号'].isin(valid_sap)]
-            filtered_df2['借方发生额'] = filtered_df2['借方发生额'].apply(lambda x: Decimal(str(x)))
-            filtered_df2['贷方发生额'] = filtered_df2['贷方发生额'].apply(lambda x: Decimal(str(x)))
+            # 空金额保持缺失值，汇总时自动跳过
+            filtered_df2['借方发生额'] = filtered_df2['借方发生额'].apply(lambda x: Decimal(str(x)) if pd.notna(x) else x)
+            filtered_df2['贷方发生额'] = filtered_df2['贷方发生额'].apply(lambda x: Decimal(str(x)) if pd.notna(x) else x)
             self.update_progress(55)
             self.log(f"筛选后保留 {len(filtered_df2)} 行数据")
 
@@ -275,6 +282,8 @@ class ExcelProcessorApp:
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取 xlsx 时的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ExcelProcessorApp(root)
     root.mainloop()
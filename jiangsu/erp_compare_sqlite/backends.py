@@ -0,0 +1,147 @@
+# backends.py
+"""
+比对后端接口
+
+一次比对在后端中依次完成：
+    load           两表分块入库（解析在子进程中完成，后端只负责写入，见 store_chunk）
+    build_keys     入库完成后为拼接主键 _pk_concat 建立访问路径（行存建索引，列存无需处理）
+    classify_keys  主键分为 共同 / 缺失 / 多余 三类，返回各类数量
+    diff_fields    按规则逐字段判定差异，写入长表 field_diff，返回各字段差异数
+    stream_rows    流式取回某一分类的行；stream_diffs 流式取回 field_diff 中的差异
+比对 SQL 由 CompareWorker 按规则生成，方言差异（空值处理、数值转换、IS NOT）通过
+text / number / distinct 等方法抹平；规整函数 norm_text 等在各后端中各自注册，语义一致。
+
+后端由 CompareWorker 的 backend 参数或环境变量 EXCEL_COMPARE_BACKEND 选择：
+    sqlite  行存，单线程，无额外依赖（默认，见 db_handler.StagingDB）
+    duckdb  列存，主键关联和字段比对使用全部 CPU 核，需要安装 duckdb（见 duckdb_backend）
+两者都是进程内嵌入式库，不需要数据库服务。
+"""
+import os
+
+BACKEND_SQLITE = 'sqlite'
+BACKEND_DUCKDB = 'duckdb'
+
+# 默认后端，可通过环境变量覆盖
+BACKEND = os.environ.get('EXCEL_COMPARE_BACKEND', BACKEND_SQLITE).strip().lower()
+
+
+class CompareBackend:
+    """
+    比对后端基类：定义接口，并提供 SQLite 方言的表达式写法（其他后端按需覆盖）
+    子类需实现 open/close/execute/scalar/iter_records 以及下面的比对步骤
+    """
+    name = None
+    REAL_TYPE = 'REAL'  # 计算字段等浮点列的列类型
+
+    def __init__(self):
+        self.loaded_rows = 0        # 批量写入的行数与耗时，用于报告导入速度
+        self.load_seconds = 0.0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ---------- 导入统计 ----------
+    def record_load(self, rows, seconds):
+        self.loaded_rows += rows
+        self.load_seconds += seconds
+
+    def load_rate(self):
+        """批量写入速度（行/秒）"""
+        return self.loaded_rows / self.load_seconds if self.load_seconds else 0.0
+
+    def spill_if_needed(self):
+        """内存库超出预算时转存磁盘，返回是否发生转存；自行管理内存的后端不需要处理"""
+        return False
+
+    # ---------- 方言 ----------
+    @staticmethod
+    def text(expr):
+        """取值为文本，空值为空串"""
+        return f"IFNULL({expr}, '')"
+
+    def empty(self, expr):
+        """取值为空（NULL 或空串）"""
+        return f"{self.text(expr)} = ''"
+
+    @staticmethod
+    def number(expr):
+        """按数值参与运算的取值（SQLite 对文本列做算术时自动转换）"""
+        return expr
+
+    @staticmethod
+    def distinct(left, right):
+        """两个取值不同，NULL 与 NULL 视为相同"""
+        return f"{left} IS NOT {right}"
+
+    @staticmethod
+    def is_number(expr, raw):
+        """规整为 REAL 的列中该单元格是数值或空值；无法解析的单元格在 SQLite 中保留原文本（raw 为原值侧列）"""
+        return f"typeof({expr}) != 'text'"
+
+    @staticmethod
+    def raw_or(raw, expr):
+        """规整列在差异中展示的取值：原值侧列非空时取原值，否则取列值"""
+        return f"COALESCE({raw}, {expr})"
+
+    # ---------- 比对步骤 ----------
+    def store_chunk(self, table_name, chunk, table_created, pk_fields=None, staged=None):
+        """写入一个数据块，首块时建表；返回表是否已建"""
+        raise NotImplementedError
+
+    def load(self, jobs, progress=None, pk_fields=None, staged=None):
+        """多个 Excel 并行解析入库，参数见 db_handler.import_excels_parallel；返回 {表名: 行数}"""
+        from db_handler import import_excels_parallel
+        return import_excels_parallel(self, jobs, progress=progress, pk_fields=pk_fields, staged=staged)
+
+    def load_lookup(self, table, columns, rows, key_columns=None):
+        """规则文件里的映射写成查找临时表；key_columns 重复时保留先出现的一行"""
+        raise NotImplementedError
+
+    def build_keys(self, tables):
+        raise NotImplementedError
+
+    def classify_keys(self, table1, table2):
+        """返回 {KEY_COMMON/KEY_MISSING/KEY_EXTRA: 主键数}"""
+        raise NotImplementedError
+
+    def table_columns(self, table):
+        raise NotImplementedError
+
+    def stream_rows(self, table, status, columns=None):
+        """流式产出主键属于 status 分类的行 {列名: 值}，保持原表行序；columns 为 None 时取整行"""
+        raise NotImplementedError
+
+    def diff_fields(self, table1, table2, checks):
+        """
+        checks: [(字段名, 平台表取值表达式, ERP表取值表达式, 差异条件, 差异说明表达式, 附加关联)]，按规则顺序；
+        表达式中平台表别名 t1、ERP表别名 t2，取值表达式即 field_diff 中记录的两边的值（规整列取原值）。
+        不一致的字段写入 field_diff，返回 {字段: 差异行数}
+        """
+        raise NotImplementedError
+
+    def diff_pair_count(self):
+        """存在差异的行对数"""
+        raise NotImplementedError
+
+    def stream_diffs(self, table1, table2, primary_keys):
+        """
+        按平台表行序流式产出 field_diff 中的差异，同一行对内按规则顺序，逐行产出
+        {src_id, tgt_id, _pk_concat, field, src_value, tgt_value, reason, src_<主键>, tgt_<主键>}
+        （ERP表没有的主键列不产出 tgt_<主键>）
+        """
+        raise NotImplementedError
+
+
+def create_backend(name=None, **kwargs):
+    """按名称创建后端（未打开），name 为空时用 BACKEND；kwargs 为 in_memory、staging_dir 等"""
+    name = (name or BACKEND).strip().lower()
+    if name == BACKEND_SQLITE:
+        from db_handler import StagingDB
+        return StagingDB(**kwargs)
+    if name == BACKEND_DUCKDB:
+        from duckdb_backend import DuckDBBackend
+        return DuckDBBackend(**kwargs)
+    raise Exception(f"未知的比对后端: {name}（可选 {BACKEND_SQLITE} / {BACKEND_DUCKDB}）")
@@ -6,14 +6,24 @@ import pandas as pd
 import re
 import gc
 from PyQt5.QtCore import QThread, pyqtSignal
-from rule_handler import read_enum_mapping, read_erp_combo_map
+from rule_handler import read_enum_mapping, read_erp_combo_map, build_projection, build_column_types, _calc_rule_fields
+from excel_reader.data_handler import sheet_size, suggest_chunk_size, sanitize_column_name
 from db_handler import (
-    init_database, import_excel_to_db, execute_query, drop_tables,
-    create_compare_index, fetch_rows_by_pk, prepare_asset_category_mapping, _load_asset_category_mapping
+    estimate_staged_bytes, MEMORY_BUDGET_BYTES, KEY_COMMON, KEY_MISSING, KEY_EXTRA,
+    prepare_asset_category_mapping, StagedColumn, raw_column
 )
+from backends import create_backend, BACKEND, BACKEND_SQLITE
 
 TEMP_TABLE1 = 'temp_table1'
 TEMP_TABLE2 = 'temp_table2'
+# 规则文件映射载入暂存库后的查找表
+ERP_COMBO_TABLE = 'erp_combo_pairs'
+VOLTAGE_LEVEL_TABLE = 'voltage_level_pairs'
+
+# 各阶段结束时的进度百分比（导入 / 主键比对 / 字段比对，之后为差异日志输出）
+IMPORT_PROGRESS = 60
+KEY_DIFF_PROGRESS = 70
+FIELD_DIFF_PROGRESS = 85
 
 
 class CompareWorker(QThread):
@@ -21,7 +31,7 @@ class CompareWorker(QThread):
     progress_signal = pyqtSignal(int)
 
     def __init__(self, file1, file2, rule_file, sheet_name1, sheet_name2,
-                 primary_keys=None, rules=None, skip_rows=0, chunk_size=5000):
+                 primary_keys=None, rules=None, skip_rows=0, chunk_size=None, staging_dir=None, backend=None):
         super().__init__()
         self.file1 = file1
         self.file2 = file2
@@ -31,14 +41,23 @@ class CompareWorker(QThread):
         self.primary_keys = primary_keys if primary_keys else []
         self.rules = rules if rules else {}
         self.skip_rows = skip_rows
-        self.chunk_size = chunk_size
+        self.chunk_size = chunk_size  # None 表示按页签规模自动确定
 
         self.missing_assets = []
         self.diff_records = []
         self.summary = {}
         self.missing_rows = []
         self.extra_in_file2 = []
-        self.diff_full_rows = []
+        # 规则投影：只读取/入库规则用到的列
+        self.usecols1, self.usecols2 = build_projection(self.rules)
+        self.usecols1.update(self.primary_keys)
+        self.db = None  # 本次比对的后端库（backends.CompareBackend），run() 中打开；有差异时保留到 release()
+        self.staging_dir = staging_dir  # 暂存库文件目录，None 时用 STAGING_DIR
+        self.backend = backend or BACKEND  # 比对后端：sqlite / duckdb，None 时按环境变量 EXCEL_COMPARE_BACKEND
+        # 规则中的数值/日期列读取时即解析，入库的是统一格式的文本
+        self.types1, self.types2 = build_column_types(self.rules, self.primary_keys)
+        # 暂存库中按规则类型规整存储的列（数值 REAL、规整文本），比对 SQL 对规整列直接比较
+        self.staged1, self.staged2 = self._build_staged_columns()
         self.enum_map = read_enum_mapping(rule_file)
         self.erp_combo_map = read_erp_combo_map(rule_file)
         self.voltage_level_map = {}  # 线站电压等级映射
@@ -53,6 +72,7 @@ class CompareWorker(QThread):
                 print(f"读取线站电压等级映射失败: {e}")
                 self.voltage_level_map = {}
         self.asset_code_to_original = {}
+        self.mapping_prepared = False  # 资产分类映射表是否已载入暂存库
 
     # ---------- 工具 ----------
     @staticmethod
@@ -61,53 +81,12 @@ class CompareWorker(QThread):
             return ''
         return str(val).strip()
 
-    def _normalize_text_value(self, value):
-        """标准化文本值，将具有相同含义的不同表示转换为统一形式"""
-        if pd.isna(value) or value is None:
-            return ''
-
-        str_value = str(value).strip().upper()  # 转换为大写以便统一比较
-
-        # 处理"是"的表示：是、Y、y
-        if str_value in ['是', 'Y']:
-            return '是'
-
-        # 处理"否"的表示：否、N、n
-        if str_value in ['否', 'N']:
-            return '否'
-
-        return str(value).strip()  # 其他情况返回原始值（保持原始大小写）
-
-    def _normalize_depreciation_method(self, value, is_file1=True):
-        """标准化折旧方法字段值"""
-        if pd.isna(value) or value is None:
-            return ''
-
-        str_value = str(value).strip()
-
-        # 对于ERP表，将"直线法"转换为"年限平均法"
-        if not is_file1 and str_value == '直线法':
-            return '年限平均法'
-
-        return str(value).strip()
-
-    def _extract_second_level(self, value):
-        """从监管资产属性中提取二级分类"""
-        if not value or value.strip() == '':
-            return ''
-
-        # 处理反斜杠分隔的格式
-        if '\\' in value:
-            parts = value.split('\\')
-            return parts[-1].strip() if len(parts) > 1 else value.strip()
-
-        # 处理短横线分隔的格式
-        if '-' in value:
-            parts = value.split('-')
-            return parts[-1].strip() if len(parts) > 1 else value.strip()
-
-        # 如果没有分隔符，返回原值
-        return value.strip()
+    @staticmethod
+    def _display_value(value):
+        """REAL 列取出的整数值去掉 .0，与文本列的数值写法一致"""
+        if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+            return int(value)
+        return value
 
     def calculate_field(self, df, calc_rule, data_type):
         if not calc_rule:
@@ -144,9 +123,12 @@ class CompareWorker(QThread):
         except Exception as e:
             raise Exception(f"计算规则执行失败（{calc_rule}）：{str(e)}")
 
-    # ---------- SQL 侧主键 ----------
-    def _build_pk_expr(self, is_file1: bool) -> str:
-        """生成 _pk_concat 的 SQL 表达式"""
+    # ---------- 拼接主键 ----------
+    def _pk_fields(self, is_file1: bool):
+        """
+        _pk_concat 的组成：(字段列表, 分隔符)，入库时按行拼接（任一字段为空则主键为空）
+        平台表用 primary_keys 各列以 ' + ' 连接；ERP表有计算规则时按规则中的字段直接拼接，否则用 table2_field
+        """
         # 先找主键字段对应的规则
         pk_field = None
         for f, r in self.rules.items():
@@ -158,17 +140,15 @@ class CompareWorker(QThread):
 
         if is_file1:
             # 平台表：primary_keys 里的列直接拼
-            cols = [f'"{c}"' for c in self.primary_keys]
-            return " || ' + ' || ".join(cols) if len(cols) > 1 else cols[0] if cols else "''"
+            return list(self.primary_keys), ' + '
         else:
-            # ERP表：有计算规则就转 SQL，否则用 table2_field
+            # ERP表：有计算规则就按 + 拆出字段，否则用 table2_field
             if calc_rule:
-                expr = re.sub(r'\+', "||", calc_rule)
-                return f"{expr}"
+                return [f.strip() for f in str(calc_rule).split('+')], ''
             else:
                 col = rule.get("table2_field")
                 if col:
-                    return f'"{col}"'
+                    return [col], ''
                 else:
                     raise Exception("规则文件中未给 ERP 表定义主键字段")
 
@@ -201,15 +181,9 @@ class CompareWorker(QThread):
 
                 # 处理数值计算规则，如 "使用年限+使用期间/12"
                 elif rule.get("data_type") == "数值":
-                    # 将字段名加上引号，支持四则运算
+                    # 将字段名加上引号并按数值取值，支持四则运算；一次扫描替换，避免短字段名替换进长字段名
                     field_pattern = re.compile(r'[a-zA-Z\u4e00-\u9fa5][a-zA-Z\u4e00-\u9fa50-9_]*')
-                    fields_in_rule = field_pattern.findall(calc_rule)
-
-                    expr = calc_rule
-                    # 替换字段名为带引号的形式
-                    for field in sorted(fields_in_rule, key=len, reverse=True):  # 从长到短替换，避免部分匹配
-                        expr = expr.replace(field, f'"{field}"')
-                    return expr
+                    return field_pattern.sub(lambda m: self.db.number(f'"{m.group(0)}"'), calc_rule)
 
                 else:
                     return f'"{field_name}"'
@@ -218,16 +192,8 @@ class CompareWorker(QThread):
                 table2_field = rule.get("table2_field", field_name)
                 return f'"{table2_field}"'
 
-    def _add_concat_pk_column(self, table: str, expr: str):
-        """给指定表增加 _pk_concat 列并填充（SQLite版本）"""
-        try:
-            execute_query(f'ALTER TABLE "{table}" ADD COLUMN "_pk_concat" TEXT')
-        except Exception:
-            pass  # 列已存在
-        execute_query(f'UPDATE "{table}" SET "_pk_concat" = {expr}')
-
     def _add_calculated_fields(self, table, is_file1=True):
-        """为表添加计算字段（SQLite版本）"""
+        """为表添加计算字段（列类型、数值转换随后端方言）"""
         for field_name, rule in self.rules.items():
             calc_rule = rule.get("calc_rule")
             # 只处理有计算规则的字段，且只处理ERP表
@@ -235,14 +201,14 @@ class CompareWorker(QThread):
                 try:
                     expr = self._build_field_expr(field_name, is_file1=False)
                     # 添加计算字段列
-                    execute_query(f'ALTER TABLE "{table}" ADD COLUMN "_calc_{field_name}" REAL')
+                    self.db.execute(f'ALTER TABLE "{table}" ADD COLUMN "_calc_{field_name}" {self.db.REAL_TYPE}')
                     # 如果是折旧相关字段，取绝对值
                     if "折旧" in field_name:
                         # 填充计算字段值，处理可能的除零错误，并取绝对值
-                        execute_query(f'UPDATE "{table}" SET "_calc_{field_name}" = ABS(IFNULL({expr}, 0))')
+                        self.db.execute(f'UPDATE "{table}" SET "_calc_{field_name}" = ABS(IFNULL({expr}, 0))')
                     else:
                         # 填充计算字段值，处理可能的除零错误
-                        execute_query(f'UPDATE "{table}" SET "_calc_{field_name}" = IFNULL({expr}, 0)')
+                        self.db.execute(f'UPDATE "{table}" SET "_calc_{field_name}" = IFNULL({expr}, 0)')
                 except Exception as e:
                     # 列可能已存在，忽略错误
                     pass
@@ -252,307 +218,357 @@ class CompareWorker(QThread):
                 try:
                     expr = self._build_field_expr(field_name, is_file1=False)
                     # 添加计算字段列
-                    execute_query(f'ALTER TABLE "{table}" ADD COLUMN "_calc_{field_name}" TEXT')
+                    self.db.execute(f'ALTER TABLE "{table}" ADD COLUMN "_calc_{field_name}" TEXT')
                     # 填充计算字段值
-                    execute_query(f'UPDATE "{table}" SET "_calc_{field_name}" = {expr}')
+                    self.db.execute(f'UPDATE "{table}" SET "_calc_{field_name}" = {expr}')
                 except Exception as e:
                     # 列可能已存在，忽略错误
                     pass
 
-    def _diff_by_sqlite(self):
-        """纯 SQL 完成交集/差集（SQLite版本）"""
-        # 查询共同的主键
-        common_sql = '''
-        SELECT GROUP_CONCAT(t1."_pk_concat", '||') AS common_keys
-        FROM temp_table1 t1
-        INNER JOIN temp_table2 t2 ON t1."_pk_concat" = t2."_pk_concat"
-        '''
-
-        # 查询在表1中存在但在表2中缺失的主键
-        missing_sql = '''
-        SELECT GROUP_CONCAT(t1."_pk_concat", '||') AS missing_keys
-        FROM temp_table1 t1
-        LEFT JOIN temp_table2 t2 ON t1."_pk_concat" = t2."_pk_concat"
-        WHERE t2."_pk_concat" IS NULL
-        '''
-
-        # 查询在表2中存在但表1中多余的主键
-        extra_sql = '''
-        SELECT GROUP_CONCAT(t2."_pk_concat", '||') AS extra_keys
-        FROM temp_table2 t2
-        LEFT JOIN temp_table1 t1 ON t2."_pk_concat" = t1."_pk_concat"
-        WHERE t1."_pk_concat" IS NULL
-        '''
-
-        common_result = execute_query(common_sql)
-        missing_result = execute_query(missing_sql)
-        extra_result = execute_query(extra_sql)
-
-        # 合并结果
-        result_df = pd.DataFrame({
-            'common_keys': [
-                common_result.iloc[0, 0] if not common_result.empty and pd.notna(common_result.iloc[0, 0]) and
-                                            common_result.iloc[0, 0] else ''],
-            'missing_keys': [
-                missing_result.iloc[0, 0] if not missing_result.empty and pd.notna(missing_result.iloc[0, 0]) and
-                                             missing_result.iloc[0, 0] else ''],
-            'extra_keys': [
-                extra_result.iloc[0, 0] if not extra_result.empty and pd.notna(extra_result.iloc[0, 0]) and
-                                           extra_result.iloc[0, 0] else '']
-        })
-
-        return result_df
-
-    def _compare_fields_in_db(self, common_codes):
-        """在数据库中对比字段差异（SQLite版本）"""
-        diff_conditions = []
-
-        # 为每个字段构建差异条件
-        for field_name, rule in self.rules.items():
-            if rule.get("is_primary"):
-                continue  # 跳过主键字段
-
-            data_type = rule.get("data_type", "文本")
-            tail_diff = rule.get("tail_diff", 0)
+    def _classify_keys(self):
+        """纯 SQL 完成交集/差集：后端把主键分类写入临时表 key_status，返回 {分类: 主键数}"""
+        return self.db.classify_keys(TEMP_TABLE1, TEMP_TABLE2)
 
-            # 平台表字段名
-            src_field = f't1."{field_name}"'
+    # ---------- 暂存列规整 ----------
+    @staticmethod
+    def _tail_digits(tail_diff):
+        """尾差是保留的小数位数：与 SQLite ROUND(x, 尾差) 一致，位数取整数部分，限定在 0~30"""
+        return min(max(int(float(tail_diff or 0)), 0), 30)
 
-            # ERP表字段：如果有计算规则则使用计算字段，否则使用映射字段
-            if rule.get("calc_rule") and rule.get("data_type") in ["数值", "文本"]:
-                tgt_field = f't2."_calc_{field_name}"'
+    @staticmethod
+    def _staged_spec(field_name, rule):
+        """规则字段两边列的规整方式：数值存 REAL（折旧取绝对值，其余有尾差时按尾差位数舍入），文本存规整文本"""
+        data_type = rule.get("data_type")
+        if data_type == "数值":
+            tail_diff = float(rule.get("tail_diff") or 0)
+            is_depreciation = "折旧" in field_name
+            digits = CompareWorker._tail_digits(tail_diff) if tail_diff > 0 and not is_depreciation else None
+            return StagedColumn('REAL', is_depreciation, digits)
+        if data_type == "文本":
+            return StagedColumn('TEXT')
+        return None
+
+    def _build_staged_columns(self):
+        """
+        确定两表中规整存储的列，返回 (平台表 {列名: StagedColumn}, ERP表 {列名: StagedColumn})
+        数值列只规整读取时已解析的类型列；主键列和计算规则引用的列保持原值；
+        同一列被不同规则以不同方式使用时不规整
+        """
+        keep_raw = {str(pk) for pk in self.primary_keys}
+        for rule in self.rules.values():
+            if rule.get("is_primary") and rule.get("table2_field"):
+                keep_raw.add(str(rule["table2_field"]))
+            if rule.get("calc_rule"):
+                keep_raw.update(_calc_rule_fields(rule["calc_rule"]))
+
+        staged1, staged2, conflicts1, conflicts2 = {}, {}, set(), set()
+        for field_name, rule in self.rules.items():
+            spec = self._staged_spec(field_name, rule)
+            if rule.get("is_primary") or spec is None:
+                continue
+            table2_field = None if rule.get("calc_rule") else str(rule.get("table2_field", field_name))
+            for col, types, staged, conflicts in ((field_name, self.types1, staged1, conflicts1),
+                                                  (table2_field, self.types2, staged2, conflicts2)):
+                if col is None:
+                    continue
+                data_type = types.get(sanitize_column_name(col))
+                if spec.affinity == 'REAL' and data_type != "数值":
+                    continue
+                if spec.affinity == 'TEXT' and (col in keep_raw or data_type):
+                    continue
+                if staged.setdefault(col, spec) != spec:
+                    conflicts.add(col)
+        for col in conflicts1:
+            staged1.pop(col)
+        for col in conflicts2:
+            staged2.pop(col)
+        return staged1, staged2
+
+    def _staged_sides(self, field_name, rule):
+        """规则字段在两表中的列是否已按该规则规整存储：(平台表, ERP表)，ERP表为计算字段时不算"""
+        spec = self._staged_spec(field_name, rule)
+        if spec is None:
+            return False, False
+        table2_field = str(rule.get("table2_field", field_name))
+        return (self.staged1.get(field_name) == spec,
+                not rule.get("calc_rule") and self.staged2.get(table2_field) == spec)
+
+    def _diff_value_sql(self, alias, column, staged):
+        """差异中记录的一侧取值：规整存储的列取原值侧列（规整值只用于比较），其余列取列值"""
+        expr = f'{alias}."{column}"'
+        if column in staged:
+            return self.db.raw_or(f'{alias}."{raw_column(column)}"', expr)
+        return expr
+
+    def _number_sql(self, expr, staged, is_depreciation, tail_diff):
+        """数值比较的一侧：已规整的 REAL 列只需空值按 0 处理，否则逐行取绝对值/按尾差舍入"""
+        if staged:
+            return f'IFNULL({expr}, 0)'
+        expr = f'IFNULL({self.db.number(expr)}, 0)'
+        if is_depreciation:
+            return f'ABS({expr})'
+        if float(tail_diff) > 0:
+            return f'ROUND({expr}, {self._tail_digits(tail_diff)})'
+        return expr
+
+    def _field_diff_sql(self, field_name, rule):
+        """
+        单个规则字段的差异判定，返回 (平台表取值表达式, ERP表取值表达式, 差异条件, 差异说明表达式, 附加关联)
+        表达式中平台表别名 t1、ERP表别名 t2；取值表达式是差异中记录的原值；差异说明为 NULL 时只显示两边的值；
+        映射类规则查规则文件载入的查找表（见 CompareBackend.load_lookup），不把映射值拼进 SQL；
+        空值、数值转换等写法随后端方言（self.db.text / empty / number / distinct）
+        """
+        db = self.db
+        data_type = rule.get("data_type", "文本")
+        tail_diff = rule.get("tail_diff", 0)
+        reason = "NULL"
+        joins = ""
+
+        # 平台表字段名
+        src_field = f't1."{field_name}"'
+
+        # ERP表字段：如果有计算规则则使用计算字段，否则使用映射字段
+        if rule.get("calc_rule") and rule.get("data_type") in ["数值", "文本"]:
+            tgt_field = f't2."_calc_{field_name}"'
+            tgt_value = tgt_field
+        else:
+            table2_field = rule.get("table2_field", field_name)
+            tgt_field = f't2."{table2_field}"'
+            tgt_value = self._diff_value_sql('t2', str(table2_field), self.staged2)
+        src_value = self._diff_value_sql('t1', field_name, self.staged1)
+
+        # 根据数据类型构建差异条件，考虑空值情况
+        both_empty = f'({db.empty(src_field)} AND {db.empty(tgt_field)})'
+        # 原值相同的行对规整后必然相同，先用廉价比较筛掉，只对原值不同的行调用规整函数
+        changed = db.distinct(src_field, tgt_field)
+        if data_type == "数值":
+            # 折旧字段比较绝对值；设置尾差（保留的小数位数 d）时两边按 d 位舍入，差值超过 10^-d 才算差异
+            # 已规整的 REAL 列入库时已取绝对值/舍入，空值存 NULL，两边都为空时自然相等
+            is_depreciation = "折旧" in field_name
+            staged_src, staged_tgt = self._staged_sides(field_name, rule)
+            src_num = self._number_sql(src_field, staged_src, is_depreciation, tail_diff)
+            tgt_num = self._number_sql(tgt_field, staged_tgt, is_depreciation, tail_diff)
+            if float(tail_diff) > 0:
+                condition = f'ABS({src_num} - {tgt_num}) > {10.0 ** -self._tail_digits(tail_diff)!r}'
             else:
-                table2_field = rule.get("table2_field", field_name)
-                tgt_field = f't2."{table2_field}"'
-
-            # 根据数据类型构建差异条件，考虑空值情况
-            if data_type == "数值":
-                if "折旧" in field_name:
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND ABS(IFNULL({src_field}, 0)) != ABS(IFNULL({tgt_field}, 0))'
-                    if float(tail_diff) > 0:
-                        condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND ABS(ABS(IFNULL({src_field}, 0)) - ABS(IFNULL({tgt_field}, 0))) > {tail_diff}'
-                else:
-                    # 修改数值比较逻辑，增加精度处理
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND IFNULL({src_field}, 0) != IFNULL({tgt_field}, 0)'
-                    if float(tail_diff) > 0:
-                        # 使用ROUND函数处理精度，确保比较时两边有相同精度
-                        rounded_src = f'ROUND(IFNULL({src_field}, 0), {tail_diff})'
-                        rounded_tgt = f'ROUND(IFNULL({tgt_field}, 0), {tail_diff})'
-                        condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND ABS({rounded_src} - {rounded_tgt}) > {tail_diff}'
-                diff_conditions.append(condition)
-
-            elif data_type == "日期":
-                # 统一日期格式进行比较（SQLite使用DATE函数）
-                condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND DATE(IFNULL({src_field}, "")) != DATE(IFNULL({tgt_field}, ""))'
-                diff_conditions.append(condition)
-
-            elif data_type == "文本":
-                # 特殊处理资产分类字段
-                if field_name == "资产分类":
-                    # 对于资产分类，比较前两位编码（使用预先准备好的临时表）
-                    # ERP表实际用于对比的字段是"资产明细类别"
-                    table2_field = "资产明细类别"
-                    condition = f'''
-                    NOT (IFNULL({src_field}, "") = "" AND IFNULL(t2."{table2_field}", "") = "") 
-                    AND (
-                        SUBSTR(
-                            IFNULL(
-                                (SELECT m."同源目录编码" 
-                                 FROM temp_mapping_table m 
-                                 WHERE m."同源目录完整名称" = {src_field} 
-                                 LIMIT 1), 
-                                {src_field}
-                            ), 
-                            1, 2
-                        ) != SUBSTR(IFNULL(t2."{table2_field}", ""), 1, 2)
-                    )
-                    '''
-                    diff_conditions.append(condition)
-                # 对于折旧方法字段，需要特殊处理ERP表中的"直线法"视为"年限平均法"
-                elif "折旧方法" in field_name:
-                    # 在SQL中处理：如果ERP表字段是"直线法"，则替换为"年限平均法"进行比较
-                    adjusted_tgt_field = f'CASE WHEN TRIM(IFNULL({tgt_field}, "")) = "直线法" THEN "年限平均法" ELSE TRIM(IFNULL({tgt_field}, "")) END'
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND TRIM(IFNULL({src_field}, "")) != {adjusted_tgt_field}'
-                    diff_conditions.append(condition)
-                # 处理ERP组合映射字段
-                elif field_name in self.erp_combo_map:
-                    # 构建ERP组合映射的SQL条件
-                    condition_parts = []
-                    for platform_val, erp_values in self.erp_combo_map.items():
-                        erp_conditions = []
-                        for erp_val in erp_values:
-                            erp_conditions.append(f'TRIM(IFNULL({tgt_field}, "")) = "{erp_val}"')
-
-                        combined_erp_condition = " OR ".join(erp_conditions) if erp_conditions else "0=1"
-                        condition_parts.append(
-                            f'(TRIM(IFNULL({src_field}, "")) = "{platform_val}" AND ({combined_erp_condition}))')
-
-                    all_conditions = " OR ".join(condition_parts) if condition_parts else "0=1"
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND NOT ({all_conditions})'
-                    diff_conditions.append(condition)
-                # 处理线站电压等级字段
-                elif field_name == "线站电压等级":
-                    # 构建线站电压等级映射的SQL条件
-                    condition_parts = []
-                    for code, name in self.voltage_level_map.items():
-                        condition_parts.append(
-                            f'(TRIM(IFNULL({src_field}, "")) = "{name}" AND TRIM(IFNULL({tgt_field}, "")) = "{code}")')
-
-                    all_conditions = " OR ".join(condition_parts) if condition_parts else "0=1"
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND NOT ({all_conditions})'
-                    diff_conditions.append(condition)
-                else:
-                    condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND TRIM(IFNULL({src_field}, "")) != TRIM(IFNULL({tgt_field}, ""))'
-                diff_conditions.append(condition)
-
+                condition = f'{src_num} != {tgt_num}'
+            # 规整列中无法解析的单元格不能参与算术（SQLite 会把 'abc' 当成 0），这类行对按原值文本比较
+            numeric = [db.is_number(f'{alias}."{col}"', f'{alias}."{raw_column(col)}"')
+                       for alias, col, staged in (('t1', field_name, staged_src),
+                                                  ('t2', str(rule.get("table2_field", field_name)), staged_tgt))
+                       if staged]
+            if numeric:
+                condition = (f'CASE WHEN {" AND ".join(numeric)} THEN {condition} '
+                             f'ELSE {db.text(src_value)} != {db.text(tgt_value)} END')
+            if not (staged_src and staged_tgt):
+                condition = f'NOT {both_empty} AND {condition}'
+
+        elif data_type == "日期":
+            table2_field = rule.get("table2_field", field_name)
+            if sanitize_column_name(field_name) in self.types1 and sanitize_column_name(table2_field) in self.types2:
+                # 两边入库时已统一为 YYYY-MM-DD（无法解析的保留原文本，空值为 NULL），直接比较
+                condition = db.distinct(src_field, tgt_field)
             else:
-                condition = f'NOT (IFNULL({src_field}, "") = "" AND IFNULL({tgt_field}, "") = "") AND IFNULL({src_field}, "") != IFNULL({tgt_field}, "")'
-                diff_conditions.append(condition)
-
-        if not diff_conditions:
-            return []  # 没有需要对比的字段
-
-        # 构建主键选择表达式
-        pk_fields_src = [f't1."{pk}"' for pk in self.primary_keys]
-        pk_fields_tgt = [f't2."{pk}"' for pk in self.primary_keys]
-
-        # 构建所有需要返回的字段列表
-        all_fields = list(self.rules.keys())
-
-        # 构建完整SQL
-        select_fields = []
-
-        # 添加主键字段
-        select_fields.append('t1."_pk_concat"')
-        select_fields.extend(pk_fields_src)
-        select_fields.extend(pk_fields_tgt)
-
-        # 添加源表字段
-        for f in all_fields:
-            if not self.rules[f].get('is_primary'):
-                select_fields.append(f't1."{f}" as src_{f}')
-
-        # 添加目标表字段（正确处理字段映射）
-        for f in all_fields:
-            if not self.rules[f].get('is_primary'):
-                rule = self.rules[f]
-                if rule.get("calc_rule") and rule.get("data_type") in ["数值", "文本"]:
-                    # 使用计算字段
-                    select_fields.append(f't2."_calc_{f}" as tgt_{f}')
+                # 统一为 YYYY-MM-DD 后比较（norm_date 见 sql_functions，兼容 YYYY/MM/DD、YYYYMMDD 等写法）
+                condition = f'NOT {both_empty} AND {changed} AND norm_date({src_field}) != norm_date({tgt_field})'
+
+        elif data_type == "文本":
+            # 特殊处理资产分类字段
+            if field_name == "资产分类":
+                # 对于资产分类，比较前两位编码（关联预先准备好的映射表，按名称查找）
+                # ERP表实际用于对比的字段是"资产明细类别"
+                if self.mapping_prepared:
+                    joins = f'LEFT JOIN temp_mapping_table m ON m."同源目录完整名称" = {src_field}'
+                    src_prefix = f'SUBSTR(IFNULL(m."同源目录编码", {src_field}), 1, 2)'
                 else:
-                    # 使用映射字段
-                    table2_field = rule.get("table2_field", f)
-                    select_fields.append(f't2."{table2_field}" as tgt_{f}')
-
-        # 特别确保资产明细类别字段被包含在查询结果中
-        if "资产分类" in self.rules:
-            select_fields.append('t2."资产明细类别" as tgt_资产明细类别')
-
-        where_clause = ' OR '.join([f'({cond})' for cond in diff_conditions]) if diff_conditions else '1=0'
-
-        sql = f'''
-        SELECT 
-            {', '.join(select_fields)}
-        FROM temp_table1 t1
-        INNER JOIN temp_table2 t2 ON t1."_pk_concat" = t2."_pk_concat"
-        WHERE {where_clause}
-        '''
+                    src_prefix = f'SUBSTR({src_field}, 1, 2)'
+                tgt_category = 't2."资产明细类别"'
+                tgt_prefix = f'SUBSTR({db.text(tgt_category)}, 1, 2)'
+                condition = f'''
+                NOT ({db.empty(src_field)} AND {db.empty(tgt_category)}) 
+                AND ({src_prefix} != {tgt_prefix})
+                '''
+                reason = f"'编码前两位不匹配: ' || IFNULL({src_prefix}, '') || ' vs ' || {tgt_prefix}"
+            # 对于折旧方法字段，需要特殊处理ERP表中的"直线法"视为"年限平均法"
+            elif "折旧方法" in field_name:
+                condition = (f'NOT {both_empty} AND norm_depreciation_method({src_field}, 1) '
+                             f'!= norm_depreciation_method({tgt_field}, 0)')
+            # 处理ERP组合映射字段
+            elif field_name in self.erp_combo_map:
+                # (平台值, ERP值) 不在允许的组合里即为差异
+                allowed = (f'SELECT 1 FROM {ERP_COMBO_TABLE} c WHERE c.platform_value = TRIM({db.text(src_field)}) '
+                           f'AND c.erp_value = TRIM({db.text(tgt_field)})')
+                condition = f'NOT {both_empty} AND NOT EXISTS ({allowed})'
+                reason = "'不符合ERP组合映射规则'"
+            # 处理线站电压等级字段
+            elif field_name == "线站电压等级":
+                # 平台表为名称、ERP表为编码，(名称, 编码) 不在映射中即为差异
+                matched = (f'SELECT 1 FROM {VOLTAGE_LEVEL_TABLE} v WHERE v.name = TRIM({db.text(src_field)}) '
+                           f'AND v.code = TRIM({db.text(tgt_field)})')
+                condition = f'NOT {both_empty} AND NOT EXISTS ({matched})'
+                reason = "'编码与名称映射不一致'"
+            # 监管资产属性只比较二级分类（两种分隔格式取最后一段）
+            elif field_name == "监管资产属性":
+                src_level = f'second_level({src_field})'
+                tgt_level = f'second_level({tgt_field})'
+                condition = f'NOT {both_empty} AND {changed} AND norm_text({src_level}) != norm_text({tgt_level})'
+                reason = f"'二级分类不匹配: ' || {src_level} || ' vs ' || {tgt_level}"
+            elif all(self._staged_sides(field_name, rule)):
+                # 两边入库时已去首尾空白、空串存 NULL，原值不同即可能有差异
+                condition = f'{changed} AND norm_text({src_field}) != norm_text({tgt_field})'
+            else:
+                # 是/Y、否/N 视为相同
+                condition = f'NOT {both_empty} AND {changed} AND norm_text({src_field}) != norm_text({tgt_field})'
 
+        else:
+            condition = f'NOT {both_empty} AND {db.text(src_field)} != {db.text(tgt_field)}'
+
+        return src_value, tgt_value, condition, reason, joins
+
+    def _compare_fields_in_db(self):
+        """
+        在后端库内对比字段差异：每个规则字段生成一条判定（见 _field_diff_sql），
+        由后端把不一致的字段写入长表 field_diff，日志、摘要和导出都只读这张表。返回 {字段: 差异行数}
+        """
+        checks = [(field_name,) + self._field_diff_sql(field_name, rule)
+                  for field_name, rule in self.rules.items()
+                  if not rule.get("is_primary")]  # 跳过主键字段
+        return self.db.diff_fields(TEMP_TABLE1, TEMP_TABLE2, checks)
+
+    def iter_diff_records(self):
+        """
+        按平台表行序流式产出差异记录，每个行对一条：
+        {"source": 平台表主键及不一致字段的值, "target": ERP表主键及不一致字段的值,
+         "fields": {字段: (平台表值, ERP表值, 差异说明)}}
+        差异只存在后端库的 field_diff 中，日志和导出都从这里分批读取，内存中不保留全部差异；
+        比对有差异时后端库保留到 release()，没有差异或已释放时不产出记录
+        """
+        if self.db is None:
+            return
+        record, pair = None, None
+        for row in self.db.stream_diffs(TEMP_TABLE1, TEMP_TABLE2, self.primary_keys):
+            if (row["src_id"], row["tgt_id"]) != pair:
+                if record is not None:
+                    yield record
+                pair = (row["src_id"], row["tgt_id"])
+                src_data = {"_pk_concat": row["_pk_concat"]}
+                tgt_data = {}
+                # 主键字段
+                for pk in self.primary_keys:
+                    src_data[pk] = row[f'src_{pk}']
+                    tgt_data[pk] = row.get(f'tgt_{pk}', row[f'src_{pk}'])
+                record = {"source": src_data, "target": tgt_data, "fields": {}}
+
+            field = row["field"]
+            src_value, tgt_value = self._display_value(row["src_value"]), self._display_value(row["tgt_value"])
+            record["source"][field] = src_value
+            record["target"][field] = tgt_value
+            record["fields"][field] = (src_value, tgt_value, row["reason"])
+        if record is not None:
+            yield record
+
+    def release(self):
+        """关闭并删除本次比对的后端库（开始下一次比对、关闭窗口时调用）"""
         try:
-            result_df = execute_query(sql)
-            diff_records = []
-
-            if not result_df.empty:
-                for _, row in result_df.iterrows():
-                    src_data = {}
-                    tgt_data = {}
-
-                    # 主键字段
-                    src_data["_pk_concat"] = row["_pk_concat"]
-                    for pk in self.primary_keys:
-                        src_data[pk] = row[f'src_{pk}'] if f'src_{pk}' in row else row[pk]
-                        tgt_data[pk] = row[f'tgt_{pk}'] if f'tgt_{pk}' in row else row[pk]
-
-                    # 其他字段
-                    for field in all_fields:
-                        if not self.rules[field].get("is_primary"):
-                            src_data[field] = row[f'src_{field}'] if f'src_{field}' in row else ''
-                            tgt_data[field] = row[f'tgt_{field}'] if f'tgt_{field}' in row else ''
-
-                    # 特别处理资产明细类别字段
-                    if "资产分类" in self.rules:
-                        tgt_data["资产明细类别"] = row["tgt_资产明细类别"] if "tgt_资产明细类别" in row else ''
-
-                    diff_records.append({
-                        "source": src_data,
-                        "target": tgt_data
-                    })
-
-            return diff_records
-
-        except Exception as e:
-            self.log_signal.emit(f"数据库对比出错：{str(e)}")
-            return []
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+        except Exception:
+            pass
 
     def run(self):
+        keep_db = False
         try:
             self.log_signal.emit("正在初始化数据库...")
             time0 = time.time()
 
-            if not init_database():
-                self.log_signal.emit("❌ 数据库初始化失败")
-                return
+            # 0. 页签规模（只读 <dimension>/行标签，不加载数据）：决定分块大小、导入进度和暂存库位置
+            size1 = sheet_size(self.file1, self.sheet_name1)
+            size2 = sheet_size(self.file2, self.sheet_name2)
+            self.log_signal.emit(f"平台表约 {size1[0]} 行 × {size1[1]} 列，ERP表约 {size2[0]} 行 × {size2[1]} 列")
 
-            # 1. 导入数据
-            rows1 = import_excel_to_db(
-                self.file1, self.sheet_name1, TEMP_TABLE1,
-                is_file1=True, skip_rows=self.skip_rows, chunk_size=self.chunk_size
-            )
+            # 入库的只有投影列（外加行号列）；预计大小在内存预算内时整库放在内存，超出时再转存磁盘
+            staged_bytes = estimate_staged_bytes(
+                (size1[0], min(size1[1], len(self.usecols1) + 1)),
+                (size2[0], min(size2[1], len(self.usecols2) + 1)))
+            in_memory = staged_bytes <= MEMORY_BUDGET_BYTES
+            try:
+                # 整个比对过程共用一个后端连接
+                try:
+                    self.db = create_backend(self.backend, in_memory=in_memory, staging_dir=self.staging_dir)
+                except ImportError as e:
+                    # 列式后端依赖未安装（离线机器上常见）时退回 SQLite
+                    self.log_signal.emit(f"⚠️ {str(e)}，改用 SQLite 后端")
+                    self.db = create_backend(BACKEND_SQLITE, in_memory=in_memory, staging_dir=self.staging_dir)
+                self.db.open()
+            except Exception as e:
+                self.log_signal.emit(f"❌ 数据库初始化失败: {str(e)}")
+                return
+            self.log_signal.emit(f"比对后端 {self.db.name}，暂存库预计 {staged_bytes / 1024 / 1024:.0f} MB，"
+                                 f"{'使用内存库' if in_memory else '使用磁盘文件'}")
+            chunk1 = self.chunk_size or suggest_chunk_size(*size1, usecols=self.usecols1)
+            chunk2 = self.chunk_size or suggest_chunk_size(*size2, usecols=self.usecols2)
+
+            # 导入阶段占总进度的 IMPORT_PROGRESS%
+            expected_rows = max(size1[0] + size2[0], 1)
+            imported = {}
+
+            def on_import_progress(table_name, rows):
+                imported[table_name] = rows
+                self.progress_signal.emit(min(IMPORT_PROGRESS, IMPORT_PROGRESS * sum(imported.values()) // expected_rows))
+
+            # 1. 导入数据（两个文件在独立进程中并行解析，本线程统一写库；拼接主键 _pk_concat 随行写入）
+            self.log_signal.emit("正在并行读取平台表和ERP表...")
+            row_counts = self.db.load([
+                (self.file1, self.sheet_name1, TEMP_TABLE1, True, self.skip_rows, self.usecols1, chunk1,
+                 self.types1),
+                (self.file2, self.sheet_name2, TEMP_TABLE2, False, self.skip_rows, self.usecols2, chunk2,
+                 self.types2),
+            ], progress=on_import_progress, pk_fields={
+                TEMP_TABLE1: self._pk_fields(is_file1=True),
+                TEMP_TABLE2: self._pk_fields(is_file1=False),
+            }, staged={TEMP_TABLE1: self.staged1, TEMP_TABLE2: self.staged2})
+            rows1 = row_counts[TEMP_TABLE1]
+            rows2 = row_counts[TEMP_TABLE2]
+            self.progress_signal.emit(IMPORT_PROGRESS)
+            if in_memory and not self.db.in_memory:
+                self.log_signal.emit("暂存库超出内存预算，已转存到磁盘文件")
             self.log_signal.emit(f"✅ 平台表导入完成，共 {rows1} 行")
-
-            rows2 = import_excel_to_db(
-                self.file2, self.sheet_name2, TEMP_TABLE2,
-                is_file1=False, skip_rows=self.skip_rows, chunk_size=self.chunk_size
-            )
             self.log_signal.emit(f"✅ ERP表导入完成，共 {rows2} 行")
+            self.log_signal.emit(f"⏱️ 批量写库 {self.db.loaded_rows} 行，耗时 {self.db.load_seconds:.2f} 秒"
+                                 f"（{self.db.load_rate():,.0f} 行/秒）")
 
             # 预先准备资产分类映射表数据
-            mapping_prepared = prepare_asset_category_mapping(self.rules, self.rule_file)
-            if mapping_prepared:
+            self.mapping_prepared = prepare_asset_category_mapping(self.db, self.rules, self.rule_file)
+            if self.mapping_prepared:
                 self.log_signal.emit("✅ 资产分类映射表准备完成")
+            # 组合映射、线站电压等级映射同样载入为带索引的查找表
+            self.db.load_lookup(ERP_COMBO_TABLE, ['platform_value', 'erp_value'],
+                                ((platform_val, erp_val) for platform_val, erp_values in self.erp_combo_map.items()
+                                 for erp_val in erp_values))
+            self.db.load_lookup(VOLTAGE_LEVEL_TABLE, ['code', 'name'], self.voltage_level_map.items())
 
-            # 2. 建索引
-            create_compare_index(TEMP_TABLE1, ["_pk_concat"])
-            create_compare_index(TEMP_TABLE2, ["_pk_concat"])
-
-            # 3. 生成 _pk_concat
-            expr1 = self._build_pk_expr(is_file1=True)
-            expr2 = self._build_pk_expr(is_file1=False)
-            self._add_concat_pk_column(TEMP_TABLE1, expr1)
-            self._add_concat_pk_column(TEMP_TABLE2, expr2)
+            # 2.-3. 批量导入完成后一次性为 _pk_concat 建立访问路径（SQLite 建索引）
+            self.db.build_keys([TEMP_TABLE1, TEMP_TABLE2])
 
             # 4. 为ERP表添加计算字段
             self._add_calculated_fields(TEMP_TABLE2, is_file1=False)
 
-            # 5. SQL 计算共同/缺失/多余
-            diff_df = self._diff_by_sqlite()
-            common_str = diff_df.at[0, 'common_keys'] or ''
-            missing_str = diff_df.at[0, 'missing_keys'] or ''
-            extra_str = diff_df.at[0, 'extra_keys'] or ''
+            # 5. SQL 计算共同/缺失/多余（只取各类主键数，主键本身留在库里）
+            key_counts = self._classify_keys()
+            common_count = key_counts[KEY_COMMON]
+            missing_count = key_counts[KEY_MISSING]
+            extra_count = key_counts[KEY_EXTRA]
 
-            common_codes = set(common_str.split('||')) if common_str else set()
-            missing_in_file2 = set(missing_str.split('||')) if missing_str else set()
-            missing_in_file1 = set(extra_str.split('||')) if extra_str else set()
+            self.progress_signal.emit(KEY_DIFF_PROGRESS)
 
             # 6. 拉取缺失/多余行
-            if missing_in_file2:
-                self.missing_rows = fetch_rows_by_pk(
-                    TEMP_TABLE1, ["_pk_concat"], missing_in_file2
-                ).to_dict(orient='records')
-            if missing_in_file1:
-                self.extra_in_file2 = fetch_rows_by_pk(
-                    TEMP_TABLE2, ["_pk_concat"], missing_in_file1
-                ).to_dict(orient='records')
+            # 结果导出只用到主键，只取 _pk_concat 和主键列，缺失再多内存也只随行数线性增长
+            key_columns = ["_pk_concat"] + list(self.primary_keys)
+            if missing_count:
+                self.missing_rows = list(self.db.stream_rows(TEMP_TABLE1, KEY_MISSING, key_columns))
+            if extra_count:
+                self.extra_in_file2 = list(self.db.stream_rows(TEMP_TABLE2, KEY_EXTRA, key_columns))
 
             # 显示缺失和多余的主键信息
             if self.missing_rows:
@@ -585,253 +601,77 @@ class CompareWorker(QThread):
                     if i % (batch_size * 5) == 0:
                         gc.collect()
 
-            if not common_codes:
+            if not common_count:
                 self.log_signal.emit("警告：两个文件中没有共同的主键！")
                 return
 
-            # 7. 在数据库中进行字段差异比对
-            diff_full_rows = self._compare_fields_in_db(common_codes)
-            diff_count = len(diff_full_rows)
+            # 7. 在数据库中进行字段差异比对：不一致的字段写入 field_diff，各字段差异数由 GROUP BY 得出
+            field_diff_counts = self._compare_fields_in_db()
+            diff_count = self.db.diff_pair_count()
+            self.progress_signal.emit(FIELD_DIFF_PROGRESS)
 
             # 8. 构建结果摘要
-            equal_count = len(common_codes) - diff_count
+            equal_count = common_count - diff_count
             primary_key_str = " + ".join(self.primary_keys)
 
-            self.diff_full_rows = diff_full_rows
             self.summary = {
                 "primary_key": primary_key_str,
                 "total_file1": rows1,
                 "total_file2": rows2,
-                "missing_count": len(missing_in_file2),
-                "extra_count": len(missing_in_file1),
-                "common_count": len(common_codes),
+                "missing_count": missing_count,
+                "extra_count": extra_count,
+                "common_count": common_count,
                 "diff_count": diff_count,
                 "equal_count": equal_count,
-                "diff_ratio": diff_count / len(common_codes) if len(common_codes) > 0 else 0.0,
+                "diff_ratio": diff_count / common_count if common_count > 0 else 0.0,
+                "field_diff_counts": field_diff_counts,
             }
 
             if diff_count == 0:
                 self.log_signal.emit("✅【共同主键的数据完全一致】，没有差异。")
             else:
                 self.log_signal.emit(f"❌【存在差异的记录】（共 {diff_count} 行）")
+                self.log_signal.emit("各字段差异行数：" + "，".join(
+                    f"{field} {field_diff_counts[field]}" for field in self.rules if field in field_diff_counts))
 
-                # 流式处理差异记录，避免内存占用过高
+                # 流式读取 field_diff，按批输出，避免内存占用过高
                 batch_size = 1000  # 每批处理1000条记录
                 processed_count = 0
+                batch_lines = []
 
-                for i in range(0, len(diff_full_rows), batch_size):
-                    batch = diff_full_rows[i:i + batch_size]
-                    batch_lines = [f"--- 差异记录批次 {i // batch_size + 1} ---"]
-
-                    for j, diff_record in enumerate(batch):
-                        record_index = i + j + 1
-                        src = diff_record["source"]
-                        tgt = diff_record["target"]
-
-                        pk_str = str(src.get("_pk_concat", ""))
-                        batch_lines.append(f"  {record_index}. 主键: {pk_str}")
-
-                        # 查找并显示具体差异的字段
-                        for field_name, rule in self.rules.items():
-                            if rule.get("is_primary"):
-                                continue  # 跳过主键字段
-
-                            src_value = src.get(field_name, "")
-                            tgt_value = tgt.get(field_name, "")
-
-                            # 获取目标表中的正确字段名
-                            if rule.get("calc_rule") and rule.get("data_type") in ["数值", "文本"]:
-                                tgt_value = tgt.get(field_name, "")
-                            else:
-                                table2_field = rule.get("table2_field", field_name)
-                                tgt_value = tgt.get(table2_field, "") or tgt.get(field_name, "")
-
-                            # 标准化值用于比较
-                            norm_src = self.normalize_value(src_value)
-                            norm_tgt = self.normalize_value(tgt_value)
-
-                            # 对于日期字段，需要特殊处理格式
-                            if rule.get("data_type") == "日期":
-                                norm_src = self._normalize_date_format(norm_src)
-                                norm_tgt = self._normalize_date_format(norm_tgt)
-
-                            # 对于数值字段，考虑精度处理
-                            elif rule.get("data_type") == "数值":
-                                tail_diff = int(rule.get("tail_diff", 0))
-                                try:
-                                    # 尝试转换为数值并按精度比较
-                                    src_num = float(norm_src) if norm_src else 0
-                                    tgt_num = float(norm_tgt) if norm_tgt else 0
-
-                                    # 如果设置了尾差，则按尾差精度比较
-                                    if tail_diff > 0:
-                                        src_rounded = round(src_num, tail_diff)
-                                        tgt_rounded = round(tgt_num, tail_diff)
-
-                                        # 只有在超出尾差范围时才显示为差异
-                                        if abs(src_rounded - tgt_rounded) > (10 ** (-tail_diff)):
-                                            # 格式化显示值，保持精度一致性
-                                            src_display = f"{src_num:.{tail_diff}f}" if norm_src else ""
-                                            tgt_display = f"{tgt_num:.{tail_diff}f}" if norm_tgt else ""
-                                            batch_lines.append(
-                                                f"    - {field_name}: 平台表='{src_display}', ERP表='{tgt_display}'")
-                                    else:
-                                        # 没有设置尾差时，直接比较数值
-                                        if src_num != tgt_num:
-                                            batch_lines.append(
-                                                f"    - {field_name}: 平台表='{src_value}', ERP表='{tgt_value}'")
-                                except (ValueError, TypeError):
-                                    # 如果不能转换为数值，按字符串比较
-                                    if norm_src != norm_tgt:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{src_value}', ERP表='{tgt_value}'")
-
-                            # 对于文本字段，需要特殊处理标准化
-                            elif rule.get("data_type") == "文本":
-                                # 特殊处理资产分类字段
-                                if field_name == "资产分类":
-                                    if mapping_prepared:
-                                        # 获取映射表
-                                        mapping_df = _load_asset_category_mapping(self.rule_file)
-                                        if not mapping_df.empty and '同源目录完整名称' in mapping_df.columns and '同源目录编码' in mapping_df.columns:
-                                            # 创建映射字典
-                                            category_mapping = dict(zip(mapping_df['同源目录完整名称'].astype(str),
-                                                                        mapping_df['同源目录编码'].astype(str)))
-
-                                            # 获取平台表的编码（通过映射）
-                                            src_code = category_mapping.get(str(src_value), str(src_value))
-                                            src_code_prefix = src_code[:2] if len(src_code) >= 2 else src_code
-
-                                            # 获取ERP表的"资产明细类别"字段值（实际用于对比的字段）
-                                            actual_tgt_value = tgt.get("资产明细类别", "")
-                                            actual_tgt_show_value = tgt.get(field_name)
-                                            tgt_code_prefix = str(actual_tgt_value)[:2] if len(
-                                                str(actual_tgt_value)) >= 2 else str(actual_tgt_value)
-
-                                            # 比较前两位
-                                            if src_code_prefix != tgt_code_prefix:
-                                                # 显示原始中文信息而不是编码
-                                                batch_lines.append(
-                                                    f"    - {field_name}: 平台表='{norm_src}', ERP表='{actual_tgt_show_value}' (编码前两位不匹配: {src_code_prefix} vs {tgt_code_prefix})")
-                                        else:
-                                            # 映射表不可用时的回退处理
-                                            norm_src_text = self._normalize_text_value(src_value)
-                                            norm_tgt_text = self._normalize_text_value(tgt_value)
-                                            if norm_src_text != norm_tgt_text:
-                                                batch_lines.append(
-                                                    f"    - {field_name}: 平台表='{norm_src}', ERP表='{tgt_value}'")
-                                    else:
-                                        # 映射表未准备好的回退处理
-                                        norm_src_text = self._normalize_text_value(src_value)
-                                        norm_tgt_text = self._normalize_text_value(tgt_value)
-                                        if norm_src_text != norm_tgt_text:
-                                            batch_lines.append(
-                                                f"    - {field_name}: 平台表='{norm_src}', ERP表='{tgt_value}'")
-                                # 特殊处理监管资产属性字段，只对比二级分类
-                                elif field_name == "监管资产属性":
-                                    # 提取二级分类进行比较
-                                    src_second_level = self._normalize_text_value(self._extract_second_level(str(src_value)))
-                                    tgt_second_level = self._normalize_text_value(self._extract_second_level(str(tgt_value)))
-
-                                    if src_second_level != tgt_second_level:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{norm_src}', ERP表='{norm_tgt}' (二级分类不匹配: '{src_second_level}' vs '{tgt_second_level}')")
-                                # 对折旧方法字段进行特殊处理
-                                elif "折旧方法" in field_name:
-                                    norm_src_text = self._normalize_depreciation_method(src_value, is_file1=True)
-                                    norm_tgt_text = self._normalize_depreciation_method(tgt_value, is_file1=False)
-                                    # 比较标准化后的值
-                                    if norm_src_text != norm_tgt_text:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{src_value}' , ERP表='{tgt_value}'")
-                                # 处理ERP组合映射字段
-                                elif field_name in self.erp_combo_map:
-                                    # 检查是否符合ERP组合映射规则
-                                    platform_val = str(src_value).strip()
-                                    erp_val = str(tgt_value).strip()
-
-                                    # 检查是否在允许的ERP值中
-                                    is_match = False
-                                    if platform_val in self.erp_combo_map:
-                                        allowed_erp_values = self.erp_combo_map[platform_val]
-                                        is_match = erp_val in allowed_erp_values
-
-                                    if not is_match:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{src_value}', ERP表='{tgt_value}' (不符合ERP组合映射规则)")
-                                # 处理线站电压等级字段
-                                elif field_name == "线站电压等级":
-                                    # 对ERP表的编码值进行映射转换为中文
-                                    erp_chinese = self.voltage_level_map.get(str(tgt_value).strip(),
-                                                                             str(tgt_value).strip())
-                                    platform_chinese = str(src_value).strip()
-
-                                    # 比较中文值
-                                    if platform_chinese != erp_chinese:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{src_value}', ERP表='{norm_tgt}' (映射后: 平台表='{platform_chinese}', ERP表='{self._normalize_text_value(erp_chinese)}')")
-                                else:
-                                    # 对其他文本值进行标准化处理
-                                    norm_src_text = self._normalize_text_value(src_value)
-                                    norm_tgt_text = self._normalize_text_value(tgt_value)
-                                    # 比较标准化后的值
-                                    if norm_src_text != norm_tgt_text:
-                                        batch_lines.append(
-                                            f"    - {field_name}: 平台表='{norm_src_text}', ERP表='{norm_tgt_text}'")
-                            else:
-                                # 其他类型按原逻辑比较
-                                if norm_src != norm_tgt:
-                                    batch_lines.append(f"    - {field_name}: 平台表='{src_value}', ERP表='{tgt_value}'")
+                for diff_record in self.iter_diff_records():
+                    processed_count += 1
+                    if not batch_lines:
+                        batch_lines.append(f"--- 差异记录批次 {(processed_count - 1) // batch_size + 1} ---")
 
-                    # 输出这一批记录
-                    self.log_signal.emit("\n".join(batch_lines))
-                    processed_count += len(batch)
+                    pk_str = str(diff_record["source"].get("_pk_concat", ""))
+                    batch_lines.append(f"  {processed_count}. 主键: {pk_str}")
+                    for field_name, (src_value, tgt_value, reason) in diff_record["fields"].items():
+                        line = f"    - {field_name}: 平台表='{self.normalize_value(src_value)}', ERP表='{self.normalize_value(tgt_value)}'"
+                        batch_lines.append(f"{line} ({reason})" if reason else line)
 
-                    # 每处理5批强制垃圾回收一次
-                    if (i // batch_size + 1) % 5 == 0:
-                        gc.collect()
+                    # 输出这一批记录
+                    if processed_count % batch_size == 0 or processed_count == diff_count:
+                        self.log_signal.emit("\n".join(batch_lines))
+                        batch_lines = []
+                        self.progress_signal.emit(
+                            FIELD_DIFF_PROGRESS + (100 - FIELD_DIFF_PROGRESS) * processed_count // diff_count)
 
+                if batch_lines:
+                    self.log_signal.emit("\n".join(batch_lines))
                 self.log_signal.emit(f"✅ 差异记录显示完成，共显示 {processed_count} 条差异记录")
+                keep_db = True  # 导出时再从 field_diff 分批读取差异
 
             time1 = time.time()
+            self.progress_signal.emit(100)
             self.log_signal.emit(f"✅ 对比完成，总耗时{time1 - time0:.1f}s")
 
         except Exception as e:
             logging.error(traceback.format_exc())
             self.log_signal.emit(f"❌ 发生错误：{str(e)}")
         finally:
-            try:
-                drop_tables()
-            except:
-                pass
+            if not keep_db:
+                self.release()
             gc.collect()
             self.quit()
             self.wait()
-
-    def _normalize_date_format(self, date_str):
-        """标准化日期格式"""
-        if not date_str:
-            return ""
-
-        # 移除所有非数字字符，获取纯数字
-        digits = re.sub(r'\D', '', date_str)
-
-        # 如果是8位数字，假设为 YYYYMMDD 格式
-        if len(digits) == 8:
-            try:
-                return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
-            except:
-                return date_str  # 如果转换失败，返回原始值
-
-        # 如果已经包含连字符，尝试标准化
-        if '-' in date_str:
-            try:
-                parts = date_str.split('-')
-                if len(parts) == 3:
-                    year, month, day = parts
-                    return f"{year}-{int(month):02d}-{int(day):02d}"
-            except:
-                return date_str  # 如果转换失败，返回原始值
-
-        # 其他情况返回原始值
-        return date_str
@@ -3,126 +3,453 @@ import sqlite3
 import pandas as pd
 import re
 import os
-from data_handler import read_excel_fast
+import shutil
+import time
+import uuid
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from collections import namedtuple
+import numpy as np
+from queue import Empty
+from excel_reader.data_handler import iter_excel_chunks, sanitize_column_name, UNPARSED_PREFIX
+from excel_reader.sheet_cache import should_cache
+from sql_functions import register_functions
+from backends import CompareBackend, BACKEND_SQLITE
 
-# 数据库文件路径
-DB_FILE = 'excel_compare.db'
+# 暂存库文件目录，可通过环境变量覆盖；每次比对在其中新建一个独占的库文件，
+# 文件名带上进程号：staging_<pid>_<随机串>.db，多个比对（多个窗口、批处理脚本）可同时运行；
+# 库文件旁的日志文件（SQLite 的 -journal / -wal / -shm，DuckDB 的 .wal）和溢写目录（.tmp）随库一起清理
+STAGING_DIR = os.environ.get('EXCEL_COMPARE_STAGING_DIR',
+                             os.path.join(tempfile.gettempdir(), 'excel_compare_staging'))
+STAGING_SUFFIXES = ('-journal', '-wal', '-shm', '.wal', '.tmp')
+_STAGING_NAME = re.compile(r'^staging_(\d+)_[0-9a-f]{32}\.db(%s)?$'
+                           % '|'.join(re.escape(suffix) for suffix in STAGING_SUFFIXES))
+
+# 并行解析时，子进程与写库进程之间缓冲的数据块数量上限
+PARALLEL_QUEUE_SIZE = 8
+
+# 单个大表分片解析可用的进程总数（多个文件并行时平均分配）
+PARSE_WORKERS = os.cpu_count() or 1
+
+
+# 暂存库连接参数：库是每次比对临时生成的，随时可重建，不需要崩溃保护，
+# 换取批量导入和全表 UPDATE 的速度
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=MEMORY",     # 回滚日志放内存（失败语句仍可回滚）
+    "PRAGMA synchronous=OFF",         # 不等待落盘
+    "PRAGMA temp_store=MEMORY",       # 排序、建索引的临时数据放内存
+    "PRAGMA cache_size=-262144",      # 页缓存 256 MB（负数单位为 KB）
+    "PRAGMA mmap_size=1073741824",    # 内存映射读取 1 GB
+)
+
+# 流式读取查询结果时每次取回的行数
+FETCH_ROWS = 5000
+
+# 暂存库预计大小不超过该值时整库放在内存里，不落盘；导入中途超出时整库转存到磁盘文件
+MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+
+# 按页签规模估算暂存库大小：每个单元格入库后约占的字节数（文本、记录头和页内余量）
+STAGED_BYTES_PER_CELL = 40
+
+
+# 按规则数据类型规整的暂存列（未列出的列按原值文本存储）：
+#   affinity='REAL'：读取时已解析的数值列存为 REAL，take_abs 时取绝对值，digits 不为 None 时按位数舍入
+#                    （与 SQLite ROUND 一致，0.5 远离零）；无法解析的单元格仍存原文本
+#   affinity='TEXT'：文本去掉首尾空白，空串存为 NULL
+# 比对 SQL 对两边都已规整的列直接比较，不再逐行 IFNULL/TRIM/ABS/ROUND
+StagedColumn = namedtuple('StagedColumn', ['affinity', 'take_abs', 'digits'], defaults=(False, None))
+
+# 规整列的原值存在以此为前缀的侧列中（TEXT 列只存规整后有变化的单元格），差异记录和导出展示原值
+RAW_PREFIX = '_raw_'
+
+
+def raw_column(col):
+    """规整列对应的原值侧列名"""
+    return RAW_PREFIX + col
+
+
+def estimate_staged_bytes(*sizes):
+    """sizes: (行数, 列数) 若干，估算全部导入后暂存库的大小"""
+    return sum(rows * cols for rows, cols in sizes) * STAGED_BYTES_PER_CELL
 
 
 # =========================================================
-# 基础初始化
+# 暂存库文件
 # =========================================================
-def init_database():
-    """创建数据库、删旧表"""
+def new_staging_path(staging_dir=None):
+    """本进程本次比对独占的暂存库文件路径"""
+    return os.path.join(staging_dir or STAGING_DIR, f"staging_{os.getpid()}_{uuid.uuid4().hex}.db")
+
+
+def _process_alive(pid):
+    """POSIX 下 pid 对应的进程是否仍在运行"""
     try:
-        # 删除旧数据库文件（如果存在）
-        if os.path.exists(DB_FILE):
-            os.remove(DB_FILE)
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
 
-        # 删除旧表（如果存在）
-        cursor.execute("DROP TABLE IF EXISTS temp_table1")
-        cursor.execute("DROP TABLE IF EXISTS temp_table2")
-        cursor.execute("DROP TABLE IF EXISTS temp_mapping_table")
+def remove_staging_files(path):
+    """删除暂存库文件及其旁边的日志文件、溢写目录（后缀与 sweep 识别的一致）"""
+    for suffix in ('',) + STAGING_SUFFIXES:
+        if os.path.lexists(path + suffix):
+            _remove_path(path + suffix)
+
+
+def sweep_stale_staging(staging_dir=None):
+    """
+    清理异常退出的比对遗留的暂存库文件，返回删除的文件数
+    本进程的库不动；POSIX 下跳过进程仍在运行的库；Windows 下无法廉价判断进程，
+    直接尝试删除，仍被其他比对打开的库文件删除会失败，跳过即可
+    """
+    staging_dir = staging_dir or STAGING_DIR
+    try:
+        names = os.listdir(staging_dir)
+    except OSError:
+        return 0
+    removed = 0
+    for name in names:
+        match = _STAGING_NAME.match(name)
+        if not match:
+            continue
+        pid = int(match.group(1))
+        if pid == os.getpid() or (os.name != 'nt' and _process_alive(pid)):
+            continue
+        try:
+            _remove_path(os.path.join(staging_dir, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# =========================================================
+# 暂存库连接
+# =========================================================
+class StagingDB(CompareBackend):
+    """
+    一次比对独占的 SQLite 暂存库（比对后端 sqlite，接口见 backends.CompareBackend）
+    整个比对过程只打开一个连接（打开时设置批量导入用的 PRAGMA），导入、建索引、
+    全表 UPDATE 和查询都走这个连接；查询以游标/迭代器流式返回，不再整表转 DataFrame
+    连接处于自动提交模式，需要把多条写操作合成一个事务时用 transaction()
+    in_memory: 整库放在内存中（小表比对不落盘）；库增长超过 memory_budget 时
+               由 spill_if_needed() 用 sqlite3 backup 整库转存到 path 对应的文件
+    path 默认在 staging_dir（缺省 STAGING_DIR）下新建唯一文件名，close() 时删除
+    """
 
-        conn.close()
+    name = BACKEND_SQLITE
+
+    def __init__(self, path=None, in_memory=False, memory_budget=MEMORY_BUDGET_BYTES, staging_dir=None):
+        super().__init__()
+        self.path = path or new_staging_path(staging_dir)
+        self.in_memory = in_memory
+        self.memory_budget = memory_budget
+        self.conn = None
+
+    def _connect(self, target):
+        # 比对在 QThread 中进行，导出时在另外的线程中流式读取 field_diff
+        conn = sqlite3.connect(target, isolation_level=None, check_same_thread=False)
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        # 比对规则的规整函数（是/否归一、二级分类、折旧方法、日期格式），溢写后的新连接同样可用
+        register_functions(conn)
+        return conn
+
+    def open(self):
+        """新建库并打开连接；顺带清理以前异常退出遗留的暂存库文件"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        sweep_stale_staging(directory)
+        if self.in_memory:
+            self.conn = self._connect(':memory:')
+        else:
+            self._remove_file()
+            self.conn = self._connect(self.path)
+        return self
+
+    def close(self):
+        """关闭连接并删除库文件"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if not self.in_memory:
+            self._remove_file()
+
+    def size_bytes(self):
+        """库当前占用的字节数"""
+        return self.scalar("PRAGMA page_count") * self.scalar("PRAGMA page_size")
+
+    def spill_if_needed(self):
+        """内存库超出预算时整库转存到磁盘文件，之后的操作都在文件库上进行；返回是否发生转存"""
+        if not self.in_memory or self.size_bytes() <= self.memory_budget:
+            return False
+        self._remove_file()
+        disk = self._connect(self.path)
+        self.conn.backup(disk)
+        self.conn.close()
+        self.conn = disk
+        self.in_memory = False
         return True
-    except Exception as e:
-        print(f"数据库初始化失败: {str(e)}")
-        return False
 
+    def _remove_file(self):
+        remove_staging_files(self.path)
+
+    @contextmanager
+    def transaction(self):
+        """把块内的写操作合成一个事务，异常时回滚"""
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        """执行一条语句，返回游标"""
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.conn.executemany(sql, rows)
+
+    def scalar(self, sql, params=()):
+        """返回第一行第一列，无结果时为 None"""
+        row = self.conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    def iter_records(self, sql, params=(), batch_size=FETCH_ROWS):
+        """流式执行查询，逐行产出 {列名: 值}，每次只从库里取 batch_size 行"""
+        cursor = self.conn.execute(sql, params)
+        try:
+            columns = [d[0] for d in cursor.description] if cursor.description else []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+
+    # ---------- 比对后端接口 ----------
+    def store_chunk(self, table_name, chunk, table_created, pk_fields=None, staged=None):
+        return _store_chunk(self, table_name, chunk, table_created, pk_fields, staged)
+
+    def load_lookup(self, table, columns, rows, key_columns=None):
+        load_lookup_table(self, table, columns, rows, key_columns)
+
+    def build_keys(self, tables):
+        for table in tables:
+            create_compare_index(self, table, ["_pk_concat"])
+
+    def classify_keys(self, table1, table2):
+        return build_key_status(self, table1, table2)
+
+    def table_columns(self, table):
+        return table_columns(self, table)
+
+    def stream_rows(self, table, status, columns=None):
+        return fetch_rows_by_status(self, table, status, columns)
 
-def sanitize_column_name(col_name):
-    """把任意列名变成合法 SQLite 列名"""
-    clean = re.sub(r'[^\w]', '_', str(col_name))
-    if clean and clean[0].isdigit():
-        clean = 'col_' + clean
-    return clean[:64] or 'unnamed_column'
+    def diff_fields(self, table1, table2, checks):
+        return build_field_diff(self, table1, table2, checks)
+
+    def diff_pair_count(self):
+        return self.scalar("SELECT COUNT(*) FROM (SELECT DISTINCT src_id, tgt_id FROM temp.field_diff)")
+
+    def stream_diffs(self, table1, table2, primary_keys):
+        return iter_field_diffs(self, table1, table2, primary_keys)
 
 
 # =========================================================
 # 表与数据导入
 # =========================================================
-def import_excel_to_db(file_path, sheet_name, table_name, is_file1=True, skip_rows=0, chunk_size=5000):
-    """把 Excel 分块写入 SQLite"""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-
-        df = read_excel_fast(file_path, sheet_name, is_file1=is_file1,
-                             skip_rows=skip_rows, chunk_size=chunk_size)
+def split_chunk(chunk, staged=None):
+    """
+    数据块入库前的列名规整：返回 (数据块, 类型列的侧列 {列名: 原值}, 规整列 {列名: StagedColumn})
+    类型列的侧列不单独入库：无法解析的原值在入库时填回类型列
+    """
+    unparsed = {sanitize_column_name(c[len(UNPARSED_PREFIX):]): chunk.pop(c)
+                for c in list(chunk.columns) if str(c).startswith(UNPARSED_PREFIX)}
+    chunk.columns = [sanitize_column_name(c) for c in chunk.columns]
+    staged = {sanitize_column_name(c): spec for c, spec in (staged or {}).items()}
+    return chunk, unparsed, staged
 
-        if df.empty:
-            conn.close()
-            return 0
 
-        df.columns = [sanitize_column_name(c) for c in df.columns]
+def _store_chunk(db, table_name, chunk, table_created, pk_fields=None, staged=None):
+    """写入一个数据块，首块时建表；pk_fields、staged 见 _insert_data；返回表是否已建"""
+    if chunk.empty:
+        return table_created
+    chunk, unparsed, staged = split_chunk(chunk, staged)
 
+    with db.transaction():
         # 建表
-        create_sql = _generate_create_table_sql(df, table_name)
-        conn.execute(create_sql)
+        if not table_created:
+            create_sql = _generate_create_table_sql(chunk, table_name, with_pk_concat=pk_fields is not None,
+                                                    staged=staged)
+            db.execute(create_sql)
 
         # 分块插入
-        total_rows = len(df)
-        for start in range(0, total_rows, chunk_size):
-            chunk = df.iloc[start:start + chunk_size]
-            _insert_data(conn, table_name, chunk)
-            conn.commit()
+        _insert_data(db, table_name, chunk, unparsed, pk_fields, staged)
+    db.spill_if_needed()
+    return True
+
+
+def import_excel_to_db(db, file_path, sheet_name, table_name, is_file1=True, skip_rows=0, chunk_size=5000,
+                       usecols=None, progress=None, column_types=None, pk_fields=None, staged=None):
+    """
+    把 Excel 分块写入暂存库 db（比对后端，见 backends.CompareBackend）
+    usecols: 规则投影列集合，只入库这些列（外加原始行号 _row_no）
+    column_types: {规整列名: '数值'/'日期'}，这些列读取时即完成解析，入库时直接格式化
+    pk_fields: (主键字段列表, 分隔符)，入库时同时写入拼接主键 _pk_concat，见 _insert_data
+    staged: {列名: StagedColumn}，按规则类型规整存储的列
+    progress: 每写入一块后回调 progress(table_name, 已写入行数)
+    """
+    try:
+        # 流式读取：每读到一块就写入，整表不在内存中驻留
+        total_rows = 0
+        table_created = False
+        for chunk in iter_excel_chunks(file_path, sheet_name, is_file1=is_file1,
+                                       skip_rows=skip_rows, chunk_size=chunk_size,
+                                       usecols=usecols, with_row_no=True,
+                                       parse_workers=PARSE_WORKERS, use_cache=should_cache(file_path, is_file1),
+                                       categorical=True, column_types=column_types):
+            table_created = db.store_chunk(table_name, chunk, table_created, pk_fields, staged)
+            total_rows += len(chunk)
+            if progress:
+                progress(table_name, total_rows)
 
-        conn.close()
         return total_rows
     except Exception as e:
         raise Exception(f"导入Excel到数据库失败: {str(e)}")
 
 
-def prepare_asset_category_mapping(rules, rule_file):
+def _parse_worker(queue, table_name, file_path, sheet_name, is_file1, skip_rows, chunk_size, usecols,
+                  parse_workers, column_types=None):
+    """子进程：解析 Excel，把数据块经队列送回主进程（只解析，不碰数据库）"""
+    try:
+        for chunk in iter_excel_chunks(file_path, sheet_name, is_file1=is_file1,
+                                       skip_rows=skip_rows, chunk_size=chunk_size,
+                                       usecols=usecols, with_row_no=True,
+                                       parse_workers=parse_workers, use_cache=should_cache(file_path, is_file1),
+                                       categorical=True, column_types=column_types):
+            queue.put((table_name, 'chunk', chunk))
+        queue.put((table_name, 'done', None))
+    except Exception as e:
+        queue.put((table_name, 'error', str(e)))
+
+
+def import_excels_parallel(db, jobs, progress=None, pk_fields=None, staged=None):
     """
-    预先准备资产分类映射表数据
+    多个 Excel 并行解析入库
+    jobs: [(file_path, sheet_name, table_name, is_file1, skip_rows, usecols, chunk_size, column_types), ...]
+    pk_fields: {table_name: (主键字段列表, 分隔符)}，入库时同时写入拼接主键 _pk_concat
+    staged: {table_name: {列名: StagedColumn}}，按规则类型规整存储的列
+    每个文件在独立进程中解析（绕开 GIL），数据块经队列流回本进程，
+    由本进程唯一持有的比对后端 db 顺序写入（db.store_chunk）。返回 {table_name: 行数}
+    progress: 每写入一块后回调 progress(table_name, 该表已写入行数)
+    """
+    pk_fields = pk_fields or {}
+    staged = staged or {}
+    if len(jobs) < 2:
+        return {job[2]: import_excel_to_db(db, job[0], job[1], job[2], is_file1=job[3], skip_rows=job[4],
+                                           chunk_size=job[6], usecols=job[5], progress=progress,
+                                           column_types=job[7], pk_fields=pk_fields.get(job[2]),
+                                           staged=staged.get(job[2]))
+                for job in jobs}
+
+    ctx = multiprocessing.get_context('spawn')
+    # 队列限长形成背压：写库慢于解析时子进程会阻塞，内存占用保持平稳
+    queue = ctx.Queue(maxsize=PARALLEL_QUEUE_SIZE)
+    # 子进程内还可能再开分片进程池，因此不能是 daemon 进程；退出时在 finally 中统一回收
+    parse_workers = max(1, PARSE_WORKERS // len(jobs))
+    workers = {}
+    for file_path, sheet_name, table_name, is_file1, skip_rows, usecols, chunk_size, column_types in jobs:
+        proc = ctx.Process(target=_parse_worker,
+                           args=(queue, table_name, file_path, sheet_name, is_file1,
+                                 skip_rows, chunk_size, usecols, parse_workers, column_types))
+        proc.start()
+        workers[table_name] = proc
+
+    counts = {table_name: 0 for table_name in workers}
+    created = {table_name: False for table_name in workers}
+    pending = set(workers)
+    try:
+        while pending:
+            try:
+                table_name, kind, payload = queue.get(timeout=1)
+            except Empty:
+                # 子进程异常退出（未来得及回报）时避免永久等待
+                dead = [t for t in pending if not workers[t].is_alive()]
+                if dead and queue.empty():
+                    raise Exception(f"解析进程意外退出: {', '.join(dead)}")
+                continue
+
+            if kind == 'chunk':
+                created[table_name] = db.store_chunk(table_name, payload, created[table_name],
+                                                     pk_fields.get(table_name), staged.get(table_name))
+                counts[table_name] += len(payload)
+                if progress:
+                    progress(table_name, counts[table_name])
+            elif kind == 'done':
+                pending.discard(table_name)
+            else:
+                raise Exception(payload)
+        return counts
+    except Exception as e:
+        raise Exception(f"导入Excel到数据库失败: {str(e)}")
+    finally:
+        for proc in workers.values():
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+
+def load_lookup_table(db, table, columns, rows, key_columns=None):
+    """
+    把规则文件里的映射写成带主键索引的查找临时表，比对 SQL 用关联/EXISTS 走索引查找，
+    映射值以绑定参数写入，不再拼进 SQL 文本
+    key_columns: 主键列，缺省为全部列；主键重复时保留先出现的一行
+    """
+    key_columns = key_columns or columns
+    db.execute(f"DROP TABLE IF EXISTS temp.`{table}`")
+    db.execute(f"CREATE TEMP TABLE `{table}` ({', '.join(f'`{c}` TEXT' for c in columns)}, "
+               f"PRIMARY KEY ({', '.join(f'`{c}`' for c in key_columns)}))")
+    placeholders = ",".join(["?"] * len(columns))
+    with db.transaction():
+        db.executemany(f"INSERT OR IGNORE INTO temp.`{table}` VALUES ({placeholders})", rows)
+
+
+def prepare_asset_category_mapping(db, rules, rule_file):
+    """
+    预先准备资产分类映射表数据：同源目录完整名称 -> 同源目录编码，按名称建主键索引
     """
     # 检查是否有资产分类字段需要对比
     has_asset_category = any(field_name == "资产分类" for field_name in rules.keys())
     if not has_asset_category:
         return False
     try:
-        conn = sqlite3.connect(DB_FILE)
-
         # 加载资产分类映射表
         mapping_df = _load_asset_category_mapping(rule_file)
         if mapping_df.empty or '同源目录完整名称' not in mapping_df.columns or '同源目录编码' not in mapping_df.columns:
             return False
 
-        # 创建临时映射表
-        create_mapping_table_sql = """
-        CREATE TABLE temp_mapping_table (
-            同源目录完整名称 TEXT,
-            同源目录编码 TEXT
-        )
-        """
-        conn.execute(create_mapping_table_sql)
-
-        # 批量插入映射数据
-        if not mapping_df.empty:
-            # 准备批量插入数据
-            insert_data = []
-            for _, row in mapping_df.iterrows():
-                try:
-                    insert_data.append((str(row['同源目录完整名称']), str(row['同源目录编码'])))
-                except:
-                    continue
-
-            if insert_data:
-                insert_sql = """
-                INSERT INTO temp_mapping_table (同源目录完整名称, 同源目录编码)
-                VALUES (?, ?)
-                """
-                # 分批插入，避免数据量过大
-                batch_size = 1000
-                for i in range(0, len(insert_data), batch_size):
-                    batch = insert_data[i:i + batch_size]
-                    conn.executemany(insert_sql, batch)
-                    conn.commit()
-        conn.close()
+        # 名称重复时取先出现的编码
+        db.load_lookup('temp_mapping_table', ['同源目录完整名称', '同源目录编码'],
+                       zip(map(str, mapping_df['同源目录完整名称'].tolist()),
+                           map(str, mapping_df['同源目录编码'].tolist())),
+                       key_columns=['同源目录完整名称'])
         return True
     except Exception as e:
         raise Exception(f"准备资产分类映射表时出错: {str(e)}")
@@ -140,8 +467,12 @@ def _load_asset_category_mapping(rule_file):
         raise Exception(f"读取资产分类映射表失败: {str(e)}")
 
 
-def _generate_create_table_sql(df, table_name):
-    cols = [f"`{col}` TEXT" for col in df.columns]
+def _generate_create_table_sql(df, table_name, with_pk_concat=False, staged=None):
+    staged = staged or {}
+    cols = [f"`{col}` {staged[col].affinity if col in staged else 'TEXT'}" for col in df.columns]
+    cols += [f"`{raw_column(col)}` TEXT" for col in df.columns if col in staged]
+    if with_pk_concat:
+        cols.append("`_pk_concat` TEXT")
     sql = f"""
     CREATE TABLE `{table_name}` (
         `id` INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -151,118 +482,294 @@ def _generate_create_table_sql(df, table_name):
     return sql
 
 
-def _insert_data(conn, table_name, df):
-    if df.empty:
-        return
-    cols = [f"`{c}`" for c in df.columns]
-    placeholders = ",".join(["?"] * len(df.columns))
-    sql = f"INSERT INTO `{table_name}` ({','.join(cols)}) VALUES ({placeholders})"
+def _to_db_value(value, take_abs):
+    """单元格值 -> 入库文本；take_abs 时数值取绝对值，转换失败保持原值"""
+    if pd.isna(value):
+        return None
+    if take_abs:
+        try:
+            return str(abs(float(value)))
+        except (ValueError, TypeError):
+            pass
+    return str(value)
+
+
+def _number_texts(values, take_abs):
+    """float64 数组 -> 入库文本：整数值不带 .0，空值为 None（整列向量化，不逐格 float()）"""
+    if take_abs:
+        values = np.abs(values)
+    finite = np.isfinite(values)
+    integral = finite & (values == np.trunc(values)) & (np.abs(values) < 1e15)
+    texts = values.astype(str).astype(object)
+    texts[integral] = values[integral].astype(np.int64).astype(str)
+    texts[~finite] = None
+    return texts
+
+
+def _real_values(values, take_abs, digits):
+    """float64 数组 -> 入库 REAL 值（object 数组）：可取绝对值、按位数舍入，空值为 None"""
+    if take_abs:
+        values = np.abs(values)
+    if digits is not None:
+        # 放大后略微上调几个 ulp，使 2.675 这类十进制的 .5 按 SQLite ROUND 的方式进位
+        scale = 10.0 ** digits
+        values = np.sign(values) * np.floor(np.abs(values) * scale * (1 + 2.0 ** -50) + 0.5) / scale
+    reals = values.astype(object)
+    reals[~np.isfinite(values)] = None
+    return reals
+
+
+def _normalized_texts(texts):
+    """入库文本数组去首尾空白，空串（含只有空白的）改为 None"""
+    present = ~pd.isna(texts)
+    if present.any():
+        texts[present] = np.char.strip(texts[present].astype(str)).astype(object)
+        texts[present & (texts == '')] = None
+    return texts
+
+
+def _date_texts(values):
+    """datetime64 数组 -> 入库文本 YYYY-MM-DD，空值为 None"""
+    texts = values.astype('datetime64[D]').astype(str).astype(object)
+    texts[np.isnat(values)] = None
+    return texts
+
+
+def _plain_texts(series, take_abs):
+    """
+    未按规则类型解析的列 -> 入库文本，结果与逐格 _to_db_value 一致
+    整列算空值掩码、整列转文本；take_abs 时能转成数值的单元格整列取绝对值
+    """
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    kind = series.dtype.kind
+    if take_abs and kind not in 'Mm':
+        numbers = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+        numeric = ~np.isnan(numbers) & ~missing
+        texts = _plain_texts(series, False)
+        texts[numeric] = np.abs(numbers[numeric]).astype(str)
+        return texts
+    if kind in 'iub':
+        texts = series.astype(str).to_numpy(dtype=object)
+    elif kind == 'f':
+        texts = series.to_numpy().astype(str).astype(object)
+    elif kind == 'M':
+        # 与 str(Timestamp) 一致：YYYY-MM-DD HH:MM:SS
+        texts = np.char.replace(np.datetime_as_string(series.to_numpy().astype('datetime64[s]')), 'T', ' ')
+        texts = texts.astype(object)
+    elif pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        texts = values.copy()  # 已经是字符串，不需要逐个转换
+    else:
+        texts = np.array([str(v) for v in values.tolist()], dtype=object)
+    texts[missing] = None
+    return texts
+
+
+def _column_db_values(series, take_abs, unparsed=None, spec=None):
+    """
+    整列转换成入库值数组
+    读取时已解析的数值/日期列（带侧列 unparsed）整列格式化，无法解析的单元格取侧列中的原值；
+    字典编码列只转换字典里的每个不同值一次，再按编码展开；其余列整列向量化转换
+    spec: StagedColumn，REAL 列输出浮点数（取绝对值、舍入在此完成），TEXT 列输出规整文本
+    """
+    if unparsed is not None:
+        values = series.to_numpy()
+        if values.dtype.kind == 'M':
+            texts = _date_texts(values)
+        elif spec is not None and spec.affinity == 'REAL':
+            texts = _real_values(values.astype('float64'), take_abs or spec.take_abs, spec.digits)
+        else:
+            texts = _number_texts(values.astype('float64'), take_abs)
+        invalid = unparsed.notna().to_numpy()
+        texts[invalid] = [str(v) for v in unparsed[invalid].tolist()]
+        return texts
+    normalize = spec is not None and spec.affinity == 'TEXT'
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lookup = np.array([_to_db_value(v, take_abs) for v in series.cat.categories] + [None], dtype=object)
+        if normalize:
+            lookup = _normalized_texts(lookup)  # 只规整字典里的不同值
+        return lookup[series.cat.codes.to_numpy()]  # 编码 -1 取到末尾的 None
+    texts = _plain_texts(series, take_abs)
+    return _normalized_texts(texts) if normalize else texts
+
+
+def _concat_key(columns, separator):
+    """
+    入库文本列（至少一列）按行拼接成主键，语义同 SQL 的 a || sep || b：任一部分为 NULL 时结果为 NULL
+    """
+    key = np.array(columns[0], dtype=object)
+    missing = pd.isna(key)
+    for part in columns[1:]:
+        part = np.array(part, dtype=object)
+        missing |= pd.isna(part)
+        key = np.where(missing, '', key) + separator + np.where(missing, '', part)
+    key[missing] = None
+    return key.tolist()
+
+
+def chunk_db_columns(table_name, df, unparsed=None, pk_fields=None, staged=None):
+    """
+    数据块按列转换成入库值，返回 (列名列表, 各列入库值列表)，各后端写入时共用
+    pk_fields: (主键字段列表, 分隔符)，给出时用转换后的主键列拼出 _pk_concat 列，
+               省去导入后再整表 UPDATE
+    staged: {列名: StagedColumn}，按规则类型规整存储的列，另输出原值侧列（见 raw_column）
+    """
+    names = list(df.columns)
 
     # 判断是否为表二
     is_table2 = table_name == 'temp_table2'
 
-    processed_data = []
-    for _, row in df.iterrows():
-        processed_row = []
-        for i, col_name in enumerate(df.columns):
-            value = row[col_name]
-            # 如果是表二且字段名包含"折旧"，则取绝对值
-            if is_table2 and "折旧" in col_name:
-                try:
-                    # 尝试将值转换为数值并取绝对值
-                    if pd.notna(value):
-                        numeric_value = float(value)
-                        processed_row.append(str(abs(numeric_value)))
-                    else:
-                        processed_row.append(None)
-                except (ValueError, TypeError):
-                    # 如果转换失败，保持原始值
-                    processed_row.append(str(value) if pd.notna(value) else None)
-            else:
-                processed_row.append(str(value) if pd.notna(value) else None)
-        processed_data.append(tuple(processed_row))
-
-    conn.executemany(sql, processed_data)
+    # 按列转换（表二中字段名包含"折旧"的列取绝对值），再按行拼接
+    unparsed = unparsed or {}
+    staged = staged or {}
+    columns, raw_names, raw_columns = [], [], []
+    for col_name in names:
+        take_abs = is_table2 and "折旧" in col_name
+        values = _column_db_values(df[col_name], take_abs, unparsed.get(col_name), staged.get(col_name))
+        if col_name in staged:
+            raw = _column_db_values(df[col_name], take_abs, unparsed.get(col_name))
+            if staged[col_name].affinity == 'TEXT':
+                raw[raw == values] = None  # 规整后没有变化的单元格不重复存
+            raw_names.append(raw_column(col_name))
+            raw_columns.append(raw.tolist())
+        columns.append(values.tolist())
+    names += raw_names
+    columns += raw_columns
+    if pk_fields is not None:
+        fields, separator = pk_fields
+        fields = [sanitize_column_name(str(f).strip()) for f in fields]
+        missing = [f for f in fields if f not in names]
+        if missing:
+            raise Exception(f"主键字段不存在：{missing}")
+        key_parts = [columns[names.index(f)] for f in fields]
+        columns.append(_concat_key(key_parts, separator) if key_parts else [''] * len(df))
+        names.append('_pk_concat')
+    return names, columns
+
+
+def _insert_data(db, table_name, df, unparsed=None, pk_fields=None, staged=None):
+    """
+    批量写入一个数据块：每列整列转换一次（见 chunk_db_columns），再用 zip 按行惰性拼出参数
+    交给 executemany，不构造中间行列表；调用方负责把它放在事务里
+    """
+    if df.empty:
+        return
+    started = time.perf_counter()
+    names, columns = chunk_db_columns(table_name, df, unparsed, pk_fields, staged)
+    cols = [f"`{c}`" for c in names]
+    placeholders = ",".join(["?"] * len(names))
+    sql = f"INSERT INTO `{table_name}` ({','.join(cols)}) VALUES ({placeholders})"
+    db.executemany(sql, zip(*columns))
+    db.record_load(len(df), time.perf_counter() - started)
 
 
 # =========================================================
-# 通用查询
+# 主键相关工具
 # =========================================================
-def execute_query(query, params=None, executemany=False):
-    """执行 SQL 并返回 DataFrame"""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
-        conn.autocommit = True
-        if params:
-            if executemany:
-                conn.executemany(query, params)
-            else:
-                cursor = conn.execute(query, params)
-        else:
-            cursor = conn.execute(query)
+def create_compare_index(db, table: str, pk_cols: list):
+    """给 _pk_concat 建索引；在批量导入完成后一次性建立"""
+    idx_name = f"idx_{table}_pk"
+    col_str = ",".join([f"`{c}`" for c in pk_cols])
+    db.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON `{table}` ({col_str})")
 
-        # 获取列名
-        columns = [description[0] for description in cursor.description] if cursor.description else []
 
-        # 获取数据
-        rows = cursor.fetchall()
+# 主键分类：两表都有 / 只在表一（表二缺失）/ 只在表二（表二多余）
+KEY_COMMON = 'common'
+KEY_MISSING = 'missing'
+KEY_EXTRA = 'extra'
 
-        # 转换为 DataFrame
-        df = pd.DataFrame(rows, columns=columns)
-        conn.close()
-        return df
-    except Exception as e:
-        raise Exception(f"执行查询失败: {str(e)}")
 
-
-# =========================================================
-# 主键相关工具
-# =========================================================
-def create_compare_index(table: str, pk_cols: list):
-    """给 _pk_concat 建索引"""
-    idx_name = f"idx_{table}_pk"
-    col_str = ",".join([f"`{c}`" for c in pk_cols])
-    sql = f"CREATE INDEX IF NOT EXISTS {idx_name} ON `{table}` ({col_str})"
-    try:
-        execute_query(sql)
-    except Exception:
-        pass  # 已存在
+def build_key_status(db, table1: str, table2: str):
+    """
+    一次扫描两表的 _pk_concat（UNION ALL 后分组，相当于 FULL OUTER JOIN），
+    把每个不同主键及其分类写入临时表 key_status，返回 {分类: 主键数}
+    主键为 NULL 的行不参与分类；后续按分类取行、比字段都与 key_status 关联
+    """
+    db.execute("DROP TABLE IF EXISTS temp.key_status")
+    db.execute("CREATE TEMP TABLE key_status (k TEXT PRIMARY KEY, status TEXT NOT NULL)")
+    db.execute(f"""
+        INSERT INTO temp.key_status (k, status)
+        SELECT k, CASE WHEN MAX(side = 1) AND MAX(side = 2) THEN '{KEY_COMMON}'
+                       WHEN MAX(side = 1) THEN '{KEY_MISSING}'
+                       ELSE '{KEY_EXTRA}' END
+        FROM (
+            SELECT _pk_concat AS k, 1 AS side FROM `{table1}` WHERE _pk_concat IS NOT NULL
+            UNION ALL
+            SELECT _pk_concat AS k, 2 AS side FROM `{table2}` WHERE _pk_concat IS NOT NULL
+        )
+        GROUP BY k
+    """)
+    counts = {KEY_COMMON: 0, KEY_MISSING: 0, KEY_EXTRA: 0}
+    for status, count in db.execute("SELECT status, COUNT(*) FROM temp.key_status GROUP BY status"):
+        counts[status] = count
+    return counts
 
 
-def add_concat_pk_column(table: str, expr: str):
-    """给表增加 _pk_concat 列并填充"""
-    try:
-        execute_query(f"ALTER TABLE `{table}` ADD COLUMN `_pk_concat` TEXT")
-    except Exception:
-        pass  # 列已存在
-    execute_query(f"UPDATE `{table}` SET `_pk_concat` = {expr}")
+def table_columns(db, table: str):
+    """表的列名列表（按建表顺序）"""
+    return [row[1] for row in db.execute(f"PRAGMA table_info(`{table}`)")]
 
 
-def fetch_rows_by_pk(table: str, pk_cols: list, wanted_keys: set):
-    """根据 _pk_concat 拉取行"""
-    if not wanted_keys:
-        return pd.DataFrame()
-    keys = list(wanted_keys)
-    placeholders = ",".join(["?"] * len(keys))
-    sql = f"SELECT * FROM `{table}` WHERE _pk_concat IN ({placeholders})"
-    return execute_query(sql, params=keys)
+def fetch_rows_by_status(db, table: str, status: str, columns=None, batch_size=FETCH_ROWS):
+    """
+    流式拉取主键属于某一分类（见 build_key_status）的行，逐行产出 {列名: 值}
+    与 key_status 关联查询，按 batch_size 分批从游标取回，不把主键取回 Python，结果保持原表行序；
+    内存和耗时只与结果行数、列数相关，与主键多少无关
+    columns: 只取这些列（表中不存在的列忽略），None 时取整行
+    """
+    if columns is None:
+        select = "t.*"
+    else:
+        existing = set(table_columns(db, table))
+        select = ", ".join(f"t.`{c}`" for c in dict.fromkeys(columns) if c in existing) or "t.`_pk_concat`"
+    yield from db.iter_records(
+        f"SELECT {select} FROM `{table}` t JOIN temp.key_status ks ON ks.k = t._pk_concat "
+        f"WHERE ks.status = ? ORDER BY t.id", (status,), batch_size=batch_size)
 
 
 # =========================================================
-# 清理
+# 字段差异
 # =========================================================
-def drop_tables():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("DROP TABLE IF EXISTS temp_table1")
-        conn.execute("DROP TABLE IF EXISTS temp_table2")
-        conn.execute("DROP TABLE IF EXISTS temp_mapping_table")
-        conn.commit()
-        conn.close()
-
-        # 删除数据库文件
-        if os.path.exists(DB_FILE):
-            os.remove(DB_FILE)
-    except Exception as e:
-        print(f"删除表失败: {str(e)}")
+def build_field_diff(db, table1: str, table2: str, checks):
+    """
+    在库内按规则逐字段判定差异：每个字段执行一次 INSERT ... SELECT，把不一致的字段写入长表
+    field_diff (src_id, tgt_id, pk, field, src_value, tgt_value, reason)；日志、摘要和导出都只读这张表，
+    规则只在 SQL 中判定一次。checks 见 CompareBackend.diff_fields，返回 {字段: 差异行数}
+    """
+    db.execute("DROP TABLE IF EXISTS temp.field_diff")
+    db.execute('''
+        CREATE TEMP TABLE field_diff (
+            src_id INTEGER, tgt_id INTEGER, pk TEXT, field TEXT,
+            src_value, tgt_value, reason TEXT
+        )
+    ''')
+
+    for field_name, src_value, tgt_value, condition, reason, joins in checks:
+        db.execute(f'''
+            INSERT INTO temp.field_diff (src_id, tgt_id, pk, field, src_value, tgt_value, reason)
+            SELECT t1.id, t2.id, t1."_pk_concat", ?, {src_value}, {tgt_value}, {reason}
+            FROM `{table1}` t1
+            INNER JOIN `{table2}` t2 ON t1."_pk_concat" = t2."_pk_concat"
+            {joins}
+            WHERE {condition}
+        ''', (field_name,))
+
+    # 按行对取差异时走索引；同一行对内 rowid 即规则顺序
+    db.execute("CREATE INDEX temp.idx_field_diff_pair ON field_diff (src_id, tgt_id)")
+    return {field: count for field, count in
+            db.execute("SELECT field, COUNT(*) FROM temp.field_diff GROUP BY field")}
+
+
+def iter_field_diffs(db, table1: str, table2: str, primary_keys):
+    """按平台表行序流式读取 field_diff，逐行产出差异及两表的主键值，格式见 CompareBackend.stream_diffs"""
+    table2_columns = set(table_columns(db, table2))
+    pk_fields_src = [f't1."{pk}" AS "src_{pk}"' for pk in primary_keys]
+    pk_fields_tgt = [f't2."{pk}" AS "tgt_{pk}"' for pk in primary_keys if pk in table2_columns]
+    yield from db.iter_records(f'''
+        SELECT fd.src_id, fd.tgt_id, fd.pk AS "_pk_concat", fd.field, fd.src_value, fd.tgt_value, fd.reason
+               {''.join(', ' + f for f in pk_fields_src + pk_fields_tgt)}
+        FROM temp.field_diff fd
+        JOIN `{table1}` t1 ON t1.id = fd.src_id
+        JOIN `{table2}` t2 ON t2.id = fd.tgt_id
+        ORDER BY fd.src_id, fd.tgt_id, fd.rowid
+    ''')
@@ -1,9 +1,13 @@
 # main.py
+import os
 import sys
 import traceback
 import logging
+import multiprocessing
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from ui_components import ExcelComparer, exception_hook
 from utils import resource_path
 
@@ -15,6 +19,8 @@ logging.basicConfig(
 )
 
 if __name__ == "__main__":
+    # 打包成 exe 后，导入阶段的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     sys.excepthook = exception_hook
     app = QApplication(sys.argv)
     icon_path = resource_path('icon.ico')
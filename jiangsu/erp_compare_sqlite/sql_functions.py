@@ -0,0 +1,113 @@
+# sql_functions.py
+"""
+比对规则中的值规整函数，注册为 SQLite 自定义函数
+
+规整规则（是/Y、否/N 归一，监管资产属性取二级分类，ERP表"直线法"视为"年限平均法"，
+日期统一为 YYYY-MM-DD）只在这里实现一份，比对 SQL 直接调用，判定和过滤一次完成。
+函数都是确定性的纯函数：注册时声明 deterministic，SQLite 可在同一语句内复用结果、
+也允许用于索引表达式；同一列的取值重复度很高，再加一层 LRU 缓存减少 Python 调用开销。
+"""
+import re
+import sqlite3
+from functools import lru_cache
+
+# 每个函数缓存的不同取值个数
+CACHE_SIZE = 65536
+
+
+def _is_empty(value):
+    # SQLite 传入的空值为 None；REAL 列不会出现 NaN，这里兼容 Python 侧直接调用
+    return value is None or (isinstance(value, float) and value != value)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(value):
+    """标准化文本值，将具有相同含义的不同表示转换为统一形式"""
+    if _is_empty(value):
+        return ''
+
+    str_value = str(value).strip().upper()  # 转换为大写以便统一比较
+
+    # 处理"是"的表示：是、Y、y
+    if str_value in ('是', 'Y'):
+        return '是'
+
+    # 处理"否"的表示：否、N、n
+    if str_value in ('否', 'N'):
+        return '否'
+
+    return str(value).strip()  # 其他情况返回原始值（保持原始大小写）
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_depreciation_method(value, is_file1):
+    """标准化折旧方法字段值：ERP表的"直线法"视为"年限平均法\""""
+    if _is_empty(value):
+        return ''
+
+    str_value = str(value).strip()
+    if not is_file1 and str_value == '直线法':
+        return '年限平均法'
+    return str_value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def extract_second_level(value):
+    """从监管资产属性中提取二级分类（反斜杠或短横线分隔取最后一段）"""
+    if _is_empty(value):
+        return ''
+    value = str(value)
+    if value.strip() == '':
+        return ''
+
+    for sep in ('\\', '-'):
+        if sep in value:
+            return value.split(sep)[-1].strip()
+
+    # 如果没有分隔符，返回原值
+    return value.strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_date(value):
+    """标准化日期格式为 YYYY-MM-DD，无法识别的返回原文本"""
+    if _is_empty(value):
+        return ''
+    date_str = str(value).strip()
+    if not date_str:
+        return ''
+
+    # 移除所有非数字字符，8位数字按 YYYYMMDD 处理
+    digits = re.sub(r'\D', '', date_str)
+    if len(digits) == 8:
+        return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
+
+    # 已经用连字符分隔的，补齐月、日的前导零
+    parts = date_str.split('-')
+    if len(parts) == 3:
+        try:
+            year, month, day = parts
+            return f"{year}-{int(month):02d}-{int(day):02d}"
+        except ValueError:
+            return date_str
+
+    return date_str
+
+
+# SQL 函数名 -> (参数个数, 实现)
+SQL_FUNCTIONS = {
+    'norm_text': (1, normalize_text),
+    'norm_depreciation_method': (2, normalize_depreciation_method),
+    'second_level': (1, extract_second_level),
+    'norm_date': (1, normalize_date),
+}
+
+
+def register_functions(conn):
+    """在连接上注册全部规整函数；SQLite 低于 3.8.3 不支持 deterministic 标记时按普通函数注册"""
+    deterministic = sqlite3.sqlite_version_info >= (3, 8, 3)
+    for name, (n_args, func) in SQL_FUNCTIONS.items():
+        if deterministic:
+            conn.create_function(name, n_args, func, deterministic=True)
+        else:
+            conn.create_function(name, n_args, func)
@@ -0,0 +1,147 @@
+# test_field_diff.py
+"""
+字段差异判定回归测试：用临时生成的平台表/ERP表/规则文件跑一遍 CompareWorker，
+检查写入 field_diff 的字段（数值尾差、无法解析的数值、日期）及 SQLite/DuckDB 两个后端结果一致
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(ENGINE_DIR))
+sys.path[:0] = [ENGINE_DIR, REPO_DIR]
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from rule_handler import read_rules
+
+PK = '资产编号'
+
+
+def _write_sheet(path, sheet_name, header, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+    return str(path)
+
+
+def _write_rules(path, rules):
+    """规则文件：比对规则（字段、ERP字段、类型、尾差、是否主键、计算规则）及两个枚举页签"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '比对规则'
+    ws.append(['平台表字段', 'ERP表字段', '数据类型', '尾差', '是否主键', '计算规则'])
+    ws.append([PK, PK, '文本', None, '是', None])
+    for field, data_type, tail_diff in rules:
+        ws.append([field, field, data_type, tail_diff, '否', None])
+    wb.create_sheet('枚举值-线站电压等级').append(['编码', '名称'])
+    wb.create_sheet('枚举值-关联实物管理系统代码及名称').append(['平台代码', '名称', 'ERP代码'])
+    wb.save(path)
+    return str(path)
+
+
+def _compare(tmp_path, rules, platform_rows, erp_rows, backend='sqlite', tables=None):
+    """
+    比对两张只有主键和规则字段的表，返回 {(主键, 字段): (平台表原值, ERP表原值)}
+    rules: [(字段, 数据类型, 尾差)]；*_rows: [(主键, 各规则字段的值...)]
+    tables: 给出时在后端关闭前取出 key_status、field_diff 的内容存入其中
+    """
+    from PyQt5.QtCore import QCoreApplication
+    from comparator import CompareWorker, TEMP_TABLE1, TEMP_TABLE2
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    header = [PK] + [field for field, _, _ in rules]
+    platform = _write_sheet(tmp_path / 'platform.xlsx', '平台', header, platform_rows)
+    erp = _write_sheet(tmp_path / 'erp.xlsx', 'ERP', header, erp_rows)
+    rule_file = _write_rules(tmp_path / 'rules.xlsx', rules)
+
+    logs = []
+    worker = CompareWorker(platform, erp, rule_file, '平台', 'ERP', primary_keys=[PK],
+                           rules=read_rules(rule_file), staging_dir=str(tmp_path), backend=backend)
+    worker.log_signal.connect(logs.append)
+    if tables is not None:
+        compare_fields = worker._compare_fields_in_db
+
+        def compare_and_snapshot():
+            counts = compare_fields()
+            tables['key_status'] = sorted((row['k'], row['status'])
+                                          for row in worker.db.iter_records('SELECT k, status FROM key_status'))
+            tables['field_diff'] = list(worker.db.stream_diffs(TEMP_TABLE1, TEMP_TABLE2, [PK]))
+            return counts
+        worker._compare_fields_in_db = compare_and_snapshot
+    worker.run()
+    assert not [line for line in logs if line.startswith('❌ 发生错误') or '改用 SQLite' in line], logs
+    # 有差异时后端保留给导出分批读取，释放后不再产出记录
+    diffs = {(record["source"][PK], field): values[:2]
+             for record in worker.iter_diff_records() for field, values in record["fields"].items()}
+    assert (worker.db is not None) == bool(diffs)
+    worker.release()
+    assert worker.db is None and not list(worker.iter_diff_records())
+    return diffs
+
+
+def test_tail_diff_is_decimal_places(tmp_path):
+    """尾差 2 表示保留两位小数：舍入后相差 0.01 以上即为差异，整数位的差异不能被当成容差吞掉"""
+    diffs = _compare(tmp_path, [('数量', '数值', 2), ('原值', '数值', 2)],
+                     [('A1', 5, 100), ('A2', 1, 14556.21), ('A3', 1, 100.001), ('A4', 1, 100)],
+                     [('A1', 6, 100), ('A2', 1, 14556.29), ('A3', 1, 100.004), ('A4', 1, 100)])
+    assert diffs == {
+        ('A1', '数量'): ('5', '6'),
+        ('A2', '原值'): ('14556.21', '14556.29'),
+    }
+
+
+def test_unparsable_number_compares_as_text(tmp_path):
+    """数值列中无法解析的单元格按原值文本比较，不能在算术中当成 0"""
+    diffs = _compare(tmp_path, [('数量', '数值', 0), ('原值', '数值', 2)],
+                     [('B1', 'abc', 0), ('B2', 'abc', 'N/A'), ('B3', 'abc', 'N/A'), ('B4', 0, 0)],
+                     [('B1', 1, 0), ('B2', 'abc', 'N/A'), ('B3', None, 0), ('B4', 0, 0)])
+    assert diffs == {
+        ('B1', '数量'): ('abc', '1'),
+        ('B3', '数量'): ('abc', None),
+        ('B3', '原值'): ('N/A', '0'),
+    }
+
+
+def test_date_differences_are_reported(tmp_path):
+    """日期统一为 YYYY-MM-DD 后比较：写法不同的同一天相等，不同的日期、一边为空都是差异"""
+    diffs = _compare(tmp_path, [('开始日期', '日期', None)],
+                     [('D1', '20191220'), ('D2', '20191220'), ('D3', None), ('D4', None),
+                      ('D5', datetime(2019, 12, 20)), ('D6', '2019/1/5')],
+                     [('D1', '2019-12-20'), ('D2', '2019-12-19'), ('D3', '2019-12-20'), ('D4', None),
+                      ('D5', '2019/12/20'), ('D6', datetime(2019, 1, 5))])
+    assert diffs == {
+        ('D2', '开始日期'): ('2019-12-20', '2019-12-19'),
+        ('D3', '开始日期'): (None, '2019-12-20'),
+    }
+
+
+def test_duckdb_matches_sqlite(tmp_path):
+    """同一组数据分别用 SQLite、DuckDB 后端比对，主键分类和 field_diff 完全相同（含无法解析的数值）"""
+    pytest.importorskip('duckdb')
+    rules = [('数量', '数值', 0), ('原值', '数值', 2), ('累计折旧', '数值', 2), ('开始日期', '日期', None),
+             ('名称', '文本', None)]
+    platform_rows = [('E1', 'abc', 'N/A', -10, '20191220', ' 变压器'),
+                     ('E2', 'abc', 14556.21, 'x', None, '断路器'),
+                     ('E3', 1, 100.001, 5, '2019/1/5', None),
+                     ('E4', 2, 7, 3, '2020-01-01', '电缆')]
+    erp_rows = [('E1', None, 0, 10, '2019-12-19', '变压器'),
+                ('E2', 'abc', 14556.29, None, '2019-12-20', '断路器 '),
+                ('E3', 1, 100.004, 5, datetime(2019, 1, 5), '开关'),
+                ('E5', 2, 7, 3, '2020-01-01', '电缆')]
+    results = {}
+    for backend in ('sqlite', 'duckdb'):
+        workdir = tmp_path / backend
+        workdir.mkdir()
+        tables = {}
+        diffs = _compare(workdir, rules, platform_rows, erp_rows, backend=backend, tables=tables)
+        results[backend] = (diffs, tables)
+    sqlite_diffs = results['sqlite'][0]
+    assert ('E1', '数量') in sqlite_diffs and ('E2', '累计折旧') in sqlite_diffs
+    assert results['duckdb'] == results['sqlite']
@@ -0,0 +1,90 @@
+# test_projection.py
+"""
+列投影、按类型解析回归测试：规则字段名是入库列名形式（如 期末余额_入账价值），
+表头是原始形式（如 期末余额-入账价值），投影和按类型解析时两边按 sanitize_column_name 规整后匹配
+用仓库自带的 rule.xlsx 与 平台测试文件1.xlsx / ERP测试文件1.xlsx
+"""
+import os
+import sys
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(ENGINE_DIR))
+sys.path[:0] = [ENGINE_DIR, REPO_DIR]
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from rule_handler import read_rules, build_projection, build_column_types
+from excel_reader.data_handler import read_excel_fast, probe_header_layout, sanitize_column_name, unparsed_column
+
+RULE_FILE = os.path.join(ENGINE_DIR, 'rule.xlsx')
+PLATFORM_FILE = os.path.join(REPO_DIR, '平台测试文件1.xlsx')
+ERP_FILE = os.path.join(REPO_DIR, 'ERP测试文件1.xlsx')
+SHEET = 'Sheet1'
+
+
+def _rules_and_keys():
+    rules = read_rules(RULE_FILE)
+    primary_keys = [name for name, rule in rules.items() if rule["is_primary"]]
+    return rules, primary_keys
+
+
+def _projected_columns(file_path, is_file1, usecols):
+    """投影读取后的列名与按投影应保留的列名（均为规整形式）"""
+    headers = {sanitize_column_name(c) for c in probe_header_layout(file_path, SHEET, is_file1).columns}
+    df = read_excel_fast(file_path, SHEET, is_file1=is_file1, usecols=usecols)
+    got = {sanitize_column_name(c) for c in df.columns}
+    expected = {sanitize_column_name(c) for c in usecols} & headers
+    return got, expected
+
+
+def test_platform_projection_keeps_renamed_headers():
+    rules, primary_keys = _rules_and_keys()
+    usecols1, _ = build_projection(rules)
+    usecols1.update(primary_keys)
+    got, expected = _projected_columns(PLATFORM_FILE, True, usecols1)
+    assert got == expected
+    assert {'期末余额_入账价值', '期末余额_累计折旧', '期末余额_净值'} <= got
+
+
+def test_erp_projection_keeps_rule_columns():
+    rules, _ = _rules_and_keys()
+    _, usecols2 = build_projection(rules)
+    got, expected = _projected_columns(ERP_FILE, False, usecols2)
+    assert got == expected
+    assert {'累计购置值', '累计折旧额', '资产编码', '公司代码'} <= got
+
+
+def test_column_types_match_renamed_headers():
+    rules, primary_keys = _rules_and_keys()
+    types1, _ = build_column_types(rules, primary_keys)
+    assert types1['期末余额_入账价值'] == '数值'
+    df = read_excel_fast(PLATFORM_FILE, SHEET, is_file1=True, column_types=types1)
+    for col in ('期末余额-入账价值', '期末余额-累计折旧', '期末余额-净值'):
+        assert df[col].dtype == 'float64'
+        assert unparsed_column(col) in df.columns
+
+
+def test_column_types_keep_erp_primary_key_raw():
+    # 数值型主键的 ERP 列按文本匹配，不能解析成浮点（否则 1001100020000001 会变成 1.00110002e+15）
+    rules = {'资产编码': {'data_type': '数值', 'table2_field': 'ERP资产编码', 'is_primary': True, 'calc_rule': None},
+             '数量': {'data_type': '数值', 'table2_field': '数量', 'is_primary': False, 'calc_rule': None}}
+    types1, types2 = build_column_types(rules, ['资产编码'])
+    assert types1 == {'数量': '数值'}
+    assert types2 == {'数量': '数值'}
+
+
+def test_compare_sample_workbooks():
+    from PyQt5.QtCore import QCoreApplication
+    from comparator import CompareWorker
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    rules, primary_keys = _rules_and_keys()
+    logs = []
+    worker = CompareWorker(PLATFORM_FILE, ERP_FILE, RULE_FILE, SHEET, SHEET,
+                           primary_keys=primary_keys, rules=rules)
+    worker.log_signal.connect(logs.append)
+    worker.run()
+
+    assert not [line for line in logs if line.startswith('❌ 发生错误')], logs
+    assert worker.summary["common_count"] == 1
+    # 入账价值、累计折旧等金额字段两边一致
+    assert not {'期末余额_入账价值', '期末余额_累计折旧'} & set(worker.summary["field_diff_counts"])
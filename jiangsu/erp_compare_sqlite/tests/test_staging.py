@@ -0,0 +1,54 @@
+# test_staging.py
+"""
+暂存库：库文件旁的日志文件和溢写目录随库删除，遗留文件由 sweep_stale_staging 识别；
+规整存储的列另存原值侧列，差异记录展示原值
+"""
+import os
+import sys
+
+import pandas as pd
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(ENGINE_DIR))
+sys.path[:0] = [ENGINE_DIR, REPO_DIR]
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from db_handler import (new_staging_path, remove_staging_files, sweep_stale_staging, chunk_db_columns,
+                        raw_column, StagedColumn, STAGING_SUFFIXES)
+
+
+def _make_staging_files(path):
+    open(path, 'wb').close()
+    for suffix in STAGING_SUFFIXES:
+        if suffix == '.tmp':
+            os.makedirs(path + suffix)
+            open(os.path.join(path + suffix, 'spill.bin'), 'wb').close()
+        else:
+            open(path + suffix, 'wb').close()
+
+
+def test_remove_staging_files_removes_side_files(tmp_path):
+    path = new_staging_path(str(tmp_path))
+    _make_staging_files(path)
+    open(os.path.join(tmp_path, 'other.db'), 'wb').close()
+    remove_staging_files(path)
+    assert os.listdir(tmp_path) == ['other.db']
+
+
+def test_sweep_recognises_side_files(tmp_path):
+    path = os.path.join(tmp_path, f"staging_999999999_{'0' * 32}.db")
+    _make_staging_files(path)
+    assert sweep_stale_staging(str(tmp_path)) == 1 + len(STAGING_SUFFIXES)
+    assert os.listdir(tmp_path) == []
+
+
+def test_staged_columns_keep_raw_values():
+    df = pd.DataFrame({'原值': [847.43, -12.0, None], '名称': [' a ', 'b', None]})
+    unparsed = {'原值': pd.Series([None, None, None], dtype=object)}
+    staged = {'原值': StagedColumn('REAL', True, 0), '名称': StagedColumn('TEXT')}
+    names, columns = chunk_db_columns('temp_table1', df, unparsed, staged=staged)
+    values = dict(zip(names, columns))
+    assert values['原值'] == [847.0, 12.0, None]
+    assert values[raw_column('原值')] == ['847.43', '-12', None]
+    assert values['名称'] == ['a', 'b', None]
+    assert values[raw_column('名称')] == [' a ', None, None]  # 规整后不变的单元格不重复存
@@ -9,9 +9,9 @@ import time
 from PyQt5.QtWidgets import QWidget, QPushButton, QFileDialog, QLabel, QVBoxLayout, QHBoxLayout, \
     QPlainTextEdit, QTabWidget, QComboBox, QProgressDialog, QApplication
 from PyQt5.QtCore import Qt
-from openpyxl import load_workbook
 
-from data_handler import LoadColumnWorker
+from excel_reader.data_handler import LoadColumnWorker, probe_header_layout
+from excel_reader.table_reader import read_table, table_size
 from rule_handler import read_rules
 from comparator import CompareWorker
 from concurrent.futures import ThreadPoolExecutor
@@ -42,6 +42,10 @@ class ExcelComparer(QWidget):
         self.worker_load1 = None
         self.worker_load2 = None
         self.loading_dialog = None
+        # 页签规模 {文件路径: {页签名: (行数, 列数)}}，选文件后由 LoadColumnWorker 回填
+        self.sheet_sizes = {}
+        # 导出进度 {源文件: 已写入行数}
+        self.export_rows_done = {}
         # 读取规则文件
         self.load_rules_file()
 
@@ -153,6 +157,8 @@ class ExcelComparer(QWidget):
         if hasattr(self, 'worker_sheet2') and self.worker_sheet2 is not None and self.worker_sheet2.isRunning():
             self.worker_sheet2.quit()
             self.worker_sheet2.wait()
+        if self.worker is not None:
+            self.worker.release()
         super().closeEvent(event)
 
     def reset_file_state(self, is_file1=True, is_file2=False):
@@ -177,7 +183,7 @@ class ExcelComparer(QWidget):
 
     def select_file1(self):
         self.reset_file_state(is_file1=True, is_file2=False)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file1 = file
             filename = os.path.basename(file)
@@ -188,7 +194,7 @@ class ExcelComparer(QWidget):
 
     def select_file2(self):
         self.reset_file_state(is_file1=False, is_file2=True)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file2 = file
             filename = os.path.basename(file)
@@ -211,6 +217,7 @@ class ExcelComparer(QWidget):
         worker = LoadColumnWorker(file_path)
         worker.sheet_names_loaded.connect(self.on_sheet_names_loaded)
         worker.sheet_names_loaded.connect(self.close_loading_dialog)
+        worker.sheet_sizes_loaded.connect(self.on_sheet_sizes_loaded)
         # worker.columns_loaded.connect(self.on_columns_loaded)
         # worker.error_occurred.connect(self.on_column_error)
         if is_file1:
@@ -229,8 +236,25 @@ class ExcelComparer(QWidget):
             self.sheet_combo2.addItems(sheet_names)
             self.sheet_combo2.setCurrentIndex(0)
 
+    def on_sheet_sizes_loaded(self, file_path, sheet_sizes):
+        self.sheet_sizes[file_path] = sheet_sizes
+        self.update_sheet_size_labels()
+
+    def sheet_rows(self, file_path, sheet_name):
+        """页签行数（含表头）；规模未知时返回 0"""
+        return self.sheet_sizes.get(file_path, {}).get(sheet_name, (0, 0))[0]
+
+    def update_sheet_size_labels(self):
+        """在页签选择框上方显示所选页签的行列数"""
+        for file_path, combo, label, text in (
+                (self.file1, self.sheet_combo1, self.sheet_label1, "选择平台表页签："),
+                (self.file2, self.sheet_combo2, self.sheet_label2, "选择ERP表页签：")):
+            size = self.sheet_sizes.get(file_path, {}).get(combo.currentText())
+            label.setText(f"{text}（{size[0]} 行 × {size[1]} 列）" if size else text)
+
     def on_sheet_selection_changed(self):
         """页签选择变化时的处理函数"""
+        self.update_sheet_size_labels()
         # 简单更新比较按钮状态
         self.update_compare_button_state()
 
@@ -261,22 +285,30 @@ class ExcelComparer(QWidget):
         if not primary_keys:
             self.log("规则文件中未定义主键字段，请检查规则文件！")
             return
-        self.loading_dialog = QProgressDialog("正在比较文件，请稍候...", None, 0, 0, self)
+        self.loading_dialog = QProgressDialog("正在比较文件，请稍候...", None, 0, 100, self)
         self.loading_dialog.setWindowModality(Qt.WindowModal)
         self.loading_dialog.setWindowTitle("比较中")
         self.loading_dialog.setCancelButton(None)
         self.loading_dialog.show()
 
+        if self.worker is not None:
+            self.worker.release()  # 上一次比对为导出保留的后端
         self.worker = CompareWorker(self.file1, self.file2, self.rule_file, sheet_name1, sheet_name2,
                                     primary_keys=primary_keys,
                                     rules=self.rules)
         self.worker.log_signal.connect(self.log)
+        self.worker.progress_signal.connect(self.update_progress)
         # 连接信号以在比较完成时关闭对话框
         self.worker.finished.connect(self.close_loading_dialog)
         self.worker.finished.connect(lambda: self.export_btn.setEnabled(True))
         self.worker.finished.connect(self.on_compare_finished)
         self.worker.start()
 
+    def update_progress(self, value):
+        """更新进度对话框百分比"""
+        if self.loading_dialog:
+            self.loading_dialog.setValue(value)
+
     def close_loading_dialog(self):
         """关闭加载对话框"""
         if self.loading_dialog:
@@ -321,7 +353,7 @@ class ExcelComparer(QWidget):
 
     # ---------- 导出入口 ----------
     def export_report(self):
-        if not hasattr(self.worker, 'diff_full_rows'):
+        if self.worker is None:
             self.log("没有可导出的数据，请先执行比对！")
             return
         directory = QFileDialog.getExistingDirectory(self, "选择保存路径")
@@ -332,13 +364,22 @@ class ExcelComparer(QWidget):
             (self.file2, self.sheet_combo2.currentText(), False, directory)
         ]
         t0 = time.time()
-        self.loading_dialog = QProgressDialog("正在导出报告，请稍候...", None, 0, 0, self)
+        # 按页签规模显示导出进度；规模未知时为不定进度
+        total_rows = sum(self.sheet_rows(src, sheet) for src, sheet, _, _ in tasks)
+        self.export_rows_done = {}
+        self.loading_dialog = QProgressDialog("正在导出报告，请稍候...", None, 0, 100 if total_rows else 0, self)
         self.loading_dialog.setWindowModality(Qt.WindowModal)
         self.loading_dialog.setWindowTitle("导出")
         self.loading_dialog.setCancelButton(None)
         self.loading_dialog.show()
         with ThreadPoolExecutor(max_workers=2) as pool:
-            pool.map(lambda t: self._export_final(*t), tasks)
+            futures = [pool.submit(self._export_final, *t) for t in tasks]
+            while not all(f.done() for f in futures):
+                if total_rows:
+                    done_rows = sum(self.export_rows_done.values())
+                    self.update_progress(min(99, 100 * done_rows // total_rows))
+                QApplication.processEvents()
+                time.sleep(0.05)
         self.log(f"✅ 并行导出完成，总耗时 {time.time() - t0:.1f}s")
         self.close_loading_dialog()
 
@@ -358,19 +399,14 @@ class ExcelComparer(QWidget):
                 pass  # Windows 会抛异常，忽略即可
 
             # 2. 读原表（全部字符串，防类型问题）
-            has_merged_cell = False
-            wb = load_workbook(filename=dst, read_only=False)
-            ws = wb[sheet_name]
-            for row in ws.iter_rows(max_row=2):
-                for cell in row:
-                    if cell.coordinate in ws.merged_cells:
-                        has_merged_cell = True
-                        break
+            # 前两行是否有合并单元格取自表头探测（只读 XML 开头与 <mergeCells>，比对时已缓存）
+            has_merged_cell = probe_header_layout(src_file, sheet_name, is_first_file,
+                                                  self.worker.skip_rows).header_merged
 
             if not is_first_file and has_merged_cell:
-                df = pd.read_excel(dst, sheet_name=sheet_name, skiprows=1, dtype=str).fillna("")
+                df = read_table(src_file, sheet_name, header_row=2, as_str=True)
             else:
-                df = pd.read_excel(dst, sheet_name=sheet_name, dtype=str).fillna("")
+                df = read_table(src_file, sheet_name, as_str=True)
 
             # 3. 计算行主键（与比对阶段一致）
             if is_first_file:
@@ -385,19 +421,10 @@ class ExcelComparer(QWidget):
                 else:
                     df["_key"] = df[rule["table2_field"]].astype(str)
 
-            # 4. 建立差异映射 - 使用与比对阶段相同的逻辑
-            diff_map = {}
+            # 4. 缺失/多余主键集合（只有主键，随行数线性增长）
             miss = set()
             extra = set()
 
-            # 构建主键到差异记录的映射（使用 _pk_concat）
-            diff_full_rows = getattr(self.worker, 'diff_full_rows', [])
-            for it in diff_full_rows:
-                # 直接使用 _pk_concat 作为键
-                key = str(it['source'].get('_pk_concat', ''))
-                diff_map[key] = it
-
-            # 构建缺失和多余的主键集合（使用 _pk_concat）
             missing_rows = getattr(self.worker, 'missing_rows', [])
             for row in missing_rows:
                 key = str(row.get('_pk_concat', ''))
@@ -421,221 +448,32 @@ class ExcelComparer(QWidget):
                 original_key = " + ".join([str(row.get(pk, "")) for pk in self.worker.primary_keys])
                 key_to_pk_concat[original_key] = str(row.get('_pk_concat', ''))
 
-            # 为差异行建立映射
-            for it in diff_full_rows:
-                if is_first_file:
-                    original_key = " + ".join([str(it['source'].get(pk, "")) for pk in self.worker.primary_keys])
-                else:
-                    original_key = " + ".join([str(it['target'].get(pk, "")) for pk in self.worker.primary_keys])
-                key_to_pk_concat[original_key] = str(it['source'].get('_pk_concat', ''))
-
             # 将原始主键映射到 _pk_concat
             df["_pk_concat_key"] = df["_key"].map(key_to_pk_concat).fillna(df["_key"])
 
             # 6. 需要追加的列（顺序 = 规则顺序）
             comp_cols = [f for f in self.rules.keys() if not self.rules[f].get("is_primary")]
 
-            # 7. 计算追加值
+            # 7. 对比结果先按缺失/多余/一致填写，不一致的行在读取差异时改写
             keys = df["_pk_concat_key"].tolist()
-            total_keys = len(keys)
-
             comp_results = []
             for k in keys:
                 if k in miss:
                     comp_results.append("此数据不存在于SAP")  # 平台表多余 → 提示不存在于SAP
                 elif k in extra:
                     comp_results.append("此数据不存在于平台")  # ERP表多余 → 提示不存在于平台
-                elif k in diff_map:
-                    comp_results.append("不一致")
                 else:
                     comp_results.append("一致")
 
-            def normalize_export_value(val):
-                """导出时的值标准化函数，处理空值和None"""
-                if pd.isna(val) or val is None or (
-                        isinstance(val, str) and val.strip().lower() in ['', 'none', 'null']):
-                    return ''
-                return str(val).strip()
-
-            # 预加载资产分类映射表（如果需要）
-            asset_category_mapping = None
-            if "资产分类" in comp_cols:
-                try:
-                    from db_handler import _load_asset_category_mapping
-                    mapping_df = _load_asset_category_mapping(self.worker.rule_file)
-                    if not mapping_df.empty and '同源目录完整名称' in mapping_df.columns and '同源目录编码' in mapping_df.columns:
-                        asset_category_mapping = dict(zip(mapping_df['同源目录完整名称'].astype(str),
-                                                          mapping_df['同源目录编码'].astype(str)))
-                except Exception:
-                    pass
-
-            def detail(row_key, fld):
-                # 修复：正确处理差异详情
-                if row_key not in diff_map:
-                    return ""
-
-                s, t = diff_map[row_key]['source'], diff_map[row_key]['target']
-                rule = self.rules.get(fld, {})
-
-                # 获取字段值
-                src_val = str(s.get(fld, ""))
-                tgt_val = str(t.get(fld, ""))
+            # 原表行按原始主键分组（同一主键可能有多行），读取差异时按主键定位行
+            rows_by_key = {}
+            for r, k in enumerate(df["_key"].tolist()):
+                rows_by_key.setdefault(k, []).append(r)
 
-                # 特殊处理资产分类字段
-                if fld == "资产分类" and "资产明细类别" in t:
-                    tgt_val = str(t.get("资产明细类别", ""))
-
-                # 标准化值用于比较（使用导出专用的标准化函数）
-                norm_src = normalize_export_value(src_val)
-                norm_tgt = normalize_export_value(tgt_val)
-
-                # 如果两个值都为空，则认为一致
-                if norm_src == '' and norm_tgt == '':
-                    return ""
-
-                # 根据字段类型进行特殊处理
-                data_type = rule.get("data_type", "文本")
-
-                if data_type == "数值":
-                    tail_diff = float(rule.get("tail_diff", 0))
-                    try:
-                        # 尝试转换为数值并按精度比较
-                        src_num = float(norm_src) if norm_src else 0
-                        tgt_num = float(norm_tgt) if norm_tgt else 0
-
-                        # 如果设置了尾差，则按尾差精度比较
-                        if tail_diff > 0:
-                            src_rounded = round(src_num, int(tail_diff))
-                            tgt_rounded = round(tgt_num, int(tail_diff))
-
-                            # 只有在超出尾差范围时才显示为差异
-                            if abs(src_rounded - tgt_rounded) > (10 ** (-int(tail_diff))):
-                                # 格式化显示值，保持精度一致性
-                                src_display = f"{src_num:.{int(tail_diff)}f}" if norm_src else ""
-                                tgt_display = f"{tgt_num:.{int(tail_diff)}f}" if norm_tgt else ""
-                                return f"不一致：平台表={src_display}, ERP表={tgt_display}"
-                        else:
-                            # 没有设置尾差时，直接比较数值
-                            if src_num != tgt_num:
-                                return f"不一致：平台表={src_val}, ERP表={tgt_val}"
-                    except (ValueError, TypeError):
-                        # 如果不能转换为数值，按字符串比较
-                        if norm_src != norm_tgt:
-                            return f"不一致：平台表={src_val}, ERP表={tgt_val}"
-
-                elif data_type == "文本":
-                    # 特殊处理资产分类字段
-                    if fld == "资产分类":
-                        # 在导出时，我们需要应用与比对时相同的资产分类转换逻辑
-                        if "资产明细类别" in t:
-                            actual_tgt_value = str(t.get("资产明细类别", ""))
-                            actual_tgt_show_value = str(t.get(fld, ""))
-
-                            # 标准化目标值
-                            norm_actual_tgt = normalize_export_value(actual_tgt_value)
-
-                            # 对于平台表（表一）的资产分类，需要转换为编码进行比较
-                            if is_first_file and norm_src and asset_category_mapping:
-                                try:
-                                    # 获取表一的编码（通过映射）
-                                    src_code = asset_category_mapping.get(norm_src, norm_src)
-                                    src_code_prefix = src_code[:2] if len(src_code) >= 2 else src_code
-
-                                    # 获取表二的"资产明细类别"字段值（实际用于对比的字段）
-                                    tgt_code_prefix = norm_actual_tgt[:2] if len(
-                                        norm_actual_tgt) >= 2 else norm_actual_tgt
-
-                                    # 比较前两位
-                                    if src_code_prefix != tgt_code_prefix:
-                                        # 显示原始中文信息而不是编码
-                                        return f"不一致：平台表={src_val}, ERP表={actual_tgt_show_value} (编码前两位不匹配: {src_code_prefix} vs {tgt_code_prefix})"
-                                    else:
-                                        return ""  # 一致，不显示任何内容
-                                except Exception:
-                                    # 如果映射失败，回退到直接比较
-                                    if norm_src != norm_actual_tgt:
-                                        return f"不一致：平台表={src_val}, ERP表={actual_tgt_value}"
-                            else:
-                                # 对于ERP表或其他情况，直接比较
-                                if norm_src != norm_actual_tgt:
-                                    return f"不一致：平台表={src_val}, ERP表={actual_tgt_value}"
-
-                    # 特殊处理监管资产属性字段，只对比二级分类
-                    elif fld == "监管资产属性":
-                        # 提取二级分类进行比较
-                        src_second_level = self.worker._extract_second_level(norm_src)
-                        tgt_second_level = self.worker._extract_second_level(norm_tgt)
-
-                        if src_second_level != tgt_second_level:
-                            return f"不一致：平台表={src_val}, ERP表={tgt_val} (二级分类不匹配: '{src_second_level}' vs '{tgt_second_level}')"
-
-                    # 对折旧方法字段进行特殊处理
-                    elif "折旧方法" in fld:
-                        norm_src_text = self.worker._normalize_depreciation_method(norm_src, is_file1=True)
-                        norm_tgt_text = self.worker._normalize_depreciation_method(norm_tgt, is_file1=False)
-                        # 比较标准化后的值
-                        if norm_src_text != norm_tgt_text:
-                            return f"不一致：平台表={src_val}, ERP表={tgt_val}"
-
-                    # 处理ERP组合映射字段
-                    elif fld in self.worker.erp_combo_map:
-                        # 检查是否符合ERP组合映射规则
-                        platform_val = norm_src.strip()
-                        erp_val = norm_tgt.strip()
-
-                        # 检查是否在允许的ERP值中
-                        is_match = False
-                        if platform_val in self.worker.erp_combo_map:
-                            allowed_erp_values = self.worker.erp_combo_map[platform_val]
-                            is_match = erp_val in allowed_erp_values
-
-                        if not is_match:
-                            return f"不一致：平台表={src_val}, ERP表={tgt_val} (不符合ERP组合映射规则)"
-
-                    # 处理线站电压等级字段
-                    elif fld == "线站电压等级":
-                        # 对ERP表的编码值进行映射转换为中文
-                        erp_chinese = self.worker.voltage_level_map.get(norm_tgt.strip(), norm_tgt.strip())
-                        platform_chinese = norm_src.strip()
-
-                        # 比较中文值
-                        if platform_chinese != erp_chinese:
-                            return f"不一致：平台表={src_val}, ERP表={tgt_val} (映射后: 平台表='{platform_chinese}' ≠ ERP表='{erp_chinese}')"
-
-                    # 对其他文本值进行标准化处理
-                    else:
-                        norm_src_text = self.worker._normalize_text_value(norm_src)
-                        norm_tgt_text = self.worker._normalize_text_value(norm_tgt)
-                        # 比较标准化后的值
-                        if norm_src_text != norm_tgt_text:
-                            # 确保空值正确显示
-                            src_display = src_val if src_val and src_val.lower() not in ['none', 'null'] else ''
-                            tgt_display = tgt_val if tgt_val and tgt_val.lower() not in ['none', 'null'] else ''
-                            if src_display != tgt_display:
-                                return f"不一致：平台表={src_display}, ERP表={tgt_display}"
-
-                elif data_type == "日期":
-                    # 处理日期格式标准化
-                    norm_src_date = self.worker._normalize_date_format(norm_src)
-                    norm_tgt_date = self.worker._normalize_date_format(norm_tgt)
-
-                    if norm_src_date != norm_tgt_date:
-                        return f"不一致：平台表={src_val}, ERP表={tgt_val}"
-                else:
-                    # 其他类型按原逻辑比较
-                    if norm_src != norm_tgt:
-                        return f"不一致：平台表={src_val}, ERP表={tgt_val}"
-
-                return ""
-
-            # 批量处理差异详情，避免重复计算
-            comp_details = {}
-            for fld in comp_cols:
-                comp_details[fld] = []
-                for i, k in enumerate(keys):
-                    if i % 1000 == 0:  # 每处理1000行输出一次进度（可选）
-                        pass
-                    comp_details[fld].append(detail(k, fld))
+            def detail(diff):
+                src_val, tgt_val, reason = (self.normalize_value(v) for v in diff)
+                text = f"不一致：平台表={src_val}, ERP表={tgt_val}"
+                return f"{text} ({reason})" if reason else text
 
             # 8. 用 xlsxwriter 重写副本：不改动原列，仅追加
             with xlsxwriter.Workbook(dst, {'nan_inf_to_errors': True}) as wb:
@@ -653,25 +491,33 @@ class ExcelComparer(QWidget):
                 for r in range(orig_rows):
                     for c in range(orig_cols):
                         ws.write(r + 1, c, df.iloc[r, c])
+                    if r % 1000 == 0:
+                        self.export_rows_done[src_file] = r
+                self.export_rows_done[src_file] = orig_rows
+
+                # 规则字段列标题（紧跟在"对比结果"之后）
+                result_col = orig_cols
+                field_cols = {fld: result_col + 1 + i for i, fld in enumerate(comp_cols)}
+                for fld, col in field_cols.items():
+                    ws.write(0, col, fld, header_fmt)
+
+                # 差异详情直接取自比对阶段 SQL 写出的 field_diff，按行对分批读取后逐条写入，不再重新判定
+                side = 'source' if is_first_file else 'target'
+                for it in self.worker.iter_diff_records():
+                    original_key = " + ".join([str(it[side].get(pk, "")) for pk in self.worker.primary_keys])
+                    rows = rows_by_key.get(original_key) or rows_by_key.get(str(it['source'].get('_pk_concat', '')), [])
+                    for r in rows:
+                        if comp_results[r] == "一致":
+                            comp_results[r] = "不一致"
+                        for fld, diff in it['fields'].items():
+                            if fld in field_cols:
+                                ws.write(r + 1, field_cols[fld], detail(diff), red_fmt)
 
                 # 追加"对比结果"
-                next_col = orig_cols
-                ws.write(0, next_col, "对比结果", header_fmt)
+                ws.write(0, result_col, "对比结果", header_fmt)
                 for r in range(orig_rows):
                     val = comp_results[r]
-                    ws.write(r + 1, next_col, val)
-                    if val != "一致":
-                        ws.write(r + 1, next_col, val, red_fmt)
-
-                # 依次追加规则字段列
-                for fld in comp_cols:
-                    next_col += 1
-                    ws.write(0, next_col, fld, header_fmt)
-                    for r in range(orig_rows):
-                        val = comp_details[fld][r]
-                        ws.write(r + 1, next_col, val)
-                        if val:
-                            ws.write(r + 1, next_col, val, red_fmt)
+                    ws.write(r + 1, result_col, val, red_fmt if val != "一致" else None)
 
             self.log(f"✅ 导出完成 {dst.name}")
         except Exception as e:
@@ -704,16 +550,14 @@ class ExcelComparer(QWidget):
     # ---------- 快速估算行数 ----------
     def _quick_row_count(self, file_path, sheet_name):
         try:
-            df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=0)
-            with pd.ExcelFile(file_path) as xls:
-                return xls.book.sheet_by_name(sheet_name).nrows
+            return table_size(file_path, sheet_name, estimate=True)[0]
         except:
             return 0
 
     # ---------- 方案A：xlsxwriter + pandas ----------
     def _write_with_xlsxwriter(self, src_file, sheet_name, is_first_file, dst_file):
         # 1) 读数据
-        df = pd.read_excel(src_file, sheet_name=sheet_name)
+        df = read_table(src_file, sheet_name)
 
         # 2) 清理 NaN/Inf
         df = df.replace([float('inf'), float('-inf')], None)  # 先转 None
@@ -769,7 +613,7 @@ class ExcelComparer(QWidget):
         diff_map, miss, extra = {}, set(), set()
 
         # 构建主键到差异记录的映射
-        for it in getattr(self.worker, 'diff_full_rows', []):
+        for it in self.worker.iter_diff_records():
             # 使用用户定义的主键而不是内部的_pk_concat
             if is_first_file:
                 key_parts = [str(it['source'].get(pk, "")) for pk in primary_keys]
@@ -807,17 +651,11 @@ class ExcelComparer(QWidget):
                 k = row["_key"]
                 if k not in diff_map:
                     return ""
-                s, t = diff_map[k]['source'], diff_map[k]['target']
-                v1, v2 = str(s.get(col, "")), str(t.get(col, ""))
-
-                # 特殊处理资产分类字段
-                if col == "资产分类" and "资产明细类别" in t:
-                    v2 = str(t.get("资产明细类别", ""))
-
-                # 直接比较值，如果不同则显示差异
-                if v1.strip() != v2.strip():
-                    return f"不一致：平台表={v1}, ERP表={v2}"
-                return ""
+                diff = diff_map[k].get('fields', {}).get(col)
+                if diff is None:
+                    return ""
+                v1, v2 = (self.normalize_value(v) for v in diff[:2])
+                return f"不一致：平台表={v1}, ERP表={v2}"
 
             df[col] = df.apply(detail, axis=1)
 
@@ -4,6 +4,7 @@ import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import threading
+import multiprocessing
 import time
 import warnings
 import logging
@@ -12,6 +13,10 @@ import gc
 
 import xlwt
 
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from excel_reader.table_reader import table_format, table_size, iter_table_batches, BATCH_ROWS
+
 # 忽略pandas的警告
 warnings.filterwarnings('ignore')
 
@@ -462,10 +467,9 @@ class ExcelMergerSplitterApp:
             return
 
         try:
-            # 读取文件获取表头
-            df = self.read_table_file(split_file)
-            if len(df) > 0:
-                headers = df.iloc[0].tolist()
+            # 读取文件获取表头（只解析第一行）
+            headers = self.read_header_row(split_file)
+            if headers:
                 # 过滤空表头
                 headers = [h for h in headers if str(h).strip()]
                 self.column_combobox['values'] = headers
@@ -514,170 +518,101 @@ class ExcelMergerSplitterApp:
         公共文件读取方法，支持多种表格格式
         返回包含所有数据的DataFrame（包含表头行）
         """
-        file_ext = os.path.splitext(file_path)[1].lower()
-        logger.info(f"开始解析文件: {file_path}，格式: {file_ext}")
-
+        logger.info(f"开始解析文件: {file_path}")
         try:
-            if file_ext == '.csv':
-                # CSV文件处理（保持原逻辑）
-                encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-                df = None
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(
-                            file_path,
-                            encoding=encoding,
-                            header=None,  # 不自动解析表头
-                            dtype=str,  # 所有列按字符串读取
-                            keep_default_na=False
-                        )
-                        logger.debug(f"成功使用 {encoding} 编码读取CSV文件")
-                        break
-                    except Exception as e:
-                        logger.debug(f"使用 {encoding} 编码读取CSV失败: {str(e)}")
-                        continue
-                if df is None:
-                    raise Exception(f"无法解析CSV文件，尝试了多种编码")
-                return df
+            chunks = list(self.read_table_file_chunked(file_path, chunksize=BATCH_ROWS))
+            df = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+            logger.debug(f"成功解析文件，共 {len(df)} 行")
+            return df
+        except Exception as e:
+            logger.error(f"解析文件 {file_path} 失败: {str(e)}")
+            raise Exception(f"文件解析错误: {str(e)}")
 
-            elif file_ext in ['.xlsx', '.et']:
-                # XLSX和WPS表格处理（包含您的格式处理逻辑）
-                wb = load_workbook(file_path, read_only=True)
+    def read_header_row(self, file_path):
+        """只读取第一行（表头），不解析数据行"""
+        first = next(self.read_table_file_chunked(file_path, chunksize=1))
+        return first.iloc[0].tolist() if len(first) else []
+
+    @staticmethod
+    def _format_cell(value, fmt):
+        """按单元格的数字格式把 xlsx 单元格值转成显示文本"""
+        if fmt is None:
+            return str(value) if value is not None else ""
+        if fmt != 'General':
+
+            if isinstance(value, (float, int)):
+                if '.' in fmt:
+                    decimal_part = fmt.split('.')[-1]
+                    decimal_places = decimal_part.count('0')
+                    # decimal_places = len(
+                    #     decimal_part.replace('%', '').replace('#', '').replace('0', ''))  # 精确获取位数
+                    return f"{value:.{decimal_places}f}"
+                else:
+                    return f"{value:.0f}"
+            elif hasattr(value, 'strftime'):  # 日期时间类型
+                if ';' in fmt:
+                    date_fmt = fmt.split(';')[0]
+                else:
+                    date_fmt = fmt
+                try:
+                    # 转换Excel格式到strftime格式
+                    fmt_converted = (date_fmt.replace('yyyy', '%Y')
+                                     .replace('yy', '%y')
+                                     .replace('mm', '%m')
+                                     .replace('m', '%m')
+                                     .replace('dd', '%d')
+                                     .replace('d', '%d')
+                                     .replace('hh', '%H')
+                                     .replace('ss', '%S'))
+                    return value.strftime(fmt_converted)
+                except:
+                    return str(value)
+            elif '%' in fmt and isinstance(value, (int, float)):  # 百分比类型
+                decimal_places = fmt.count('0') - 1  # e.g. 0.00% -> 2
+                return f"{value:.{decimal_places}%}"
+            else:
+                return str(value) if value is not None else ""
+        else:
+            return str(value) if value is not None else ""
+
+    def _iter_formatted_xlsx_chunks(self, file_path, chunksize):
+        """XLSX和WPS表格：只读模式逐行按数字格式转成文本，每 chunksize 行产出一块"""
+        # 以文件对象打开，openpyxl 不再按后缀拒绝 .et 和后缀标错的 .xls
+        with open(file_path, 'rb') as fp:
+            wb = load_workbook(fp, read_only=True)
+            try:
                 ws = wb.active
                 data = []
                 for row in ws.iter_rows():
-                    current_row = []
-                    for cell in row:
-                        value = cell.value
-                        fmt = cell.number_format  # 获取单元格格式
-
-                        if fmt is None:
-                            current_row.append(str(value) if value is not None else "")
-                        else:
-                            if fmt != 'General':
-
-                                if isinstance(value, (float, int)):
-                                    if '.' in fmt:
-                                        decimal_part = fmt.split('.')[-1]
-                                        decimal_places = decimal_part.count('0')
-                                        # decimal_places = len(
-                                        #     decimal_part.replace('%', '').replace('#', '').replace('0', ''))  # 精确获取位数
-                                        formatted_value = f"{value:.{decimal_places}f}"
-                                    else:
-                                        formatted_value = f"{value:.0f}"
-                                    current_row.append(formatted_value)
-                                elif hasattr(value, 'strftime'):  # 日期时间类型
-                                    if ';' in fmt:
-                                        date_fmt = fmt.split(';')[0]
-                                    else:
-                                        date_fmt = fmt
-                                    try:
-                                        # 转换Excel格式到strftime格式
-                                        fmt_converted = (date_fmt.replace('yyyy', '%Y')
-                                                         .replace('yy', '%y')
-                                                         .replace('mm', '%m')
-                                                         .replace('m', '%m')
-                                                         .replace('dd', '%d')
-                                                         .replace('d', '%d')
-                                                         .replace('hh', '%H')
-                                                         .replace('ss', '%S'))
-                                        formatted_value = value.strftime(fmt_converted)
-                                    except:
-                                        formatted_value = str(value)
-                                    current_row.append(formatted_value)
-                                elif '%' in fmt and isinstance(value, (int, float)):  # 百分比类型
-                                    decimal_places = fmt.count('0') - 1  # e.g. 0.00% -> 2
-                                    formatted_value = f"{value:.{decimal_places}%}"
-                                    current_row.append(formatted_value)
-                                else:
-                                    current_row.append(str(value) if value is not None else "")
-                            else:
-                                current_row.append(str(value) if value is not None else "")
-                    data.append(current_row)
+                    data.append([self._format_cell(cell.value, cell.number_format) for cell in row])
+                    if len(data) >= chunksize:
+                        yield pd.DataFrame(data)
+                        data = []
+                if data:
+                    yield pd.DataFrame(data)
+            finally:
                 wb.close()  # 关闭工作簿释放资源
-                df = pd.DataFrame(data)
-                logger.debug(f"成功解析XLSX/ET文件，共 {len(df)} 行")
-                return df
-
-            elif file_ext == '.xls':
-                # XLS文件处理
-                try:
-                    # 尝试使用xlrd引擎（适用于真正的.xls文件）
-                    df = pd.read_excel(
-                        file_path,
-                        header=None,
-                        engine='xlrd',
-                        dtype=str,
-                        keep_default_na=False
-                    )
-                    logger.debug(f"成功使用xlrd引擎解析XLS文件，共 {len(df)} 行")
-                except Exception as xlrd_error:
-                    # 如果xlrd失败，可能是.xlsx文件被错误标记为.xls，尝试openpyxl
-                    try:
-                        df = pd.read_excel(
-                            file_path,
-                            header=None,
-                            engine='openpyxl',
-                            dtype=str,
-                            keep_default_na=False
-                        )
-                        logger.debug(f"成功使用openpyxl引擎解析文件，共 {len(df)} 行")
-                    except Exception as openpyxl_error:
-                        # 如果两种引擎都失败，抛出更详细的错误信息
-                        raise Exception(
-                            f"无法解析XLS文件: xlrd错误: {str(xlrd_error)}, openpyxl错误: {str(openpyxl_error)}")
-
-                return df
-
-            else:
-                raise Exception(f"不支持的文件格式: {file_ext}")
-
-        except Exception as e:
-            logger.error(f"解析文件 {file_path} 失败: {str(e)}")
-            raise Exception(f"文件解析错误: {str(e)}")
 
     def read_table_file_chunked(self, file_path, chunksize=1000):
         """
-        分块读取文件的方法，用于处理大文件
+        分块读取文件的方法，用于处理大文件；每块都是全字符串、不含列名的 DataFrame
+        xlsx/et 保留单元格数字格式的显示效果，xls/csv 由 table_reader 流式读取
         """
-        file_ext = os.path.splitext(file_path)[1].lower()
-        logger.info(f"开始分块解析文件: {file_path}，格式: {file_ext}")
-
-        if file_ext == '.csv':
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-            for encoding in encodings:
-                try:
-                    for chunk in pd.read_csv(
-                            file_path,
-                            encoding=encoding,
-                            header=None,
-                            dtype=str,
-                            keep_default_na=False,
-                            chunksize=chunksize
-                    ):
-                        yield chunk
-                    break
-                except Exception as e:
-                    logger.debug(f"使用 {encoding} 编码读取CSV失败: {str(e)}")
-                    continue
-            else:
-                raise Exception(f"无法解析CSV文件，尝试了多种编码")
-
-        elif file_ext in ['.xlsx', '.et']:
-            df = self.read_table_file(file_path)
-            total_rows = len(df)
-            for i in range(0, total_rows, chunksize):
-                yield df.iloc[i:i + chunksize]
-
-        elif file_ext == '.xls':
-            # 对于XLS文件，同样需要一次性读取
-            df = self.read_table_file(file_path)
-            total_rows = len(df)
-            for i in range(0, total_rows, chunksize):
-                yield df.iloc[i:i + chunksize]
+        fmt = table_format(file_path)
+        logger.info(f"开始分块解析文件: {file_path}，格式: {fmt}")
 
+        if fmt == 'xlsx':
+            chunks = self._iter_formatted_xlsx_chunks(file_path, chunksize)
         else:
-            raise Exception(f"不支持的文件格式: {file_ext}")
+            chunks = iter_table_batches(file_path, header_row=0, batch_size=chunksize, as_str=True)
+        emitted = False
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            emitted = True
+            yield chunk
+        if not emitted:
+            yield pd.DataFrame()
 
     # ==================== 合并处理 ====================
     def start_merge(self):
@@ -974,8 +909,7 @@ class ExcelMergerSplitterApp:
 
             try:
                 # 只读取第一行获取表头
-                header_df = self.read_table_file(split_file)
-                header = header_df.iloc[0]
+                header = pd.Series(self.read_header_row(split_file))
             except Exception as e:
                 raise Exception(f"读取文件表头失败: {str(e)}")
 
@@ -991,33 +925,8 @@ class ExcelMergerSplitterApp:
                 # 计算总行数
                 total_rows = 0
                 try:
-                    if file_ext == '.csv':
-                        # 对于CSV文件，使用pandas计算行数
-                        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-                        for encoding in encodings:
-                            try:
-                                total_rows = sum(1 for row in pd.read_csv(
-                                    split_file,
-                                    encoding=encoding,
-                                    chunksize=10000
-                                ))
-                                break
-                            except:
-                                continue
-                    elif file_ext in ['.xlsx', '.et']:
-                        # 对于Excel文件，使用openpyxl计算行数
-                        wb = load_workbook(split_file, read_only=True)
-                        ws = wb.active
-                        total_rows = ws.max_row
-                        wb.close()
-                    elif file_ext == '.xls':
-                        df = pd.read_excel(
-                            split_file,
-                            engine='xlrd'
-                        )
-                        total_rows = len(df)
-                        del df  # 立即释放内存
-                        gc.collect()  # 强制垃圾回收
+                    # xlsx 取 <dimension>、xls 取页签行数，不加载数据；csv 流式计数（均含表头行）
+                    total_rows = table_size(split_file)[0]
                 except Exception as e:
                     logger.warning(f"无法准确计算总行数: {e}")
                     total_rows = 100000  # 估计一个较大的值
@@ -1382,59 +1291,8 @@ class ExcelMergerSplitterApp:
     def _load_and_cache_columns(self, file_path):
         """读取文件并缓存列名"""
         try:
-            file_ext = os.path.splitext(file_path)[1].lower()
-
-            if file_ext in ['.xlsx', '.et']:
-                # 对于Excel文件，只读取第一行来提高性能
-                wb = load_workbook(file_path, read_only=True)
-                ws = wb.active
-                # 只读取第一行
-                header_row = next(ws.iter_rows(max_row=1))
-                headers = [str(cell.value) if cell.value is not None else "" for cell in header_row]
-                wb.close()
-            elif file_ext == '.xls':
-                # 对于XLS文件，只读取前几行
-                try:
-                    df = pd.read_excel(
-                        file_path,
-                        header=None,
-                        engine='xlrd',
-                        nrows=1,  # 只读取第一行
-                        dtype=str,
-                        keep_default_na=False
-                    )
-                except Exception:
-                    df = pd.read_excel(
-                        file_path,
-                        header=None,
-                        engine='openpyxl',
-                        nrows=1,  # 只读取第一行
-                        dtype=str,
-                        keep_default_na=False
-                    )
-                headers = df.iloc[0].tolist() if not df.empty else []
-            elif file_ext == '.csv':
-                # 对于CSV文件，只读取第一行
-                encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16']
-                headers = []
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(
-                            file_path,
-                            encoding=encoding,
-                            header=None,
-                            nrows=1,  # 只读取第一行
-                            dtype=str,
-                            keep_default_na=False
-                        )
-                        headers = df.iloc[0].tolist() if not df.empty else []
-                        break
-                    except Exception:
-                        continue
-            else:
-                # 对于其他格式，回退到原来的完整读取方法
-                df = self.read_table_file(file_path)
-                headers = df.iloc[0].tolist() if not df.empty else []
+            # 只读取第一行来提高性能
+            headers = self.read_header_row(file_path)
 
             # 过滤空表头
             headers = [h for h in headers if str(h).strip()]
@@ -1450,6 +1308,8 @@ class ExcelMergerSplitterApp:
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取 xlsx 时的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ExcelMergerSplitterApp(root)
     root.mainloop()
@@ -2,13 +2,26 @@ import sys
 import time
 import traceback
 import logging
+import numpy as np
 import pandas as pd
 import re
 import gc
 from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import QThread, pyqtSignal
-from data_handler import read_excel_fast, read_mapping_table
-from rule_handler import read_enum_mapping, read_erp_combo_map
+from excel_reader.data_handler import (read_excel_fast, read_mapping_table, sheet_size, suggest_chunk_size,
+                                       parse_typed_column, unparsed_column, restore_unparsed)
+from excel_reader.sheet_cache import should_cache
+from rule_handler import read_enum_mapping, read_erp_combo_map, build_projection, build_column_types
+
+
+# 各阶段结束时的进度百分比（读取两表 / 分批比较，之后为生成日志和汇总）
+READ_PROGRESS = 40
+BATCH_PROGRESS = 90
+
+# 日期比较精度：按年/月比较时整数键 YYYYMMDD 去掉的位数，其余精度按日比较
+DATE_KEY_DIVISORS = {"年": 10000, "月": 100}
+# 无法解析的日期原文本按精度截取的长度（对应 YYYY-MM-DD HH:MM:SS 的前缀）
+DATE_TEXT_LENGTHS = {"年": 4, "月": 7, "日": 10, "时": 13, "分": 16, "秒": 19}
 
 
 class CompareWorker(QThread):
@@ -17,7 +30,7 @@ class CompareWorker(QThread):
     progress_signal = pyqtSignal(int)  # 用于更新进度条
 
     def __init__(self, file1, file2, rule_file, sheet_name1, sheet_name2,
-                 primary_keys=None, rules=None, skip_rows=0, chunk_size=5000):
+                 primary_keys=None, rules=None, skip_rows=0, chunk_size=None):
         super().__init__()
         self.file1 = file1
         self.file2 = file2
@@ -27,7 +40,7 @@ class CompareWorker(QThread):
         self.primary_keys = primary_keys if primary_keys else []
         self.rules = rules if rules else {}
         self.skip_rows = skip_rows
-        self.chunk_size = chunk_size  # 减小分块大小以节省内存
+        self.chunk_size = chunk_size  # None 表示按页签规模自动确定
 
         # 结果存储
         self.missing_assets = []
@@ -36,6 +49,11 @@ class CompareWorker(QThread):
         self.missing_rows = []
         self.extra_in_file2 = []
         self.diff_full_rows = []
+        # 规则投影：只读取/入库规则用到的列
+        self.usecols1, self.usecols2 = build_projection(self.rules)
+        self.usecols1.update(self.primary_keys)
+        # 规则中的数值/日期列读取时即解析成 float64/datetime64，比对时不再逐批转换
+        self.types1, self.types2 = build_column_types(self.rules, self.primary_keys)
         self.enum_map = read_enum_mapping(rule_file)
         self.erp_combo_map = read_erp_combo_map(rule_file)
         self.asset_code_to_original = {}  # 资产分类编码到原始值的映射
@@ -60,7 +78,7 @@ class CompareWorker(QThread):
                 length = int(length_str.strip(']').strip())
                 if field not in df.columns:
                     raise Exception(f"字段不存在：{field}")
-                return df[field].fillna('').astype(str).str[:length]
+                return df[field].astype(object).fillna('').astype(str).str[:length]
 
             # 根据数据类型处理不同运算
             if data_type == "文本":
@@ -69,9 +87,9 @@ class CompareWorker(QThread):
                 if missing_fields:
                     raise Exception(f"表达式中包含不存在的字段：{missing_fields}")
 
-                result = df[fields[0]].fillna('').astype(str)
+                result = df[fields[0]].astype(object).fillna('').astype(str)
                 for field in fields[1:]:
-                    result += df[field].fillna('').astype(str)
+                    result += df[field].astype(object).fillna('').astype(str)
                 return result
 
             elif data_type == "数值":
@@ -226,6 +244,40 @@ class CompareWorker(QThread):
 
         return val1 == val2
 
+    @staticmethod
+    def _is_text_series(series):
+        """字典编码列，或只含字符串/空值的列"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return True
+        return pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty')
+
+    def _pairwise_equal(self, series1, series2, field, equal_func):
+        """
+        逐行判断两列是否相等，但每种 (值1, 值2) 组合只调用一次 equal_func
+        字典编码（Categorical）列直接用整数编码组合，百万行通常只剩几百种组合
+        含非字符串值的列（1 与 1.0 哈希相同、文本化结果不同）仍逐行比较
+        """
+        if not (self._is_text_series(series1) and self._is_text_series(series2)):
+            return pd.Series([
+                equal_func(self.normalize_value(s1).strip(), self.normalize_value(s2).strip(), field)
+                for s1, s2 in zip(series1, series2)
+            ], index=series1.index, dtype=bool)
+
+        codes1, uniques1 = pd.factorize(series1)
+        codes2, uniques2 = pd.factorize(series2)
+        # 空值编码为 -1，统一平移到 0
+        pair_codes = (codes1.astype(np.int64) + 1) * (len(uniques2) + 1) + (codes2 + 1)
+        unique_pairs, inverse = np.unique(pair_codes, return_inverse=True)
+
+        values1 = [None] + list(uniques1)
+        values2 = [None] + list(uniques2)
+        results = np.empty(len(unique_pairs), dtype=bool)
+        for i, pair in enumerate(unique_pairs):
+            v1 = values1[pair // (len(uniques2) + 1)]
+            v2 = values2[pair % (len(uniques2) + 1)]
+            results[i] = equal_func(self.normalize_value(v1).strip(), self.normalize_value(v2).strip(), field)
+        return pd.Series(results[inverse.ravel()], index=series1.index)
+
     def convert_asset_category(self, df1, mapping_df):
         """资产分类转换逻辑 - 使用merge优化"""
         asset_category_col1 = "资产分类"
@@ -289,6 +341,41 @@ class CompareWorker(QThread):
 
         return df1
 
+    @staticmethod
+    def _typed_pair(batch, field, series, data_type):
+        """取读取时已解析的类型列及其侧列；未在读取时解析的列（如计算字段）在这里解析"""
+        side = unparsed_column(field)
+        if side in batch.columns:
+            return series, batch[side]
+        return parse_typed_column(series, data_type)
+
+    @staticmethod
+    def _date_keys(dates, unparsed, tail_diff):
+        """
+        日期列 -> 按精度比较的键：已解析的为整数 YYYYMMDD（按年/月截短），
+        无法解析的为按精度截取的原文本，空值为 ''
+        """
+        number = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day) // DATE_KEY_DIVISORS.get(tail_diff, 1)
+        keys = number.astype(object).where(dates.notna(), '')
+        invalid = unparsed.notna()
+        if invalid.any():
+            text = unparsed[invalid].astype(str).str.strip()
+            length = DATE_TEXT_LENGTHS.get(tail_diff)
+            keys[invalid] = text.str[:length] if length else text
+        return keys
+
+    def _display_value(self, batch, field, series, idx):
+        """差异明细中显示的值：无法解析的单元格显示原值，整数值不带 .0，零点的日期只显示年月日"""
+        side = unparsed_column(field)
+        if side in batch.columns and pd.notna(batch[side].loc[idx]):
+            return self.normalize_value(batch[side].loc[idx])
+        val = series.loc[idx]
+        if isinstance(val, float) and val.is_integer():
+            val = int(val)
+        elif isinstance(val, pd.Timestamp) and val == val.normalize():
+            val = val.strftime('%Y-%m-%d')
+        return self.normalize_value(val)
+
     def _process_batch_comparison(self, df1_batch, df2_batch, batch_index, total_batches, df1_original, df2_original,
                                   pk_mapping):
         """处理单个批次的数据比较"""
@@ -319,9 +406,9 @@ class CompareWorker(QThread):
                     series2 = df2_batch[field1]
 
                 if data_type == "数值":
-                    # 数值型比较
-                    series1_num = pd.to_numeric(series1, errors='coerce')
-                    series2_num = pd.to_numeric(series2, errors='coerce')
+                    # 数值型比较（读取时已解析成 float64）
+                    series1_num, _ = self._typed_pair(df1_batch, field1, series1, data_type)
+                    series2_num, _ = self._typed_pair(df2_batch, field1, series2, data_type)
                     # 如果字段名包含"折旧"，取绝对值
                     if "折旧" in field1:
                         series1_num = series1_num.abs()
@@ -334,63 +421,21 @@ class CompareWorker(QThread):
                                     ~(pd.isna(series1_num) & pd.isna(series2_num))
 
                 elif data_type == "日期":
-                    # 日期型比较
-                    # 日期型比较：先统一解析为标准日期格式
-                    def parse_date(date_str):
-                        """尝试多种格式解析日期，返回标准化字符串（YYYY-MM-DD）"""
-                        if pd.isna(date_str):
-                            return ""
-                        date_str = str(date_str).strip()
-                        if not date_str:
-                            return ""
-                        # 尝试多种常见日期格式
-                        formats = ['%Y-%m-%d', '%Y/%m/%d', '%Y年%m月%d日',
-                                   '%m-%d-%Y', '%m/%d/%Y', '%Y%m%d', '%Y-%m-%d %H:%M:%S']
-                        for fmt in formats:
-                            try:
-                                return pd.to_datetime(date_str, format=fmt).strftime('%Y-%m-%d')
-                            except (ValueError, TypeError):
-                                continue
-                        # 如果所有格式都解析失败，返回原始字符串
-                        return date_str
-
-                    # 统一解析两列日期
-                    series1_parsed = series1.apply(parse_date)
-                    series2_parsed = series2.apply(parse_date)
+                    # 日期型比较（读取时已解析成 datetime64），按精度生成比较键
+                    series1_key = self._date_keys(*self._typed_pair(df1_batch, field1, series1, data_type),
+                                                  tail_diff)
+                    series2_key = self._date_keys(*self._typed_pair(df2_batch, field1, series2, data_type),
+                                                  tail_diff)
 
                     # 处理空值情况
-                    both_empty = (series1_parsed == "") & (series2_parsed == "")
-
-                    # 根据精度需求截取
-                    if tail_diff == "月":
-                        series1_cmp = series1_parsed.str[:7]  # YYYY-MM
-                        series2_cmp = series2_parsed.str[:7]
-                    elif tail_diff == "年":
-                        series1_cmp = series1_parsed.str[:4]  # YYYY
-                        series2_cmp = series2_parsed.str[:4]
-                    elif tail_diff == "日":
-                        series1_cmp = series1_parsed.str[:10]
-                        series2_cmp = series2_parsed.str[:10]  # 取年月日（YYYY-MM-DD）
-                    elif tail_diff == "时":
-                        series1_cmp = series1_parsed.str[:13]
-                        series2_cmp = series2_parsed.str[:13]  # 取年月日时（YYYY-MM-DD HH）
-                    elif tail_diff == "分":
-                        series1_cmp = series1_parsed.str[:16]
-                        series2_cmp = series2_parsed.str[:16]  # 取年月日时分（YYYY-MM-DD HH:MM）
-                    elif tail_diff == "秒":
-                        series1_cmp = series1_parsed.str[:19]
-                        series2_cmp = series2_parsed.str[:19]
-
-                    diff_mask = (series1_cmp != series2_cmp) & ~both_empty
+                    both_empty = (series1_key == "") & (series2_key == "")
+                    diff_mask = (series1_key != series2_key) & ~both_empty
 
                 elif data_type == "文本":
                     def mapped_equal(a, b, field):
                         return self.values_equal_by_rule(a, b, "文本", None, field)
 
-                    diff_mask = ~pd.Series([
-                        mapped_equal(self.normalize_value(s1).strip(), self.normalize_value(s2).strip(), field1)
-                        for s1, s2 in zip(series1, series2)
-                    ], index=series1.index)
+                    diff_mask = ~self._pairwise_equal(series1, series2, field1, mapped_equal)
 
                 # 找出有差异的行索引
                 diff_indices = df1_batch[diff_mask].index
@@ -400,8 +445,8 @@ class CompareWorker(QThread):
                     if idx not in batch_diff_dict:
                         batch_diff_dict[idx] = []
 
-                    val1 = CompareWorker.normalize_value(series1.loc[idx])
-                    val2 = CompareWorker.normalize_value(series2.loc[idx])
+                    val1 = self._display_value(df1_batch, field1, series1, idx)
+                    val2 = self._display_value(df2_batch, field1, series2, idx)
                     if field1 == "资产分类":
                         val2 = self.normalize_value(default_series2.loc[idx])
                     batch_diff_dict[idx].append((field1, val1, val2))
@@ -468,23 +513,40 @@ class CompareWorker(QThread):
         try:
             self.log_signal.emit("正在读取Excel文件（分块模式）...")
             time0 = time.time()
+            # 页签规模（只读 <dimension>/行标签，不加载数据）：决定分块大小和读取进度
+            size1 = sheet_size(self.file1, self.sheet_name1)
+            size2 = sheet_size(self.file2, self.sheet_name2)
+            self.log_signal.emit(f"平台表约 {size1[0]} 行 × {size1[1]} 列，ERP表约 {size2[0]} 行 × {size2[1]} 列")
+            chunk1 = self.chunk_size or suggest_chunk_size(*size1, usecols=self.usecols1)
+            chunk2 = self.chunk_size or suggest_chunk_size(*size2, usecols=self.usecols2)
+
             # 读取文件（使用优化后的分块读取函数）
             df1 = read_excel_fast(
                 self.file1,
                 self.sheet_name1,
                 is_file1=True,
-                chunk_size=self.chunk_size
+                chunk_size=chunk1,
+                usecols=self.usecols1,
+                use_cache=should_cache(self.file1, True),
+                categorical=True,
+                column_types=self.types1
             )
             self.log_signal.emit(f"✅ 平台表读取完成，共 {len(df1)} 行数据")
+            self.progress_signal.emit(READ_PROGRESS * size1[0] // max(size1[0] + size2[0], 1))
 
             df2 = read_excel_fast(
                 self.file2,
                 self.sheet_name2,
                 is_file1=False,
                 skip_rows=self.skip_rows,
-                chunk_size=self.chunk_size
+                chunk_size=chunk2,
+                usecols=self.usecols2,
+                use_cache=should_cache(self.file2, False),
+                categorical=True,
+                column_types=self.types2
             )
             self.log_signal.emit(f"✅ ERP表读取完成，共 {len(df2)} 行数据")
+            self.progress_signal.emit(READ_PROGRESS)
 
             self.log_signal.emit("开始比较数据...")
             # 读取资产分类映射表
@@ -556,6 +618,8 @@ class CompareWorker(QThread):
                     mapped_columns[calc_temp_fields[field1]] = field1
                 elif field2 in df2.columns:
                     mapped_columns[field2] = field1
+                    if unparsed_column(field2) in df2.columns:
+                        mapped_columns[unparsed_column(field2)] = unparsed_column(field1)
 
             mapped_log = "\n".join([f"  {k} -> {v}" for k, v in mapped_columns.items()])
             self.log_signal.emit(f"字段映射关系：\n{mapped_log}")
@@ -570,8 +634,10 @@ class CompareWorker(QThread):
 
             # 只保留需要比对的列，减少内存占用
             all_needed_columns = list(set(table1_columns_to_compare + self.primary_keys))
-            df1 = df1[all_needed_columns].copy()
-            df2 = df2[all_needed_columns].copy()
+            # 类型列的侧列（无法解析的原值）随比对列一起保留
+            side_columns = [unparsed_column(c) for c in table1_columns_to_compare]
+            df1 = df1[all_needed_columns + [c for c in side_columns if c in df1.columns]].copy()
+            df2 = df2[all_needed_columns + [c for c in side_columns if c in df2.columns]].copy()
             gc.collect()
 
             # 主键检查
@@ -629,8 +695,8 @@ class CompareWorker(QThread):
                     self.log_signal.emit(f"⚠️ 警告：ERP表中主键列 '{pk}' 存在 {len(df2_empty_keys)} 条空值记录")
 
             # 保存原始数据帧用于导出（包含主键列）
-            df1_original = df1.copy()
-            df2_original = df2.copy()
+            df1_original = restore_unparsed(df1.copy())
+            df2_original = restore_unparsed(df2.copy())
 
             # 设置主键索引
             df1.set_index(self.primary_keys, inplace=True)
@@ -661,7 +727,7 @@ class CompareWorker(QThread):
             # 查找ERP表中缺失的主键
             missing_in_file2 = df1.index.difference(df2.index)
             if not missing_in_file2.empty:
-                missing_df = df1.loc[missing_in_file2].copy()
+                missing_df = restore_unparsed(df1.loc[missing_in_file2].copy())
                 original_codes = missing_in_file2.map(lambda x: ' + '.join(map(str, x)))
                 missing_df.reset_index(drop=True, inplace=True)
 
@@ -675,7 +741,7 @@ class CompareWorker(QThread):
             # 查找ERP表中多出的主键
             missing_in_file1 = df2.index.difference(df1.index)
             if not missing_in_file1.empty:
-                missing_df_file1 = df2.loc[missing_in_file1].copy()
+                missing_df_file1 = restore_unparsed(df2.loc[missing_in_file1].copy())
                 original_codes_file1 = missing_in_file1.map(lambda x: ' + '.join(map(str, x)))
                 missing_df_file1.reset_index(drop=True, inplace=True)
 
@@ -736,6 +802,9 @@ class CompareWorker(QThread):
                     del df1_batch, df2_batch, batch_diff_dict, batch_diff_full_rows
                     gc.collect()
 
+                    self.progress_signal.emit(
+                        READ_PROGRESS + (BATCH_PROGRESS - READ_PROGRESS) * (batch_idx + 1) // total_batches)
+
                     # 每处理10批报告一次进度
                     if (batch_idx + 1) % 10 == 0 or batch_idx == total_batches - 1:
                         self.log_signal.emit(
@@ -813,6 +882,7 @@ class CompareWorker(QThread):
                     self.log_signal.emit("⚠️ 未找到具体差异列，请检查数据是否一致。")
 
             time1 = time.time()
+            self.progress_signal.emit(100)
             self.log_signal.emit(f"对比完成，总耗时{time1 - time0:.1f}s")
 
         except Exception as e:
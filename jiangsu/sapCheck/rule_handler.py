@@ -1,6 +1,8 @@
 # rule_handler.py
+import re
 import pandas as pd
 from openpyxl import load_workbook
+from excel_reader.data_handler import sanitize_column_name
 
 def read_rules(file_path):
     """读取规则文件，返回规则字典"""
@@ -52,4 +54,71 @@ def read_erp_combo_map(rule_file):
     grouped = df.groupby('平台实物管理系统代码')['江苏ERP系统PM卡片ABC标识'] \
         .apply(lambda x: set(v for s in x for v in s.split('|'))) \
         .to_dict()
-    return grouped
\ No newline at end of file
+    return grouped
+
+
+# ERP表中不在规则里、但比对时会用到的辅助列
+ERP_EXTRA_COLUMNS = ('资产明细类别', '原21版资产分类')
+
+_CALC_FIELD_RE = re.compile(r'[a-zA-Z\u4e00-\u9fa5][a-zA-Z\u4e00-\u9fa50-9_]*')
+
+
+def _calc_rule_fields(calc_rule):
+    """提取计算规则中引用的字段名（截取、拼接、四则运算）"""
+    expr = str(calc_rule).split('[:')[0]
+    fields = {f.strip() for f in expr.split('+') if f.strip()}
+    fields.update(_CALC_FIELD_RE.findall(expr))
+    return fields
+
+
+def build_projection(rules):
+    """
+    根据比对规则计算两张表实际需要读取的列（列投影）
+    返回 (平台表列名集合, ERP表列名集合)
+    """
+    table1_cols = set(rules.keys())
+    table2_cols = set(ERP_EXTRA_COLUMNS)
+    for field_name, rule in rules.items():
+        table2_cols.add(field_name)
+        if rule.get("table2_field"):
+            table2_cols.add(str(rule["table2_field"]))
+        if rule.get("calc_rule"):
+            table2_cols.update(_calc_rule_fields(rule["calc_rule"]))
+    return table1_cols, table2_cols
+
+
+# 读取时直接解析的规则数据类型（文本列保持原值）
+TYPED_DATA_TYPES = ('数值', '日期')
+
+
+def build_column_types(rules, primary_keys=()):
+    """
+    根据比对规则确定读取时按类型解析的列
+    返回 (平台表 {列名: 数据类型}, ERP表 {列名: 数据类型})，列名为 sanitize_column_name 规整后的形式
+    （规则字段名是入库列名形式，表头是原始形式，两边规整后才能对上）
+    两表的主键列和计算规则引用的列保持原值：主键按文本匹配，计算规则可能截取/拼接原文本
+    """
+    keep_raw = {str(pk) for pk in primary_keys}
+    for rule in rules.values():
+        if rule.get("is_primary") and rule.get("table2_field"):
+            keep_raw.add(str(rule["table2_field"]))
+        if rule.get("calc_rule"):
+            keep_raw.update(_calc_rule_fields(rule["calc_rule"]))
+    keep_raw = {sanitize_column_name(col) for col in keep_raw}
+
+    table1_types, table2_types, conflicts = {}, {}, set()
+    for field_name, rule in rules.items():
+        data_type = rule.get("data_type")
+        if data_type not in TYPED_DATA_TYPES:
+            continue
+        field_name = sanitize_column_name(field_name)
+        if field_name not in keep_raw:
+            table1_types[field_name] = data_type
+        table2_field = rule.get("table2_field")
+        if table2_field and not rule.get("calc_rule"):
+            table2_field = sanitize_column_name(table2_field)
+            if table2_types.setdefault(table2_field, data_type) != data_type:
+                conflicts.add(table2_field)  # 同一列被当作不同类型比对时保持原值
+    for col in keep_raw | conflicts:
+        table2_types.pop(col, None)
+    return table1_types, table2_types
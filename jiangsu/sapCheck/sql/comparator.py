@@ -6,22 +6,28 @@ import pandas as pd
 import re
 import gc
 from PyQt5.QtCore import QThread, pyqtSignal
-from rule_handler import read_enum_mapping, read_erp_combo_map
+from rule_handler import read_enum_mapping, read_erp_combo_map, build_projection, build_column_types
+from excel_reader.data_handler import sheet_size, suggest_chunk_size, sanitize_column_name
 from db_handler import (
     init_database, import_excel_to_db, execute_query, drop_tables,
-    create_compare_index, fetch_rows_by_pk, prepare_asset_category_mapping, _load_asset_category_mapping
+    create_compare_index, fetch_rows_by_pk, prepare_asset_category_mapping, _load_asset_category_mapping,
+    reset_stage_stats, record_stage, stage_report
 )
 
 TEMP_TABLE1 = 'temp_table1'
 TEMP_TABLE2 = 'temp_table2'
 
+# 各阶段结束时的进度百分比（导入 / 主键比对，之后为字段比对和差异日志输出）
+IMPORT_PROGRESS = 60
+KEY_DIFF_PROGRESS = 70
+
 
 class CompareWorker(QThread):
     log_signal = pyqtSignal(str)
     progress_signal = pyqtSignal(int)
 
     def __init__(self, file1, file2, rule_file, sheet_name1, sheet_name2,
-                 primary_keys=None, rules=None, skip_rows=0, chunk_size=5000):
+                 primary_keys=None, rules=None, skip_rows=0, chunk_size=None):
         super().__init__()
         self.file1 = file1
         self.file2 = file2
@@ -31,7 +37,7 @@ class CompareWorker(QThread):
         self.primary_keys = primary_keys if primary_keys else []
         self.rules = rules if rules else {}
         self.skip_rows = skip_rows
-        self.chunk_size = chunk_size
+        self.chunk_size = chunk_size  # None 表示按页签规模自动确定
 
         self.missing_assets = []
         self.diff_records = []
@@ -39,6 +45,11 @@ class CompareWorker(QThread):
         self.missing_rows = []
         self.extra_in_file2 = []
         self.diff_full_rows = []
+        # 规则投影：只读取/入库规则用到的列
+        self.usecols1, self.usecols2 = build_projection(self.rules)
+        self.usecols1.update(self.primary_keys)
+        # 规则中的数值/日期列读取时即解析，入库的是统一格式的文本
+        self.types1, self.types2 = build_column_types(self.rules, self.primary_keys)
         self.enum_map = read_enum_mapping(rule_file)
         self.erp_combo_map = read_erp_combo_map(rule_file)
         self.asset_code_to_original = {}
@@ -344,8 +355,13 @@ class CompareWorker(QThread):
                 diff_conditions.append(condition)
 
             elif data_type == "日期":
-                # 统一日期格式进行比较
-                condition = f"NOT (IFNULL({src_field}, '') = '' AND IFNULL({tgt_field}, '') = '') AND DATE_FORMAT(STR_TO_DATE(IFNULL({src_field}, ''), '%Y-%m-%d'), '%Y-%m-%d') != DATE_FORMAT(STR_TO_DATE(IFNULL({tgt_field}, ''), '%Y-%m-%d'), '%Y-%m-%d')"
+                table2_field = rule.get("table2_field", field_name)
+                if sanitize_column_name(field_name) in self.types1 and sanitize_column_name(table2_field) in self.types2:
+                    # 两边入库时已统一为 YYYY-MM-DD（无法解析的保留原文本），直接比较
+                    condition = f"NOT (IFNULL({src_field}, '') = '' AND IFNULL({tgt_field}, '') = '') AND IFNULL({src_field}, '') != IFNULL({tgt_field}, '')"
+                else:
+                    # 统一日期格式进行比较
+                    condition = f"NOT (IFNULL({src_field}, '') = '' AND IFNULL({tgt_field}, '') = '') AND DATE_FORMAT(STR_TO_DATE(IFNULL({src_field}, ''), '%Y-%m-%d'), '%Y-%m-%d') != DATE_FORMAT(STR_TO_DATE(IFNULL({tgt_field}, ''), '%Y-%m-%d'), '%Y-%m-%d')"
                 diff_conditions.append(condition)
 
             elif data_type == "文本":
@@ -474,40 +490,69 @@ class CompareWorker(QThread):
             if not init_database():
                 self.log_signal.emit("❌ 数据库初始化失败")
                 return
+            reset_stage_stats()
+
+            # 0. 页签规模（只读 <dimension>/行标签，不加载数据）：决定分块大小和导入进度
+            size1 = sheet_size(self.file1, self.sheet_name1)
+            size2 = sheet_size(self.file2, self.sheet_name2)
+            self.log_signal.emit(f"平台表约 {size1[0]} 行 × {size1[1]} 列，ERP表约 {size2[0]} 行 × {size2[1]} 列")
+            chunk1 = self.chunk_size or suggest_chunk_size(*size1, usecols=self.usecols1)
+            chunk2 = self.chunk_size or suggest_chunk_size(*size2, usecols=self.usecols2)
+
+            # 导入阶段占总进度的 IMPORT_PROGRESS%
+            expected_rows = max(size1[0] + size2[0], 1)
+            imported = {}
+
+            def on_import_progress(table_name, rows):
+                imported[table_name] = rows
+                self.progress_signal.emit(min(IMPORT_PROGRESS, IMPORT_PROGRESS * sum(imported.values()) // expected_rows))
 
             # 1. 导入数据
             rows1 = import_excel_to_db(
                 self.file1, self.sheet_name1, TEMP_TABLE1,
-                is_file1=True, chunk_size=self.chunk_size
+                is_file1=True, chunk_size=chunk1,
+                usecols=self.usecols1, progress=on_import_progress, column_types=self.types1
             )
             self.log_signal.emit(f"✅ 平台表导入完成，共 {rows1} 行")
 
             rows2 = import_excel_to_db(
                 self.file2, self.sheet_name2, TEMP_TABLE2,
-                is_file1=False, skip_rows=self.skip_rows, chunk_size=self.chunk_size
+                is_file1=False, skip_rows=self.skip_rows, chunk_size=chunk2,
+                usecols=self.usecols2, progress=on_import_progress, column_types=self.types2
             )
+            self.progress_signal.emit(IMPORT_PROGRESS)
             self.log_signal.emit(f"✅ ERP表导入完成，共 {rows2} 行")
+            self.log_signal.emit(f"⏱️ {stage_report('入库')}")
 
             # 预先准备资产分类映射表数据
             mapping_prepared = prepare_asset_category_mapping(self.rules, self.rule_file)
             if mapping_prepared:
                 self.log_signal.emit("✅ 资产分类映射表准备完成")
 
-            # 2. 建索引
-            create_compare_index(TEMP_TABLE1, ["_pk_concat"])
-            create_compare_index(TEMP_TABLE2, ["_pk_concat"])
-
-            # 3. 生成 _pk_concat
+            # 2. 生成 _pk_concat
+            start = time.time()
             expr1 = self._build_pk_expr("t1", is_file1=True)
             expr2 = self._build_pk_expr("t2", is_file1=False)
             self._add_concat_pk_column(TEMP_TABLE1, expr1)
             self._add_concat_pk_column(TEMP_TABLE2, expr2)
+            record_stage("生成主键", rows1 + rows2, time.time() - start)
+            self.log_signal.emit(f"⏱️ {stage_report('生成主键')}")
+
+            # 3. 建索引：入库和 _pk_concat 填充完成后一次建成
+            start = time.time()
+            create_compare_index(TEMP_TABLE1, ["_pk_concat"])
+            create_compare_index(TEMP_TABLE2, ["_pk_concat"])
+            record_stage("建索引", rows1 + rows2, time.time() - start)
+            self.log_signal.emit(f"⏱️ {stage_report('建索引')}")
 
             # 4. 为表二添加计算字段
             self._add_calculated_fields(TEMP_TABLE2, is_file1=False)
 
             # 5. SQL 计算共同/缺失/多余
+            start = time.time()
             diff_df = self._diff_by_mysql()
+            record_stage("主键比对", rows1 + rows2, time.time() - start)
+            self.log_signal.emit(f"⏱️ {stage_report('主键比对')}")
             common_str = diff_df.at[0, 'common_keys'] or ''
             missing_str = diff_df.at[0, 'missing_keys'] or ''
             extra_str = diff_df.at[0, 'extra_keys'] or ''
@@ -516,6 +561,8 @@ class CompareWorker(QThread):
             missing_in_file2 = set(missing_str.split('||')) if missing_str else set()
             missing_in_file1 = set(extra_str.split('||')) if extra_str else set()
 
+            self.progress_signal.emit(KEY_DIFF_PROGRESS)
+
             # 6. 拉取缺失/多余行
             if missing_in_file2:
                 self.missing_rows = fetch_rows_by_pk(
@@ -550,8 +597,11 @@ class CompareWorker(QThread):
                 return
 
             # 7. 在数据库中进行字段差异比对
+            start = time.time()
             diff_full_rows = self._compare_fields_in_db(common_codes)
             diff_count = len(diff_full_rows)
+            record_stage("字段比对", len(common_codes), time.time() - start)
+            self.log_signal.emit(f"⏱️ {stage_report('字段比对')}")
 
             # 8. 构建结果摘要
             equal_count = len(common_codes) - diff_count
@@ -709,6 +759,7 @@ class CompareWorker(QThread):
                     self.log_signal.emit(f"  ... 还有 {diff_count - 10} 条差异记录未显示")
 
             time1 = time.time()
+            self.progress_signal.emit(100)
             self.log_signal.emit(f"✅ 对比完成，总耗时{time1 - time0:.1f}s")
 
         except Exception as e:
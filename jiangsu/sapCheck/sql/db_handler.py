@@ -1,18 +1,93 @@
 # db_handler.py
 import mysql.connector
+from mysql.connector import pooling
+import numpy as np
 import pandas as pd
-import re
-from data_handler import read_excel_fast
+import os
+import time
+import tempfile
+from contextlib import contextmanager
+from excel_reader.data_handler import iter_excel_chunks, sanitize_column_name, UNPARSED_PREFIX
+from excel_reader.sheet_cache import should_cache
 
 # ------------------ 数据库配置 ------------------
+# 连接参数可用环境变量覆盖，便于指向共享的 MySQL 实例或本地容器
 DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'qwer.1234',
-    'database': 'excel_compare',
+    'host': os.environ.get('EXCEL_COMPARE_MYSQL_HOST', 'localhost'),
+    'port': int(os.environ.get('EXCEL_COMPARE_MYSQL_PORT', '3306')),
+    'user': os.environ.get('EXCEL_COMPARE_MYSQL_USER', 'root'),
+    'password': os.environ.get('EXCEL_COMPARE_MYSQL_PASSWORD', 'qwer.1234'),
+    'database': os.environ.get('EXCEL_COMPARE_MYSQL_DATABASE', 'excel_compare'),
     'charset': 'utf8mb4'
 }
 
+# 连接池大小（mysql.connector 上限 32）
+POOL_SIZE = int(os.environ.get('EXCEL_COMPARE_MYSQL_POOL_SIZE', '4'))
+
+# 批量入库方式：
+#   infile  每块写成临时 CSV，用 LOAD DATA LOCAL INFILE 导入（服务端需开启 local_infile，失败时自动改用 insert）
+#   insert  多行 INSERT，每条语句 INSERT_BATCH_ROWS 行
+LOAD_MODE_INFILE = 'infile'
+LOAD_MODE_INSERT = 'insert'
+LOAD_MODE = os.environ.get('EXCEL_COMPARE_MYSQL_LOAD_MODE', LOAD_MODE_INFILE).strip().lower()
+# 每条 INSERT 语句的行数，受服务端 max_allowed_packet 限制
+INSERT_BATCH_ROWS = int(os.environ.get('EXCEL_COMPARE_MYSQL_INSERT_BATCH', '2000'))
+
+
+# =========================================================
+# 连接池
+# =========================================================
+_pool = None
+
+
+def _get_pool():
+    """首次使用时创建连接池（库需已存在，见 init_database）"""
+    global _pool
+    if _pool is None:
+        _pool = pooling.MySQLConnectionPool(
+            pool_name='excel_compare',
+            pool_size=POOL_SIZE,
+            allow_local_infile=True,
+            **DB_CONFIG
+        )
+    return _pool
+
+
+@contextmanager
+def get_connection(autocommit=False):
+    """从连接池取一个连接，用完归还（close 即归还，不断开）"""
+    conn = _get_pool().get_connection()
+    try:
+        conn.autocommit = autocommit
+        yield conn
+    finally:
+        conn.close()
+
+
+# =========================================================
+# 分阶段计时
+# =========================================================
+# 阶段名 -> [行数, 耗时秒]
+STAGE_STATS = {}
+
+
+def reset_stage_stats():
+    STAGE_STATS.clear()
+
+
+def record_stage(stage, rows, seconds):
+    """累计某一阶段处理的行数与耗时"""
+    stats = STAGE_STATS.setdefault(stage, [0, 0.0])
+    stats[0] += rows
+    stats[1] += seconds
+
+
+def stage_report(stage):
+    """某一阶段的速度说明：N 行，耗时 X 秒（Y 行/秒）"""
+    rows, seconds = STAGE_STATS.get(stage, (0, 0.0))
+    rate = rows / seconds if seconds else 0.0
+    return f"{stage} {rows} 行，耗时 {seconds:.2f} 秒（{rate:,.0f} 行/秒）"
+
 
 # =========================================================
 # 基础初始化
@@ -20,8 +95,10 @@ DB_CONFIG = {
 def init_database():
     """创建库、删旧表"""
     try:
+        # 库可能还不存在，这里不经过连接池
         conn = mysql.connector.connect(
             host=DB_CONFIG['host'],
+            port=DB_CONFIG['port'],
             user=DB_CONFIG['user'],
             password=DB_CONFIG['password']
         )
@@ -38,45 +115,52 @@ def init_database():
         return False
 
 
-def sanitize_column_name(col_name):
-    """把任意列名变成合法 MySQL 列名"""
-    clean = re.sub(r'[^\w]', '_', str(col_name))
-    if clean and clean[0].isdigit():
-        clean = 'col_' + clean
-    return clean[:64] or 'unnamed_column'
-
-
 # =========================================================
 # 表与数据导入
 # =========================================================
-def import_excel_to_db(file_path, sheet_name, table_name, is_file1=True, skip_rows=0, chunk_size=5000):
-    """把 Excel 分块写入 MySQL"""
+def import_excel_to_db(file_path, sheet_name, table_name, is_file1=True, skip_rows=0, chunk_size=5000,
+                       usecols=None, progress=None, column_types=None):
+    """
+    把 Excel 分块写入 MySQL
+    usecols: 规则投影列集合，只入库这些列（外加原始行号 _row_no）
+    column_types: {规整列名: '数值'/'日期'}，这些列读取时即完成解析，入库时直接格式化
+    progress: 每写入一块后回调 progress(table_name, 已写入行数)
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(f"USE {DB_CONFIG['database']}")
-
-        df = read_excel_fast(file_path, sheet_name, is_file1=is_file1,
-                             skip_rows=skip_rows, chunk_size=chunk_size)
-
-        if df.empty:
-            conn.close()
-            return 0
-
-        df.columns = [sanitize_column_name(c) for c in df.columns]
-
-        # 建表
-        create_sql = _generate_create_table_sql(df, table_name)
-        cursor.execute(create_sql)
-
-        # 分块插入
-        total_rows = len(df)
-        for start in range(0, total_rows, chunk_size):
-            chunk = df.iloc[start:start + chunk_size]
-            _insert_data(cursor, table_name, chunk)
-            conn.commit()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            load_mode = LOAD_MODE
+
+            # 流式读取：每读到一块就写入，整表不在内存中驻留
+            total_rows = 0
+            table_created = False
+            for chunk in iter_excel_chunks(file_path, sheet_name, is_file1=is_file1,
+                                           skip_rows=skip_rows, chunk_size=chunk_size,
+                                           usecols=usecols, with_row_no=True,
+                                           use_cache=should_cache(file_path, is_file1),
+                                           categorical=True, column_types=column_types):
+                if chunk.empty:
+                    continue
+                # 类型列的侧列不单独入库：无法解析的原值在入库时填回类型列
+                unparsed = {sanitize_column_name(c[len(UNPARSED_PREFIX):]): chunk.pop(c)
+                            for c in list(chunk.columns) if str(c).startswith(UNPARSED_PREFIX)}
+                chunk.columns = [sanitize_column_name(c) for c in chunk.columns]
+
+                # 建表（只有自增主键，比对用的 _pk_concat 索引在入库完成后再建）
+                if not table_created:
+                    create_sql = _generate_create_table_sql(chunk, table_name)
+                    cursor.execute(create_sql)
+                    table_created = True
+
+                # 分块写入，计时只算写库部分，不含 Excel 解析
+                start = time.time()
+                load_mode = _insert_data(cursor, table_name, chunk, unparsed, load_mode)
+                conn.commit()
+                record_stage("入库", len(chunk), time.time() - start)
+                total_rows += len(chunk)
+                if progress:
+                    progress(table_name, total_rows)
 
-        conn.close()
         return total_rows
     except Exception as e:
         raise Exception(f"导入Excel到数据库失败: {str(e)}")
@@ -90,44 +174,28 @@ def prepare_asset_category_mapping(rules, rule_file):
     if not has_asset_category:
         return False
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(f"USE {DB_CONFIG['database']}")
-        conn.autocommit = True
         # 加载资产分类映射表
         mapping_df = _load_asset_category_mapping(rule_file)
         if mapping_df.empty or '同源目录完整名称' not in mapping_df.columns or '同源目录编码' not in mapping_df.columns:
             return False
-        # 创建临时映射表
-        create_mapping_table_sql = """
-              CREATE TABLE temp_mapping_table (
-                  `同源目录完整名称` VARCHAR(255),
-                  `同源目录编码` VARCHAR(50)
-              )
-              """
-        cursor.execute(create_mapping_table_sql)
-        # 批量插入映射数据
-        if not mapping_df.empty:
-            # 准备批量插入数据
+        with get_connection(autocommit=True) as conn:
+            cursor = conn.cursor()
+            # 创建临时映射表
+            create_mapping_table_sql = """
+                  CREATE TABLE temp_mapping_table (
+                      `同源目录完整名称` VARCHAR(255),
+                      `同源目录编码` VARCHAR(50)
+                  )
+                  """
+            cursor.execute(create_mapping_table_sql)
+            # 批量插入映射数据
             insert_data = []
             for _, row in mapping_df.iterrows():
                 try:
                     insert_data.append((str(row['同源目录完整名称']), str(row['同源目录编码'])))
                 except:
                     continue
-
-            if insert_data:
-                insert_sql = """
-                      INSERT INTO temp_mapping_table (`同源目录完整名称`, `同源目录编码`)
-                      VALUES (%s, %s)
-                      """
-                # 分批插入，避免数据量过大
-                batch_size = 1000
-                for i in range(0, len(insert_data), batch_size):
-                    batch = insert_data[i:i + batch_size]
-                    cursor.executemany(insert_sql, batch)
-                    conn.commit()
-        conn.close()
+            _insert_rows(cursor, 'temp_mapping_table', ['同源目录完整名称', '同源目录编码'], insert_data)
         return True
     except Exception as e:
         raise Exception(f"准备资产分类映射表时出错: {str(e)}")
@@ -154,38 +222,122 @@ def _generate_create_table_sql(df, table_name):
     return sql
 
 
-def _insert_data(cursor, table_name, df):
+def _to_db_value(value, take_abs):
+    """单元格值 -> 入库文本；take_abs 时数值取绝对值，转换失败保持原值"""
+    if pd.isna(value):
+        return None
+    if take_abs:
+        try:
+            return str(abs(float(value)))
+        except (ValueError, TypeError):
+            pass
+    return str(value)
+
+
+def _number_texts(values, take_abs):
+    """float64 数组 -> 入库文本：整数值不带 .0，空值为 None（整列向量化，不逐格 float()）"""
+    if take_abs:
+        values = np.abs(values)
+    finite = np.isfinite(values)
+    integral = finite & (values == np.trunc(values)) & (np.abs(values) < 1e15)
+    texts = values.astype(str).astype(object)
+    texts[integral] = values[integral].astype(np.int64).astype(str)
+    texts[~finite] = None
+    return texts
+
+
+def _date_texts(values):
+    """datetime64 数组 -> 入库文本 YYYY-MM-DD，空值为 None"""
+    texts = values.astype('datetime64[D]').astype(str).astype(object)
+    texts[np.isnat(values)] = None
+    return texts
+
+
+def _column_db_values(series, take_abs, unparsed=None):
+    """
+    整列转换成入库文本列表
+    读取时已解析的数值/日期列（带侧列 unparsed）整列格式化，无法解析的单元格取侧列中的原值；
+    字典编码列只转换字典里的每个不同值一次，再按编码展开
+    """
+    if unparsed is not None:
+        values = series.to_numpy()
+        if values.dtype.kind == 'M':
+            texts = _date_texts(values)
+        else:
+            texts = _number_texts(values.astype('float64'), take_abs)
+        invalid = unparsed.notna().to_numpy()
+        texts[invalid] = [str(v) for v in unparsed[invalid].tolist()]
+        return texts.tolist()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lookup = [_to_db_value(v, take_abs) for v in series.cat.categories] + [None]
+        return [lookup[code] for code in series.cat.codes.tolist()]  # 编码 -1 取到末尾的 None
+    return [_to_db_value(v, take_abs) for v in series.tolist()]
+
+
+def _insert_rows(cursor, table_name, columns, rows):
+    """多行 INSERT：每批 INSERT_BATCH_ROWS 行（executemany 会把一批改写成一条多行 INSERT 语句）"""
+    cols = ",".join(f"`{c}`" for c in columns)
+    placeholders = ",".join(["%s"] * len(columns))
+    sql = f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})"
+    batch_rows = max(INSERT_BATCH_ROWS, 1)
+    for i in range(0, len(rows), batch_rows):
+        cursor.executemany(sql, rows[i:i + batch_rows])
+
+
+def _csv_field(value):
+    """CSV 字段：空值写成不带引号的 NULL，其余加双引号、内部双引号成对转义"""
+    if value is None:
+        return 'NULL'
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _load_rows_infile(cursor, table_name, columns, rows):
+    """
+    LOAD DATA LOCAL INFILE：行写成临时 CSV 后整块导入
+    不设转义符（ESCAPED BY ''），值中的反斜杠（如监管资产属性的分隔符）按原样入库
+    """
+    fd, path = tempfile.mkstemp(prefix='excel_compare_', suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            for row in rows:
+                f.write(','.join(_csv_field(v) for v in row))
+                f.write('\n')
+        cols = ",".join(f"`{c}`" for c in columns)
+        local_path = path.replace('\\', '/').replace("'", "''")
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE '{local_path}' INTO TABLE `{table_name}` CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY ',' ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({cols})"
+        )
+    finally:
+        os.remove(path)
+
+
+def _insert_data(cursor, table_name, df, unparsed=None, load_mode=LOAD_MODE_INSERT):
+    """写入一块数据；返回后续块使用的入库方式（LOAD DATA 不可用时退回 insert）"""
     if df.empty:
-        return
-    cols = [f"`{c}`" for c in df.columns]
-    placeholders = ",".join(["%s"] * len(df.columns))
-    sql = f"INSERT INTO `{table_name}` ({','.join(cols)}) VALUES ({placeholders})"
+        return load_mode
 
     # 判断是否为表二
     is_table2 = table_name == 'temp_table2'
 
-    processed_data = []
-    for _, row in df.iterrows():
-        processed_row = []
-        for i, col_name in enumerate(df.columns):
-            value = row[col_name]
-            # 如果是表二且字段名包含"折旧"，则取绝对值
-            if is_table2 and "折旧" in col_name:
-                try:
-                    # 尝试将值转换为数值并取绝对值
-                    if pd.notna(value):
-                        numeric_value = float(value)
-                        processed_row.append(str(abs(numeric_value)))
-                    else:
-                        processed_row.append(None)
-                except (ValueError, TypeError):
-                    # 如果转换失败，保持原始值
-                    processed_row.append(str(value) if pd.notna(value) else None)
-            else:
-                processed_row.append(str(value) if pd.notna(value) else None)
-        processed_data.append(tuple(processed_row))
+    # 按列转换（表二中字段名包含"折旧"的列取绝对值），再拼回行
+    unparsed = unparsed or {}
+    columns = [_column_db_values(df[col_name], is_table2 and "折旧" in col_name, unparsed.get(col_name))
+               for col_name in df.columns]
+    processed_data = list(zip(*columns))
 
-    cursor.executemany(sql, processed_data)
+    if load_mode == LOAD_MODE_INFILE:
+        try:
+            _load_rows_infile(cursor, table_name, df.columns, processed_data)
+            return load_mode
+        except mysql.connector.Error as e:
+            # 服务端或客户端未开启 local_infile（语句失败时整条回滚，本块没有写入），改用多行 INSERT
+            print(f"LOAD DATA LOCAL INFILE 不可用，改用批量 INSERT: {str(e)}")
+            load_mode = LOAD_MODE_INSERT
+
+    _insert_rows(cursor, table_name, df.columns, processed_data)
+    return load_mode
 
 
 # =========================================================
@@ -195,21 +347,18 @@ def _insert_data(cursor, table_name, df):
 def execute_query(query, params=None, executemany=False):
     """执行 SQL 并返回 DataFrame"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        conn.autocommit = True
-        cursor = conn.cursor()
-        if params:
-            if executemany:
-                cursor.executemany(query, params)
+        with get_connection(autocommit=True) as conn:
+            cursor = conn.cursor()
+            if params:
+                if executemany:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params)
             else:
-                cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        rows = cursor.fetchall()
-        df = pd.DataFrame(rows, columns=columns)
-        conn.close()
-        return df
+                cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            rows = cursor.fetchall() if cursor.description else []
+            return pd.DataFrame(rows, columns=columns)
     except Exception as e:
         raise Exception(f"执行查询失败: {str(e)}")
 
@@ -219,10 +368,13 @@ def execute_query(query, params=None, executemany=False):
 # 主键相关工具
 # =========================================================
 def create_compare_index(table: str, pk_cols: list):
-    """给 _pk_concat 建索引"""
+    """
+    给 _pk_concat 建索引：须在入库、填充 _pk_concat 之后调用，一次排序建成，
+    不在逐行写入时维护二级索引。主键可能有重复行，用普通索引
+    """
     idx_name = f"idx_{table}_pk"
     col_str = ",".join([f"`{c}`" for c in pk_cols])
-    sql = f"ALTER TABLE `{table}` ADD UNIQUE INDEX {idx_name} ({col_str})"
+    sql = f"ALTER TABLE `{table}` ADD INDEX {idx_name} ({col_str})"
     try:
         execute_query(sql)
     except Exception:
@@ -253,11 +405,9 @@ def fetch_rows_by_pk(table: str, pk_cols: list, wanted_keys: set):
 # =========================================================
 def drop_tables():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute("DROP TABLE IF EXISTS temp_table1")
-        cursor.execute("DROP TABLE IF EXISTS temp_table2")
-        conn.commit()
-        conn.close()
+        with get_connection(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DROP TABLE IF EXISTS temp_table1")
+            cursor.execute("DROP TABLE IF EXISTS temp_table2")
     except Exception as e:
         print(f"删除表失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,148 @@
+# test_db_handler.py
+"""
+MySQL 后端（连接池 + 批量入库）回归测试，不需要 MySQL 服务：连接池换成记录借还的桩，
+检查出错时连接归还、LOAD DATA LOCAL INFILE 的临时 CSV、不可用时改用多行 INSERT
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(ENGINE_DIR)))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+mysql_connector = pytest.importorskip('mysql.connector')
+
+
+@pytest.fixture
+def db_handler():
+    """按路径加载本目录的 db_handler（erp_compare_sqlite 下有同名模块）"""
+    spec = importlib.util.spec_from_file_location('sapcheck_sql_db_handler',
+                                                  os.path.join(ENGINE_DIR, 'db_handler.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.conn.pool.statements.append(sql)
+        if self.conn.pool.fail_on and sql.startswith(self.conn.pool.fail_on):
+            raise mysql_connector.Error(msg=f'{self.conn.pool.fail_on} 不可用')
+        if sql.startswith('LOAD DATA'):
+            path = sql.split("'")[1]
+            with open(path, encoding='utf-8') as f:
+                self.conn.pool.loaded_csv.append(f.read())
+
+    def executemany(self, sql, rows):
+        self.conn.pool.batches.append(list(rows))
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.pool.commits += 1
+
+    def close(self):
+        self.pool.returned += 1
+
+
+class FakePool:
+    """记录借出/归还次数和执行过的语句；fail_on 为语句开头时该语句抛出 mysql.connector.Error"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.checked_out = self.returned = self.commits = 0
+        self.statements, self.batches, self.loaded_csv = [], [], []
+
+    def get_connection(self):
+        self.checked_out += 1
+        return FakeConnection(self)
+
+
+def _use_pool(db_handler, monkeypatch, tmp_path, **kwargs):
+    pool = FakePool(**kwargs)
+    monkeypatch.setattr(db_handler, '_pool', pool)
+    monkeypatch.setattr(db_handler.tempfile, 'tempdir', str(tmp_path))
+    return pool
+
+
+def _write_workbook(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Sheet1'
+    ws.append(['资产编码', '资产名称', '累计折旧'])
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+    return str(path)
+
+
+ROWS = [('A1', '变压器', -12.5), ('A2', '断路器"甲"', 3), ('A3', None, None),
+        ('A4', r'运维\检修', 7), ('A5', '电缆', 0)]
+
+
+def test_connection_returned_on_error(db_handler, monkeypatch, tmp_path):
+    pool = _use_pool(db_handler, monkeypatch, tmp_path, fail_on='SELECT')
+    with pytest.raises(Exception, match='执行查询失败'):
+        db_handler.execute_query('SELECT 1')
+    assert pool.checked_out == pool.returned == 1
+
+
+def test_load_data_infile(db_handler, monkeypatch, tmp_path):
+    pool = _use_pool(db_handler, monkeypatch, tmp_path)
+    path = _write_workbook(tmp_path / 'erp.xlsx', ROWS)
+    rows = db_handler.import_excel_to_db(path, 'Sheet1', 'temp_table2', is_file1=False, chunk_size=10)
+
+    assert rows == len(ROWS)
+    assert pool.checked_out == pool.returned == 1
+    assert not pool.batches
+    # 空值为不带引号的 NULL，双引号成对转义，反斜杠原样写入；表二折旧列取绝对值，末列为原表行号
+    lines = pool.loaded_csv[0].splitlines()
+    assert lines[0] == '"A1","变压器","12.5","2"'
+    assert lines[1] == '"A2","断路器""甲""","3.0","3"'
+    assert lines[2] == '"A3",NULL,NULL,"4"'
+    assert lines[3] == '"A4","运维\\检修","7.0","5"'
+    assert not [f for f in os.listdir(tmp_path) if f.endswith('.csv')]  # 临时 CSV 已删除
+
+
+def test_load_data_falls_back_to_insert(db_handler, monkeypatch, tmp_path):
+    pool = _use_pool(db_handler, monkeypatch, tmp_path, fail_on='LOAD DATA')
+    monkeypatch.setattr(db_handler, 'INSERT_BATCH_ROWS', 1)
+    path = _write_workbook(tmp_path / 'erp.xlsx', ROWS)
+    rows = db_handler.import_excel_to_db(path, 'Sheet1', 'temp_table2', is_file1=False, chunk_size=2)
+
+    assert rows == len(ROWS)
+    assert pool.checked_out == pool.returned == 1
+    # 只在第一块尝试一次 LOAD DATA，之后各块直接多行 INSERT，每批 INSERT_BATCH_ROWS 行
+    assert sum(sql.startswith('LOAD DATA') for sql in pool.statements) == 1
+    assert [len(batch) for batch in pool.batches] == [1] * len(ROWS)
+    assert [batch[0][0] for batch in pool.batches] == [row[0] for row in ROWS]
+    assert not [f for f in os.listdir(tmp_path) if f.endswith('.csv')]
+
+
+def test_import_error_returns_connection(db_handler, monkeypatch, tmp_path):
+    pool = _use_pool(db_handler, monkeypatch, tmp_path, fail_on='CREATE TABLE')
+    path = _write_workbook(tmp_path / 'erp.xlsx', ROWS)
+    with pytest.raises(Exception, match='导入Excel到数据库失败'):
+        db_handler.import_excel_to_db(path, 'Sheet1', 'temp_table2', is_file1=False)
+    assert pool.checked_out == pool.returned == 1
+    assert pool.commits == 0
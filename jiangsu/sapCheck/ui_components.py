@@ -9,9 +9,9 @@ import time
 from PyQt5.QtWidgets import QWidget, QPushButton, QFileDialog, QLabel, QVBoxLayout, QHBoxLayout, \
     QPlainTextEdit, QTabWidget, QComboBox, QProgressDialog, QApplication
 from PyQt5.QtCore import Qt
-from openpyxl import load_workbook
 
-from data_handler import LoadColumnWorker
+from excel_reader.data_handler import LoadColumnWorker, probe_header_layout
+from excel_reader.table_reader import read_table, table_size
 from rule_handler import read_rules
 from comparator import CompareWorker
 from concurrent.futures import ThreadPoolExecutor
@@ -44,6 +44,10 @@ class ExcelComparer(QWidget):
         self.worker_load1 = None
         self.worker_load2 = None
         self.loading_dialog = None
+        # 页签规模 {文件路径: {页签名: (行数, 列数)}}，选文件后由 LoadColumnWorker 回填
+        self.sheet_sizes = {}
+        # 导出进度 {源文件: 已写入行数}
+        self.export_rows_done = {}
         # 读取规则文件
         self.load_rules_file()
 
@@ -179,7 +183,7 @@ class ExcelComparer(QWidget):
 
     def select_file1(self):
         self.reset_file_state(is_file1=True, is_file2=False)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file1 = file
             filename = os.path.basename(file)
@@ -190,7 +194,7 @@ class ExcelComparer(QWidget):
 
     def select_file2(self):
         self.reset_file_state(is_file1=False, is_file2=True)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file2 = file
             filename = os.path.basename(file)
@@ -213,6 +217,7 @@ class ExcelComparer(QWidget):
         worker = LoadColumnWorker(file_path)
         worker.sheet_names_loaded.connect(self.on_sheet_names_loaded)
         worker.sheet_names_loaded.connect(self.close_loading_dialog)
+        worker.sheet_sizes_loaded.connect(self.on_sheet_sizes_loaded)
         # worker.columns_loaded.connect(self.on_columns_loaded)
         # worker.error_occurred.connect(self.on_column_error)
         if is_file1:
@@ -231,8 +236,25 @@ class ExcelComparer(QWidget):
             self.sheet_combo2.addItems(sheet_names)
             self.sheet_combo2.setCurrentIndex(0)
 
+    def on_sheet_sizes_loaded(self, file_path, sheet_sizes):
+        self.sheet_sizes[file_path] = sheet_sizes
+        self.update_sheet_size_labels()
+
+    def sheet_rows(self, file_path, sheet_name):
+        """页签行数（含表头）；规模未知时返回 0"""
+        return self.sheet_sizes.get(file_path, {}).get(sheet_name, (0, 0))[0]
+
+    def update_sheet_size_labels(self):
+        """在页签选择框上方显示所选页签的行列数"""
+        for file_path, combo, label, text in (
+                (self.file1, self.sheet_combo1, self.sheet_label1, "选择平台表页签："),
+                (self.file2, self.sheet_combo2, self.sheet_label2, "选择ERP表页签：")):
+            size = self.sheet_sizes.get(file_path, {}).get(combo.currentText())
+            label.setText(f"{text}（{size[0]} 行 × {size[1]} 列）" if size else text)
+
     def on_sheet_selection_changed(self):
         """页签选择变化时的处理函数"""
+        self.update_sheet_size_labels()
         # 简单更新比较按钮状态
         self.update_compare_button_state()
 
@@ -263,7 +285,7 @@ class ExcelComparer(QWidget):
         if not primary_keys:
             self.log("规则文件中未定义主键字段，请检查规则文件！")
             return
-        self.loading_dialog = QProgressDialog("正在比较文件，请稍候...", None, 0, 0, self)
+        self.loading_dialog = QProgressDialog("正在比较文件，请稍候...", None, 0, 100, self)
         self.loading_dialog.setWindowModality(Qt.WindowModal)
         self.loading_dialog.setWindowTitle("比较中")
         self.loading_dialog.setCancelButton(None)
@@ -273,12 +295,18 @@ class ExcelComparer(QWidget):
                                     primary_keys=primary_keys,
                                     rules=self.rules)
         self.worker.log_signal.connect(self.log)
+        self.worker.progress_signal.connect(self.update_progress)
         # 连接信号以在比较完成时关闭对话框
         self.worker.finished.connect(self.close_loading_dialog)
         self.worker.finished.connect(lambda: self.export_btn.setEnabled(True))
         self.worker.finished.connect(self.on_compare_finished)
         self.worker.start()
 
+    def update_progress(self, value):
+        """更新进度对话框百分比"""
+        if self.loading_dialog:
+            self.loading_dialog.setValue(value)
+
     def close_loading_dialog(self):
         """关闭加载对话框"""
         if self.loading_dialog:
@@ -334,13 +362,22 @@ class ExcelComparer(QWidget):
             (self.file2, self.sheet_combo2.currentText(), False, directory)
         ]
         t0 = time.time()
-        self.loading_dialog = QProgressDialog("正在导出报告，请稍候...", None, 0, 0, self)
+        # 按页签规模显示导出进度；规模未知时为不定进度
+        total_rows = sum(self.sheet_rows(src, sheet) for src, sheet, _, _ in tasks)
+        self.export_rows_done = {}
+        self.loading_dialog = QProgressDialog("正在导出报告，请稍候...", None, 0, 100 if total_rows else 0, self)
         self.loading_dialog.setWindowModality(Qt.WindowModal)
         self.loading_dialog.setWindowTitle("导出")
         self.loading_dialog.setCancelButton(None)
         self.loading_dialog.show()
         with ThreadPoolExecutor(max_workers=2) as pool:
-            pool.map(lambda t: self._export_final(*t), tasks)
+            futures = [pool.submit(self._export_final, *t) for t in tasks]
+            while not all(f.done() for f in futures):
+                if total_rows:
+                    done_rows = sum(self.export_rows_done.values())
+                    self.update_progress(min(99, 100 * done_rows // total_rows))
+                QApplication.processEvents()
+                time.sleep(0.05)
         self.log(f"✅ 并行导出完成，总耗时 {time.time() - t0:.1f}s")
         self.close_loading_dialog()
 
@@ -356,23 +393,18 @@ class ExcelComparer(QWidget):
                 os.chmod(dst, 0o666)  # Linux / macOS
             except Exception:
                 pass  # Windows 会抛异常，忽略即可
-            wb = load_workbook(filename=dst, read_only=False)
-            ws = wb[sheet_name]
-            has_merged_cell = False
-            for row in ws.iter_rows(max_row=2):
-                for cell in row:
-                    if cell.coordinate in ws.merged_cells:
-                        has_merged_cell = True
-                        break
+            # 前两行是否有合并单元格取自表头探测（只读 XML 开头与 <mergeCells>，比对时已缓存）
+            has_merged_cell = probe_header_layout(src_file, sheet_name, is_first_file,
+                                                  self.worker.skip_rows).header_merged
             if not is_first_file:
                 # 遍历合并单元格范围
                 if has_merged_cell:
-                    df = pd.read_excel(dst, sheet_name=sheet_name, skiprows=1, dtype=str).fillna("")
+                    df = read_table(src_file, sheet_name, header_row=2, as_str=True)
                 else:
                     # 2. 读原表（全部字符串，防类型问题）
-                    df = pd.read_excel(dst, sheet_name=sheet_name, dtype=str).fillna("")
+                    df = read_table(src_file, sheet_name, as_str=True)
             else:
-                df = pd.read_excel(dst, sheet_name=sheet_name, dtype=str).fillna("")
+                df = read_table(src_file, sheet_name, as_str=True)
 
             # 3. 动态主键字段
             primary_keys = [f for f, r in self.rules.items() if r.get("is_primary")]
@@ -466,6 +498,9 @@ class ExcelComparer(QWidget):
                 for r in range(orig_rows):
                     for c in range(orig_cols):
                         ws.write(r + 1, c, df.iloc[r, c])
+                    if r % 1000 == 0:
+                        self.export_rows_done[src_file] = r
+                self.export_rows_done[src_file] = orig_rows
 
                 # 追加“对比结果”
                 next_col = orig_cols
@@ -528,16 +563,14 @@ class ExcelComparer(QWidget):
     # ---------- 快速估算行数 ----------
     def _quick_row_count(self, file_path, sheet_name):
         try:
-            df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=0)
-            with pd.ExcelFile(file_path) as xls:
-                return xls.book.sheet_by_name(sheet_name).nrows
+            return table_size(file_path, sheet_name, estimate=True)[0]
         except:
             return 0
 
     # ---------- 方案A：xlsxwriter + pandas ----------
     def _write_with_xlsxwriter(self, src_file, sheet_name, is_first_file, dst_file):
         # 1) 读数据
-        df = pd.read_excel(src_file, sheet_name=sheet_name)
+        df = read_table(src_file, sheet_name)
 
         # 2) 清理 NaN/Inf
         df = df.replace([float('inf'), float('-inf')], None)  # 先转 None
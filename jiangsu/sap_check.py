@@ -2,6 +2,7 @@ import sys
 import traceback
 import logging
 import os
+import multiprocessing
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtGui import QIcon
@@ -10,7 +11,9 @@ from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QFileDialog, QLa
 from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
-import xlrd
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from excel_reader.table_reader import read_table, read_table_header, list_sheets
 
 # 配置日志记录器
 logging.basicConfig(
@@ -56,70 +59,17 @@ def read_excel_columns(file_path, sheet_name):
         if not sheet_name:  # 空字符串、None 都视为未选择
             return
 
-        if file_path.lower().endswith('.xls'):
-            # 处理 .xls 文件
-            import xlrd
-            try:
-                workbook = xlrd.open_workbook(file_path)
-                worksheet = workbook.sheet_by_name(sheet_name)
-                if worksheet.nrows > 0:
-                    columns = [cell.value for cell in worksheet.row(0)]
-                    cleaned_columns = [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
-                    return cleaned_columns
-            except xlrd.biffh.XLRDError as e:
-                # 如果是版本问题，尝试用 openpyxl 处理（可能是实际为 .xlsx 格式的文件）
-                if "xlsx file" in str(e).lower():
-                    wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-                    ws = wb[sheet_name]
-                    columns = [cell.value for cell in next(ws.iter_rows())]
-                    cleaned_columns = [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
-                    wb.close()
-                    return cleaned_columns
-                else:
-                    raise e
-        else:
-            # 处理 .xlsx 文件
-            wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-            ws = wb[sheet_name]
-            columns = [cell.value for cell in next(ws.iter_rows())]
-            cleaned_columns = [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
-            wb.close()
-            return cleaned_columns
+        # 表头只解析第一行；.xls 实为 xlsx 等后缀标错的情况由读取器按文件头识别
+        columns = read_table_header(file_path, sheet_name)
+        return [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
     except Exception as e:
         raise Exception(f"读取Excel列名时发生错误: {str(e)}")
 
 
 def read_excel_fast(file_path, sheet_name):
-    """快速读取Excel文件"""
+    """快速读取Excel文件（xlsx/et/xls/csv 统一由 table_reader 分批流式解析）"""
     try:
-        if file_path.lower().endswith('.xls'):
-            # 处理 .xls 文件
-
-            workbook = xlrd.open_workbook(file_path)
-            worksheet = workbook.sheet_by_name(sheet_name)
-
-            data = []
-            columns = None
-            for i in range(worksheet.nrows):
-                row = worksheet.row(i)
-                if i == 0:
-                    columns = [cell.value for cell in row]
-                else:
-                    data.append([cell.value for cell in row])
-
-            return pd.DataFrame(data, columns=columns)
-        else:
-            wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-            ws = wb[sheet_name]
-            data = []
-            columns = None
-            for i, row in enumerate(ws.rows):
-                if i == 0:
-                    columns = [cell.value for cell in row]
-                else:
-                    data.append([cell.value for cell in row])
-            wb.close()
-            return pd.DataFrame(data, columns=columns)
+        return read_table(file_path, sheet_name)
     except Exception as e:
         raise Exception(f"读取Excel文件时发生错误: {str(e)}")
 
@@ -127,30 +77,7 @@ def read_excel_fast(file_path, sheet_name):
 def get_sheet_names(file_path):
     """获取 Excel 文件的所有页签名称"""
     try:
-
-        if file_path.lower().endswith('.xls'):
-            # 处理 .xls 文件
-            # 处理 .xls 文件
-            import xlrd
-            try:
-                workbook = xlrd.open_workbook(file_path)
-                sheetnames = workbook.sheet_names()
-                return sheetnames
-            except xlrd.biffh.XLRDError as e:
-                # 如果是版本问题，尝试用 openpyxl 处理（可能是实际为 .xlsx 格式的文件）
-                if "xlsx file" in str(e).lower():
-                    wb = load_workbook(filename=file_path, read_only=True)
-                    sheetnames = wb.sheetnames
-                    wb.close()
-                    return sheetnames
-                else:
-                    raise e
-        else:
-            # 处理 .xlsx 文件
-            wb = load_workbook(filename=file_path, read_only=True)
-            sheetnames = wb.sheetnames
-            wb.close()
-            return sheetnames
+        return list_sheets(file_path)
     except Exception as e:
         raise Exception(f"读取页签名称时发生错误: {str(e)}")
 
@@ -1084,7 +1011,7 @@ class ExcelComparer(QWidget):
 
     def select_file1(self):
         self.reset_file_state(is_file1=True, is_file2=False)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file1 = file
             filename = os.path.basename(file)
@@ -1095,7 +1022,7 @@ class ExcelComparer(QWidget):
 
     def select_file2(self):
         self.reset_file_state(is_file1=False, is_file2=True)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file2 = file
             filename = os.path.basename(file)
@@ -1501,6 +1428,8 @@ def exception_hook(exc_type, exc_value, exc_traceback):
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取 xlsx 时的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     sys.excepthook = exception_hook
     app = QApplication(sys.argv)
     icon_path = resource_path('icon.ico')
@@ -2,6 +2,8 @@ import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 from utils import normalize_value
+from excel_reader.sheet_cache import cached_chunks, should_cache
+from excel_reader.table_reader import iter_table_batches, read_table_header, list_sheets
 
 
 def read_rules(file_path):
@@ -32,30 +34,29 @@ def read_excel_columns(file_path, sheet_name):
     try:
         if not sheet_name:  # 空字符串、None 都视为未选择
             return
-        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-        ws = wb[sheet_name]
-        columns = [cell.value for cell in next(ws.iter_rows())]
-        cleaned_columns = [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
-        wb.close()
-        return cleaned_columns
+        columns = read_table_header(file_path, sheet_name)
+        return [col.replace('*', '').strip() if isinstance(col, str) else col for col in columns]
     except Exception as e:
         raise Exception(f"读取Excel列名时发生错误: {str(e)}")
 
 
-def read_excel_fast(file_path, sheet_name):
-    """快速读取Excel文件"""
+def read_excel_fast(file_path, sheet_name, use_cache=None, is_file1=True):
+    """
+    快速读取Excel文件（xlsx/et/xls/csv 统一由 table_reader 分批流式解析，首行作为列名）
+    use_cache 为 None 时按 sheet_cache.should_cache 决定（默认只缓存表一，且文件不小于缓存阈值），
+    命中时同一文件同一页签直接取持久化缓存
+    """
     try:
-        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-        ws = wb[sheet_name]
-        data = []
-        columns = None
-        for i, row in enumerate(ws.rows):
-            if i == 0:
-                columns = [cell.value for cell in row]
-            else:
-                data.append([cell.value for cell in row])
-        wb.close()
-        return pd.DataFrame(data, columns=columns)
+        def make_chunks():
+            return iter_table_batches(file_path, sheet_name)
+
+        if use_cache is None:
+            use_cache = should_cache(file_path, is_file1)
+        if use_cache:
+            chunks = list(cached_chunks(make_chunks, file_path, sheet_name, reader='table_reader'))
+        else:
+            chunks = list(make_chunks())
+        return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
     except Exception as e:
         raise Exception(f"读取Excel文件时发生错误: {str(e)}")
 
@@ -63,10 +64,7 @@ def read_excel_fast(file_path, sheet_name):
 def get_sheet_names(file_path):
     """获取 Excel 文件的所有页签名称"""
     try:
-        wb = load_workbook(filename=file_path, read_only=True)
-        sheetnames = wb.sheetnames
-        wb.close()
-        return sheetnames
+        return list_sheets(file_path)
     except Exception as e:
         raise Exception(f"读取页签名称时发生错误: {str(e)}")
 
@@ -149,7 +149,7 @@ class ExcelComparer(QWidget):
 
     def select_file1(self):
         self.reset_file_state(is_file1=True, is_file2=False)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file1 = file
             filename = os.path.basename(file)
@@ -160,7 +160,7 @@ class ExcelComparer(QWidget):
 
     def select_file2(self):
         self.reset_file_state(is_file1=False, is_file2=True)
-        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "Excel 文件 (*.xlsx *.xls)")
+        file, _ = QFileDialog.getOpenFileName(self, "选择 Excel 文件", "", "表格文件 (*.xlsx *.xls *.et *.csv)")
         if file:
             self.file2 = file
             filename = os.path.basename(file)
@@ -1,8 +1,12 @@
+import os
 import sys
 import traceback
 import logging
+import multiprocessing
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication
+# 共用的表格读取包 excel_reader 在仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from gui import ExcelComparer
 from utils import resource_path
 
@@ -29,6 +33,8 @@ def exception_hook(exc_type, exc_value, exc_traceback):
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后，读取 xlsx 时的解析子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
     sys.excepthook = exception_hook
 
     app = QApplication(sys.argv)
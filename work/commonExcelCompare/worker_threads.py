@@ -67,7 +67,7 @@ class CompareWorker(QThread):
 
             with ThreadPoolExecutor(max_workers=2) as executor:
                 future1 = executor.submit(read_excel_fast, self.file1, self.sheet_name1)
-                future2 = executor.submit(read_excel_fast, self.file2, self.sheet_name2)
+                future2 = executor.submit(read_excel_fast, self.file2, self.sheet_name2, is_file1=False)
                 try:
                     df1 = future1.result()
                     df2 = future2.result()